@@ -2,9 +2,10 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
     Partner, PartnersGroup, PartnersGroupMember,
-    Safe, Customer, Supplier, Unit, Contract,
+    Safe, SafeBalance, SafeDailyClose, Customer, Supplier, Unit, Contract,
     Installment, ReceiptVoucher, PaymentVoucher,
-    Project, Item, StockMove, Settlement
+    Project, Item, StockMove, Settlement, DocumentSequence,
+    Watermark, ReportJob
 )
 
 
@@ -35,6 +36,20 @@ class SafeAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+@admin.register(SafeBalance)
+class SafeBalanceAdmin(admin.ModelAdmin):
+    list_display = ['safe', 'receipts_total', 'payments_total', 'updated_at']
+    readonly_fields = ['safe', 'receipts_total', 'payments_total', 'updated_at']
+    search_fields = ['safe__name']
+
+
+@admin.register(SafeDailyClose)
+class SafeDailyCloseAdmin(admin.ModelAdmin):
+    list_display = ['safe', 'date', 'receipts_total', 'payments_total', 'created_at']
+    list_filter = ['date', 'safe']
+    ordering = ['-date']
+
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['code', 'name', 'phone', 'is_active', 'created_at']
@@ -141,4 +156,24 @@ class SettlementAdmin(admin.ModelAdmin):
     list_filter = ['project', 'created_at']
     search_fields = ['notes']
     ordering = ['-period_to', '-created_at']
-    readonly_fields = ['pre_balances', 'post_balances', 'details']
\ No newline at end of file
+    readonly_fields = ['pre_balances', 'post_balances', 'details']
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['key', 'last_value', 'updated_at']
+    search_fields = ['key']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(Watermark)
+class WatermarkAdmin(admin.ModelAdmin):
+    list_display = ['key', 'value', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['report_type', 'file_format', 'status', 'rows_written', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['report_type', 'file_format', 'status']
+    ordering = ['-created_at']
+    readonly_fields = ['params_key', 'cache_key', 'data_version', 'created_at', 'started_at', 'finished_at', 'updated_at']
@@ -7,5 +7,5 @@ class AccountingConfig(AppConfig):
     verbose_name = 'المحاسبة'
     
     def ready(self):
-        # تسجيل الإشارات إذا لزم الأمر
-        pass
\ No newline at end of file
+        # تسجيل الإشارات
+        from . import signals  # noqa: F401
\ No newline at end of file
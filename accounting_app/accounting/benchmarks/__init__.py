@@ -0,0 +1,13 @@
+"""قياسات أداء الخدمات والعروض (تُشغل بالأمر manage.py bench)"""
+from .runner import BENCHMARKS, BenchmarkError, FIXTURE_PREFIX, FIXTURE_DATE, load_fixtures, run, compare
+from . import services, views, reports
+
+__all__ = [
+    'BENCHMARKS',
+    'BenchmarkError',
+    'FIXTURE_PREFIX',
+    'FIXTURE_DATE',
+    'load_fixtures',
+    'run',
+    'compare',
+]
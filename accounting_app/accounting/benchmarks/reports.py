@@ -0,0 +1,61 @@
+from ..services import ReportService
+from .runner import benchmark
+
+
+def _consume(response):
+    """قراءة الاستجابة كاملة (التقارير المتدفقة لا تعمل إلا عند القراءة)"""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.content
+    response.close()
+
+
+def _treasury_args(fixtures):
+    return fixtures['from_date'], fixtures['to_date'], fixtures['safe']
+
+
+@benchmark('reports.treasury_csv')
+def treasury_csv(fixtures, prepared):
+    _consume(ReportService.generate_treasury_report_csv(*_treasury_args(fixtures)))
+
+
+@benchmark('reports.treasury_xlsx')
+def treasury_xlsx(fixtures, prepared):
+    _consume(ReportService.generate_treasury_report_xlsx(*_treasury_args(fixtures)))
+
+
+@benchmark('reports.treasury_pdf')
+def treasury_pdf(fixtures, prepared):
+    _consume(ReportService.generate_treasury_report_pdf(*_treasury_args(fixtures)))
+
+
+@benchmark('reports.installments_csv')
+def installments_csv(fixtures, prepared):
+    _consume(ReportService.generate_installments_report_csv(fixtures['from_date'], fixtures['to_date']))
+
+
+@benchmark('reports.installments_xlsx')
+def installments_xlsx(fixtures, prepared):
+    _consume(ReportService.generate_installments_report_xlsx(fixtures['from_date'], fixtures['to_date']))
+
+
+@benchmark('reports.partners_balances_csv')
+def partners_balances_csv(fixtures, prepared):
+    _consume(ReportService.generate_partners_balances_report(fixtures['today']))
+
+
+@benchmark('reports.partners_balances_xlsx')
+def partners_balances_xlsx(fixtures, prepared):
+    _consume(ReportService.generate_partners_balances_report_xlsx(fixtures['today']))
+
+
+@benchmark('reports.project_expenses_csv')
+def project_expenses_csv(fixtures, prepared):
+    _consume(ReportService.generate_project_expenses_report(fixtures['project']))
+
+
+@benchmark('reports.project_expenses_xlsx')
+def project_expenses_xlsx(fixtures, prepared):
+    _consume(ReportService.generate_project_expenses_report_xlsx(fixtures['project']))
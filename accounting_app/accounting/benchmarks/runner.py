@@ -0,0 +1,128 @@
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+from ..models import Safe, Partner, Contract, Customer, Project, Unit
+from ..perf import record_queries
+
+
+# مجموعة البيانات المرجعية: seed_scale بهذه البادئة وهذا التاريخ حتى تكون النتائج قابلة للمقارنة
+FIXTURE_PREFIX = 'BENCH'
+FIXTURE_DATE = date(2025, 6, 30)
+
+# الفروق الأصغر من هذه لا تُعد تراجعاً مهما كانت نسبتها (ضوضاء القياس)
+MIN_WALL_DELTA_MS = 2
+MIN_PEAK_DELTA_KB = 64
+
+# {الاسم: (الدالة، دالة التجهيز)}
+BENCHMARKS = {}
+
+
+class BenchmarkError(Exception):
+    """فشل تشغيل قياس (بيانات ناقصة أو استجابة غير متوقعة)"""
+    pass
+
+
+def benchmark(name, setup=None):
+    """تسجيل قياس: func(fixtures, prepared) حيث prepared ناتج setup(fixtures) غير المحسوب في القياس"""
+    def decorator(func):
+        BENCHMARKS[name] = (func, setup)
+        return func
+    return decorator
+
+
+def load_fixtures(prefix=FIXTURE_PREFIX):
+    """الكائنات النموذجية من بيانات seed_scale التي تعمل عليها القياسات"""
+    customer = Customer.objects.filter(code__startswith=f'{prefix}-').annotate(
+        contracts_count=Count('contracts')
+    ).order_by('-contracts_count', 'pk').first()
+    if customer is None:
+        raise BenchmarkError(f'No "{prefix}" dataset, run seed_scale --prefix {prefix} first')
+
+    user, _ = User.objects.get_or_create(username='bench', defaults={'is_staff': True, 'is_superuser': True})
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(user)
+
+    return {
+        'today': FIXTURE_DATE,
+        'from_date': FIXTURE_DATE - timedelta(days=90),
+        'to_date': FIXTURE_DATE,
+        'safe': Safe.objects.filter(name__startswith=f'{prefix} ', is_partner_wallet=False).order_by('pk').first(),
+        'partner': Partner.objects.filter(code__startswith=f'{prefix}-').order_by('pk').first(),
+        'contract': Contract.objects.filter(code__startswith=f'{prefix}-').order_by('-installments_count', 'pk').first(),
+        'customer': customer,
+        'project': Project.objects.filter(code__startswith=f'{prefix}-').order_by('pk').first(),
+        'unit': Unit.objects.filter(code__startswith=f'{prefix}-', is_sold=False).order_by('pk').first(),
+        'client': client,
+    }
+
+
+def run(names, fixtures, repeat=5):
+    """تشغيل القياسات المحددة {الاسم: {'wall_ms', 'min_ms', 'queries', 'peak_kb'}}
+
+    لكل قياس: تشغيل تمهيدي، تشغيل لعدّ الاستعلامات، repeat تشغيلات للوقت (الوسيط)،
+    ثم تشغيل تحت tracemalloc لذروة الذاكرة. كل تشغيل داخل نقطة حفظ تُلغى بعده.
+    """
+    results = {}
+    for name in names:
+        func, setup = BENCHMARKS[name]
+        _run_once(func, setup, fixtures)
+
+        stats = _run_once(func, setup, fixtures, probe='queries')
+        timings = [_run_once(func, setup, fixtures) for _ in range(repeat)]
+        peak = _run_once(func, setup, fixtures, probe='memory')
+
+        results[name] = {
+            'wall_ms': round(statistics.median(timings) * 1000, 2),
+            'min_ms': round(min(timings) * 1000, 2),
+            'queries': stats.count,
+            'peak_kb': peak // 1024,
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """التراجعات مقارنة بخط الأساس: الوقت والذاكرة بنسبة threshold وأي زيادة في الاستعلامات"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        if (current['wall_ms'] > previous['wall_ms'] * (1 + threshold) and
+                current['wall_ms'] - previous['wall_ms'] > MIN_WALL_DELTA_MS):
+            regressions.append(f"{name}: wall time {previous['wall_ms']}ms -> {current['wall_ms']}ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if (current['peak_kb'] > previous['peak_kb'] * (1 + threshold) and
+                current['peak_kb'] - previous['peak_kb'] > MIN_PEAK_DELTA_KB):
+            regressions.append(f"{name}: peak memory {previous['peak_kb']}KB -> {current['peak_kb']}KB")
+    return regressions
+
+
+def _run_once(func, setup, fixtures, probe=None):
+    """تشغيل واحد معزول: المدة بالثواني، أو إحصائيات الاستعلامات، أو ذروة الذاكرة بالبايت"""
+    with transaction.atomic():
+        prepared = setup(fixtures) if setup else None
+
+        if probe == 'queries':
+            with record_queries() as result:
+                func(fixtures, prepared)
+        elif probe == 'memory':
+            tracemalloc.start()
+            try:
+                func(fixtures, prepared)
+                result = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        else:
+            started = time.perf_counter()
+            func(fixtures, prepared)
+            result = time.perf_counter() - started
+
+        transaction.set_rollback(True)
+    return result
@@ -0,0 +1,39 @@
+from decimal import Decimal
+from ..models import Contract
+from ..services import TreasuryService, SettlementService, ContractService
+from .runner import benchmark
+
+
+@benchmark('treasury.get_cash_flow')
+def get_cash_flow(fixtures, prepared):
+    TreasuryService.get_cash_flow(fixtures['from_date'], fixtures['to_date'])
+
+
+@benchmark('treasury.get_partner_balance')
+def get_partner_balance(fixtures, prepared):
+    TreasuryService.get_partner_balance(fixtures['partner'])
+
+
+@benchmark('settlements.calculate_settlement')
+def calculate_settlement(fixtures, prepared):
+    SettlementService.calculate_settlement(fixtures['from_date'], fixtures['to_date'])
+
+
+def _new_contract(fixtures):
+    """عقد محفوظ بلا أقساط على وحدة غير مباعة (الإدراج المجمع لا يولد الأقساط)"""
+    unit = fixtures['unit']
+    return Contract.objects.bulk_create([Contract(
+        code='BENCH-NEW',
+        customer=fixtures['customer'],
+        unit=unit,
+        unit_value=unit.price_total,
+        down_payment=(unit.price_total * Decimal('0.2')).quantize(Decimal('0.01')),
+        installments_count=84,
+        schedule_type='monthly',
+        start_date=fixtures['today']
+    )])[0]
+
+
+@benchmark('contracts.generate_installments', setup=_new_contract)
+def generate_installments(fixtures, contract):
+    ContractService.generate_installments(contract)
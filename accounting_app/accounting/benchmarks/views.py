@@ -0,0 +1,45 @@
+from django.urls import reverse
+from ..services import CustomerService, DashboardService
+from .runner import benchmark, BenchmarkError
+
+
+def _get(fixtures, url, htmx=False, **params):
+    headers = {'HX-Request': 'true'} if htmx else {}
+    try:
+        response = fixtures['client'].get(url, params, secure=True, headers=headers)
+    except Exception as e:
+        # أخطاء العرض (قالب ناقص، تجاوز حد الاستعلامات...) تظهر كفشل القياس لا كتتبع خام
+        raise BenchmarkError(f'GET {url} failed: {e!r}') from e
+    if response.status_code != 200:
+        raise BenchmarkError(f'GET {url} returned {response.status_code}')
+    return response
+
+
+def _cold_dashboard(fixtures):
+    DashboardService.invalidate_cache()
+
+
+def _statement_cursor(fixtures):
+    """مؤشر بعد أول حركة في كشف الحساب، لقياس تحميل الصفحات التالية"""
+    cursor = CustomerService.get_statement_page(fixtures['customer'], page_size=1)['next_cursor']
+    if cursor is None:
+        raise BenchmarkError('The benchmark customer statement has a single page')
+    return cursor
+
+
+@benchmark('views.dashboard', setup=_cold_dashboard)
+def dashboard(fixtures, prepared):
+    _get(fixtures, reverse('accounting:dashboard'))
+
+
+@benchmark('views.customers_table')
+def customers_table(fixtures, prepared):
+    _get(fixtures, reverse('accounting:customers_list'), htmx=True)
+
+
+@benchmark('views.customer_statement_rows', setup=_statement_cursor)
+def customer_statement_rows(fixtures, prepared):
+    _get(
+        fixtures, reverse('accounting:customer_statement', args=[fixtures['customer'].pk]),
+        htmx=True, after=prepared
+    )
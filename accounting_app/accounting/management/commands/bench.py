@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import datetime
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ... import benchmarks
+from ...models import Customer
+
+
+BENCHMARKS_DIR = os.path.dirname(benchmarks.__file__)
+
+
+class Command(BaseCommand):
+    help = 'Time service, view and report hot paths on a seed_scale dataset and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help='Only run benchmarks whose name contains one of these strings'
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            help=f'Seed the {benchmarks.FIXTURE_PREFIX} dataset with seed_scale at this scale if it is missing'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs per benchmark, the median is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--output',
+            default=os.path.join(BENCHMARKS_DIR, 'latest.json'),
+            help='Where to write the results JSON'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(BENCHMARKS_DIR, 'baseline.json'),
+            help='Baseline results JSON to compare with'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed relative slowdown / memory growth before failing (default: 0.25)'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Write the results as the new baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the available benchmarks and exit'
+        )
+
+    def handle(self, *args, **options):
+        names = [
+            name for name in sorted(benchmarks.BENCHMARKS)
+            if not options['names'] or any(part in name for part in options['names'])
+        ]
+        if options['list']:
+            for name in names:
+                self.stdout.write(name)
+            return
+        if not names:
+            raise CommandError('No benchmark matches the given names')
+        # بدون خط أساس لا توجد بوابة تراجع، فلا نتجاوزها بصمت
+        if not options['save_baseline'] and not os.path.exists(options['baseline']):
+            raise CommandError(
+                f"No baseline found at {options['baseline']}, run with --save-baseline to record one"
+            )
+
+        prefix = benchmarks.FIXTURE_PREFIX
+        if options['scale'] and not Customer.objects.filter(code__startswith=f'{prefix}-').exists():
+            self.stdout.write(f'Seeding {prefix} dataset at scale {options["scale"]}...')
+            call_command(
+                'seed_scale', scale=options['scale'], prefix=prefix,
+                date=benchmarks.FIXTURE_DATE.isoformat(), stdout=self.stdout
+            )
+
+        # كل ما تكتبه القياسات (المستخدم والجلسات والبيانات) يُلغى في النهاية
+        with transaction.atomic():
+            try:
+                fixtures = benchmarks.load_fixtures()
+                results = benchmarks.run(names, fixtures, repeat=options['repeat'])
+            except benchmarks.BenchmarkError as e:
+                raise CommandError(str(e))
+            transaction.set_rollback(True)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<36} {result['wall_ms']:>10.2f}ms {result['queries']:>6} queries "
+                f"{result['peak_kb']:>8}KB"
+            )
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        path = options['baseline'] if options['save_baseline'] else options['output']
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+        self.stdout.write(f'Results written to {path}')
+
+        if options['save_baseline']:
+            return
+
+        with open(options['baseline'], encoding='utf-8') as handle:
+            baseline = json.load(handle)['results']
+        regressions = benchmarks.compare(results, baseline, options['threshold'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} performance regression(s) against the baseline')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
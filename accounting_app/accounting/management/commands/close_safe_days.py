@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from ...models import SafeDailyClose
+from ...services import TreasuryService
+
+
+class Command(BaseCommand):
+    help = 'Write daily closing snapshots of the safe balances (default: yesterday)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Closing date in YYYY-MM-DD format (default: yesterday)'
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Also close every missing day since the last snapshot'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            close_date = (
+                date.fromisoformat(options['date']) if options['date']
+                else date.today() - timedelta(days=1)
+            )
+        except ValueError:
+            raise CommandError('Invalid --date, expected YYYY-MM-DD')
+        
+        days = [close_date]
+        if options['backfill']:
+            # يبدأ من أقدم "آخر إقفال" بين الخزائن، فإبطال إقفالات خزنة واحدة يُعاد ملؤه
+            last_close = min(
+                SafeDailyClose.objects.filter(date__lt=close_date).order_by().values('safe').annotate(
+                    last=Max('date')
+                ).values_list('last', flat=True),
+                default=None
+            )
+            if last_close:
+                days = [
+                    last_close + timedelta(days=offset)
+                    for offset in range(1, (close_date - last_close).days + 1)
+                ]
+        
+        # كل يوم يبني على إقفال اليوم السابق
+        for day in days:
+            closes = TreasuryService.close_day(day)
+            self.stdout.write(f'{day}: closed {len(closes)} safe(s)')
+        
+        self.stdout.write(self.style.SUCCESS(f'Wrote closing snapshots for {len(days)} day(s)'))
@@ -0,0 +1,68 @@
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from ...services import VoucherService
+from ...services.importing import read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import receipt or payment vouchers in bulk from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument(
+            '--type',
+            choices=['receipt', 'payment'],
+            default='receipt',
+            help='Voucher type to import (default: receipt)'
+        )
+        parser.add_argument(
+            '--skip-invalid',
+            action='store_true',
+            help='Import the valid rows and report the invalid ones instead of aborting'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file without writing anything'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per INSERT statement (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+
+        started = time.monotonic()
+        try:
+            rows = read_rows(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        post = VoucherService.post_receipts if options['type'] == 'receipt' else VoucherService.post_payments
+        result = post(
+            rows,
+            skip_invalid=options['skip_invalid'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size']
+        )
+
+        for error in result['errors']:
+            # رقم السطر في الملف (بعد سطر العناوين)
+            self.stderr.write(f"Row {error['row'] + 1}: {'; '.join(error['errors'])}")
+
+        elapsed = time.monotonic() - started
+        summary = (
+            f"{len(rows)} row(s) read, {result['created']} voucher(s) created, "
+            f"{len(result['errors'])} invalid row(s) in {elapsed:.2f}s"
+        )
+
+        if result['errors'] and not options['skip_invalid']:
+            raise CommandError(f'{summary}. Nothing was imported')
+
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...services import TreasuryService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify the materialized safe balances from the raw vouchers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored balances with the vouchers, do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        verify_only = options['verify']
+        mismatches = TreasuryService.rebuild_safe_balances(commit=not verify_only)
+        
+        for item in mismatches:
+            self.stdout.write(
+                f"{item['safe']}: stored receipts={item['stored_receipts']} "
+                f"payments={item['stored_payments']} -> "
+                f"receipts={item['receipts']} payments={item['payments']}"
+            )
+        
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All safe balances match the vouchers'))
+        elif verify_only:
+            raise CommandError(f'{len(mismatches)} safe balance(s) do not match the vouchers')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(mismatches)} safe balance(s)'))
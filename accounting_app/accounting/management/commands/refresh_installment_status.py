@@ -0,0 +1,35 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from ...services import InstallmentService
+
+
+class Command(BaseCommand):
+    help = 'Mark installments that became overdue since the last run as LATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-check every installment instead of only those that crossed their due date'
+        )
+        parser.add_argument(
+            '--date',
+            help='Reference date (YYYY-MM-DD), defaults to today'
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        
+        started = time.monotonic()
+        changed = InstallmentService.refresh_statuses(today=today, full=options['full'])
+        elapsed = time.monotonic() - started
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'{changed} installment status(es) changed in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from ...services import ReportJobService
+
+
+class Command(BaseCommand):
+    help = 'Generate queued report jobs in the background and keep their artifacts for reuse'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of worker threads (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently queued and exit'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when the queue is empty (default: 5)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Maximum number of jobs to pick up per round'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            done = ReportJobService.run_pending(workers=options['workers'], limit=options['limit'])
+            if done:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{done} report(s) generated in {time.monotonic() - started:.2f}s'
+                ))
+            
+            if options['once']:
+                break
+            if not done:
+                time.sleep(options['poll_interval'])
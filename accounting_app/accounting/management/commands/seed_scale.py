@@ -0,0 +1,389 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from ...models import (
+    Partner, PartnersGroup, PartnersGroupMember,
+    Safe, Customer, Supplier, Unit, Contract, Installment,
+    ReceiptVoucher, PaymentVoucher, Project,
+    Item, StockMove
+)
+from ...services import ContractService, ScheduleEngine, TreasuryService, VoucherService, DashboardService
+
+
+CENT = Decimal('0.01')
+
+# الكميات لكل وحدة من --scale (حوالي 10 آلاف سند، و--scale 100 حوالي مليون سند)
+PER_SCALE = {
+    'customers': 150,
+    'contracts': 200,
+    'suppliers': 2,
+    'projects': 5,
+    'payments': 4000,
+    'stock_moves': 2000,
+}
+
+# سلوك سداد العملاء: (الاسم، الوزن)
+PAYER_PROFILES = (('punctual', 65), ('late', 20), ('defaulted', 10), ('partial', 5))
+
+FIRST_NAMES = ['أحمد', 'محمد', 'محمود', 'علي', 'حسن', 'يوسف', 'عمر', 'إبراهيم', 'خالد', 'مصطفى',
+               'فاطمة', 'مريم', 'سارة', 'نور', 'هدى', 'منى', 'ياسمين', 'آية', 'دينا', 'رانيا']
+LAST_NAMES = ['عبد الرحمن', 'السيد', 'حسين', 'إسماعيل', 'عبد الله', 'سليمان', 'منصور', 'فؤاد',
+              'الشافعي', 'النجار', 'عثمان', 'رمضان', 'شعبان', 'عبد العزيز', 'جمال']
+EXPENSE_HEADS = ['أجور عمال', 'نقل مواد', 'كهرباء ومياه', 'إيجار معدات', 'مصاريف إدارية', 'مشتريات مواد']
+ITEMS = [
+    ('أسمنت', 'شيكارة', 65), ('حديد تسليح', 'طن', 18000), ('رمل', 'متر مكعب', 150),
+    ('زلط', 'متر مكعب', 200), ('سيراميك', 'متر مربع', 120), ('طوب', 'ألف', 1500),
+    ('دهانات', 'لتر', 90), ('مواسير', 'متر', 45),
+]
+
+# سنوات السجل التاريخي المولد
+HISTORY_DAYS = 5 * 365
+
+
+class Command(BaseCommand):
+    help = 'Seed a large, reproducible dataset with bulk inserts (about 10k vouchers per --scale unit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1,
+            help='Dataset size multiplier; 100 gives about one million vouchers (default: 1)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed, the same seed and date produce the same dataset (default: 42)'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='S',
+            help='Prefix for generated codes so several datasets can coexist (default: S)'
+        )
+        parser.add_argument(
+            '--date',
+            help='Reference "today" (YYYY-MM-DD) for due dates and statuses, defaults to today'
+        )
+        parser.add_argument(
+            '--partners',
+            type=int,
+            default=4,
+            help='Number of partners, each with a wallet safe (default: 4)'
+        )
+        parser.add_argument(
+            '--safes',
+            type=int,
+            default=3,
+            help='Number of company safes (default: 3)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per INSERT statement (default: 5000)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Contracts per transaction; vouchers and stock moves use ten times this (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database backend must return primary keys from bulk inserts')
+        if options['scale'] < 1 or options['partners'] < 1 or options['safes'] < 1:
+            raise CommandError('--scale, --partners and --safes must be at least 1')
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.chunk_size = options['chunk_size']
+        try:
+            self.today = date.fromisoformat(options['date']) if options['date'] else date.today()
+        except ValueError:
+            raise CommandError(f"Invalid date: {options['date']}")
+        counts = {name: per_scale * options['scale'] for name, per_scale in PER_SCALE.items()}
+
+        if Customer.objects.filter(code__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Codes with prefix "{self.prefix}-" already exist, use another --prefix')
+
+        started = time.monotonic()
+
+        with transaction.atomic():
+            if not User.objects.filter(username='admin').exists():
+                User.objects.create_superuser('admin', 'admin@example.com', 'admin123')
+                self.stdout.write(self.style.SUCCESS('Created superuser: admin/admin123'))
+
+            partners, wallets, group = self.create_partners(options['partners'])
+            safes = Safe.objects.bulk_create([
+                Safe(name=f'{self.prefix} خزنة {i}', is_partner_wallet=False)
+                for i in range(1, options['safes'] + 1)
+            ])
+            customers = self.create_customers(counts['customers'])
+            suppliers = Supplier.objects.bulk_create([
+                Supplier(name=f'{self.prefix} مورد {i}', phone=self.phone('02'))
+                for i in range(1, counts['suppliers'] + 1)
+            ])
+            units = self.create_units(counts['contracts'] + counts['contracts'] // 5, group)
+            projects = self.create_projects(counts['projects'])
+            items = Item.objects.bulk_create([
+                Item(
+                    code=f'{self.prefix}-ITM{i:03d}',
+                    name=name,
+                    uom=uom,
+                    unit_price=Decimal(price),
+                    supplier=self.rng.choice(suppliers)
+                )
+                for i, (name, uom, price) in enumerate(ITEMS, start=1)
+            ])
+        self.report('master data', started)
+
+        with transaction.atomic():
+            self.create_partner_receipts(partners, wallets)
+        contracts, installments, receipts = self.create_contracts(counts['contracts'], customers, units, group, safes)
+        self.report(f'{contracts} contracts, {installments} installments, {receipts} receipts', started)
+
+        payments = self.create_payments(counts['payments'], safes, suppliers, projects)
+        self.report(f'{payments} payment vouchers', started)
+
+        moves = self.create_stock_moves(counts['stock_moves'], items, projects)
+        self.report(f'{moves} stock moves', started)
+
+        # الإدراج المجمع لا يطلق الإشارات، فتُبنى أرصدة الخزائن مرة واحدة في النهاية
+        TreasuryService.rebuild_safe_balances()
+        DashboardService.invalidate_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {receipts + payments} vouchers in {time.monotonic() - started:.1f}s'
+        ))
+        for status, label in Installment.STATUS_CHOICES:
+            count = Installment.objects.filter(contract__code__startswith=f'{self.prefix}-', status=status).count()
+            self.stdout.write(f'{status}: {count}')
+
+    def report(self, message, started):
+        self.stdout.write(f'[{time.monotonic() - started:7.1f}s] {message}')
+
+    def phone(self, prefix='01'):
+        return f'{prefix}{self.rng.randint(100000000, 999999999)}'
+
+    def past_date(self, days=HISTORY_DAYS):
+        return self.today - timedelta(days=self.rng.randint(0, days))
+
+    def create_partners(self, count):
+        """الشركاء بحصص متساوية ومحفظة لكل شريك ومجموعة تضمهم
+
+        فرق التقريب يُضاف لحصة آخر شريك حتى يكون مجموع الحصص 100 بالضبط.
+        """
+        share = (Decimal('100') / count).quantize(CENT)
+        shares = [share] * (count - 1) + [Decimal('100') - share * (count - 1)]
+        partners = Partner.objects.bulk_create([
+            Partner(
+                code=f'{self.prefix}-P{i:03d}',
+                name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                share_percent=shares[i - 1],
+                opening_balance=Decimal(self.rng.randint(50, 500) * 1000),
+            )
+            for i in range(1, count + 1)
+        ])
+        wallets = Safe.objects.bulk_create([
+            Safe(name=f'محفظة {partner.code}', is_partner_wallet=True, partner=partner)
+            for partner in partners
+        ])
+        group = PartnersGroup.objects.create(name=f'{self.prefix} مجموعة الشركاء')
+        PartnersGroupMember.objects.bulk_create([
+            PartnersGroupMember(group=group, partner=partner, percent=partner.share_percent)
+            for partner in partners
+        ])
+        return partners, wallets, group
+
+    def create_customers(self, count):
+        return Customer.objects.bulk_create([
+            Customer(
+                code=f'{self.prefix}-C{i:06d}',
+                name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                phone=self.phone(),
+                email=f'{self.prefix.lower()}{i}@example.com' if self.rng.random() < 0.6 else '',
+                is_active=self.rng.random() < 0.95
+            )
+            for i in range(1, count + 1)
+        ], batch_size=self.batch_size)
+
+    def create_units(self, count, group):
+        """وحدات أغلبها سكنية بأسعار موزعة بين 500 ألف و3 مليون"""
+        units = []
+        for i in range(1, count + 1):
+            unit_type = self.rng.choices(['residential', 'commercial', 'other'], weights=[80, 15, 5])[0]
+            units.append(Unit(
+                code=f'{self.prefix}-U{i:06d}',
+                name=f'وحدة {i}',
+                building_no=str(1 + i // 40),
+                unit_type=unit_type,
+                price_total=Decimal(self.rng.randint(500, 3000) * 1000),
+                group='com' if unit_type == 'commercial' else 'res',
+                partners_group=group,
+                is_sold=False
+            ))
+        return Unit.objects.bulk_create(units, batch_size=self.batch_size)
+
+    def create_projects(self, count):
+        return Project.objects.bulk_create([
+            Project(
+                code=f'{self.prefix}-PRJ{i:04d}',
+                name=f'مشروع {i}',
+                project_type=self.rng.choice(['build', 'maintenance', 'renovation']),
+                start_date=self.past_date(),
+                status=self.rng.choices(['ongoing', 'done', 'hold'], weights=[60, 30, 10])[0],
+                budget=Decimal(self.rng.randint(1, 20) * 250000)
+            )
+            for i in range(1, count + 1)
+        ])
+
+    def create_partner_receipts(self, partners, wallets):
+        """مساهمات رأس المال من الشركاء في محافظهم"""
+        vouchers = [
+            ReceiptVoucher(
+                date=self.past_date(),
+                amount=Decimal(self.rng.randint(10, 200) * 1000),
+                safe=wallet,
+                partner=partner,
+                description=f'مساهمة الشريك {partner.name}'
+            )
+            for partner, wallet in zip(partners, wallets)
+            for _ in range(12)
+        ]
+        self.insert_vouchers(ReceiptVoucher, vouchers)
+
+    def create_contracts(self, count, customers, units, group, safes):
+        """العقود وأقساطها وسندات سدادها على دفعات، كل دفعة في معاملة"""
+        engines = {}
+        totals = [0, 0, 0]
+        for start in range(0, count, self.chunk_size):
+            with transaction.atomic():
+                contracts = []
+                for i in range(start, min(start + self.chunk_size, count)):
+                    unit = units[i]
+                    contracts.append(Contract(
+                        code=f'{self.prefix}-CNT{i + 1:07d}',
+                        customer=self.rng.choice(customers),
+                        unit=unit,
+                        unit_value=unit.price_total,
+                        down_payment=(unit.price_total * self.rng.choice([
+                            Decimal('0.10'), Decimal('0.15'), Decimal('0.20'), Decimal('0.25'), Decimal('0.30')
+                        ])).quantize(CENT),
+                        installments_count=self.rng.choices([12, 24, 36, 48, 60, 84], weights=[5, 15, 25, 20, 25, 10])[0],
+                        schedule_type=self.rng.choices(['monthly', 'quarterly', 'yearly'], weights=[80, 15, 5])[0],
+                        start_date=self.past_date(),
+                        partners_group=group
+                    ))
+                Contract.objects.bulk_create(contracts, batch_size=self.batch_size)
+                Unit.objects.filter(pk__in=[contract.unit_id for contract in contracts]).update(is_sold=True)
+
+                installments = []
+                payments = []
+                for contract in contracts:
+                    engine = engines.get(contract.schedule_type)
+                    if engine is None:
+                        engine = engines[contract.schedule_type] = ScheduleEngine.for_contract(contract)
+                    schedule = ContractService.build_installments(contract, engine, self.today)
+                    payments.extend(self.pay(contract, schedule))
+                    # السداد يغير المدفوع، فتُعاد الحالة بعده
+                    for installment in schedule:
+                        installment.status = installment.compute_status(self.today)
+                    installments.extend(schedule)
+                Installment.objects.bulk_create(installments, batch_size=self.batch_size)
+
+                receipts = [
+                    ReceiptVoucher(
+                        date=paid_on,
+                        amount=amount,
+                        safe=self.rng.choice(safes),
+                        customer_id=contract.customer_id,
+                        contract=contract,
+                        installment=installment,
+                        description=(
+                            f'سداد قسط {installment.seq_no} - عقد {contract.code}' if installment
+                            else f'دفعة مقدمة - عقد {contract.code}'
+                        )
+                    )
+                    for contract, installment, amount, paid_on in payments
+                ]
+                self.insert_vouchers(ReceiptVoucher, receipts)
+
+            totals[0] += len(contracts)
+            totals[1] += len(installments)
+            totals[2] += len(receipts)
+            self.stdout.write(f'  contracts: {totals[0]}/{count}')
+        return totals
+
+    def pay(self, contract, schedule):
+        """سجل سداد العقد حسب سلوك العميل [(العقد، القسط أو None، المبلغ، التاريخ)]
+
+        يضبط paid_amount على الأقساط؛ الأقساط المستحقة غير المسددة تصبح متأخرة.
+        """
+        payments = [(contract, None, contract.down_payment, contract.start_date)] if contract.down_payment else []
+        profile = self.rng.choices(*zip(*PAYER_PROFILES))[0]
+        due = [installment for installment in schedule if installment.due_date <= self.today]
+        stop_at = self.rng.randint(0, len(due)) if profile == 'defaulted' else len(due)
+
+        for index, installment in enumerate(due[:stop_at]):
+            if profile == 'late':
+                paid_on = installment.due_date + timedelta(days=self.rng.randint(5, 75))
+            else:
+                paid_on = installment.due_date + timedelta(days=self.rng.randint(-7, 3))
+            if paid_on > self.today:
+                continue
+
+            amount = installment.amount
+            if profile == 'partial' and index == len(due) - 1:
+                amount = (amount / 2).quantize(CENT)
+            installment.paid_amount = amount
+            payments.append((contract, installment, amount, max(paid_on, contract.start_date)))
+        return payments
+
+    def create_payments(self, count, safes, suppliers, projects):
+        """سندات صرف للموردين والمشاريع والمصروفات العامة"""
+        for start in range(0, count, self.chunk_size * 10):
+            vouchers = []
+            for _ in range(start, min(start + self.chunk_size * 10, count)):
+                kind = self.rng.choices(['supplier', 'project', 'general'], weights=[40, 45, 15])[0]
+                head = 'مشتريات مواد' if kind == 'supplier' else self.rng.choice(EXPENSE_HEADS)
+                vouchers.append(PaymentVoucher(
+                    date=self.past_date(),
+                    amount=Decimal(self.rng.randint(100, 50000)),
+                    safe=self.rng.choice(safes),
+                    supplier=self.rng.choice(suppliers) if kind == 'supplier' else None,
+                    project=self.rng.choice(projects) if kind == 'project' else None,
+                    expense_head=head,
+                    description=head
+                ))
+            with transaction.atomic():
+                self.insert_vouchers(PaymentVoucher, vouchers)
+        return count
+
+    def create_stock_moves(self, count, items, projects):
+        """حركات مخزن واردة وصادرة للمشاريع"""
+        for start in range(0, count, self.chunk_size * 10):
+            moves = []
+            for _ in range(start, min(start + self.chunk_size * 10, count)):
+                outgoing = self.rng.random() < 0.45
+                moves.append(StockMove(
+                    item=self.rng.choice(items),
+                    project=self.rng.choice(projects) if outgoing else None,
+                    qty=Decimal(self.rng.randint(1, 200)),
+                    direction='OUT' if outgoing else 'IN',
+                    date=self.past_date(),
+                    notes='صرف للمشروع' if outgoing else 'شراء مواد'
+                ))
+            StockMove.objects.bulk_create(moves, batch_size=self.batch_size)
+        return count
+
+    def insert_vouchers(self, model, vouchers):
+        """ترقيم السندات بكتل من العدادات ثم إدراجها"""
+        VoucherService.allocate_numbers(model, vouchers)
+        model.objects.bulk_create(vouchers, batch_size=self.batch_size)
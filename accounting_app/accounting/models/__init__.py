@@ -1,5 +1,5 @@
 from .partners import Partner, PartnersGroup, PartnersGroupMember
-from .safes import Safe
+from .safes import Safe, SafeBalance, SafeDailyClose
 from .customers import Customer
 from .suppliers import Supplier
 from .units import Unit
@@ -9,12 +9,17 @@ from .vouchers import ReceiptVoucher, PaymentVoucher
 from .projects import Project
 from .items_store import Item, StockMove
 from .settlements import Settlement
+from .sequences import DocumentSequence
+from .watermarks import Watermark
+from .report_jobs import ReportJob
 
 __all__ = [
     'Partner',
     'PartnersGroup',
     'PartnersGroupMember',
     'Safe',
+    'SafeBalance',
+    'SafeDailyClose',
     'Customer',
     'Supplier',
     'Unit',
@@ -26,4 +31,7 @@ __all__ = [
     'Item',
     'StockMove',
     'Settlement',
+    'DocumentSequence',
+    'Watermark',
+    'ReportJob',
 ]
\ No newline at end of file
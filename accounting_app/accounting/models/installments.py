@@ -67,14 +67,18 @@ class Installment(models.Model):
     def __str__(self):
         return f"قسط {self.seq_no} - عقد {self.contract.code}"
     
+    def compute_status(self, today=None):
+        """حساب حالة القسط دون حفظ"""
+        today = today or date.today()
+        if self.paid_amount >= self.amount:
+            return 'PAID'
+        if today > self.due_date:
+            return 'LATE'
+        return 'PENDING'
+    
     def update_status(self):
         """تحديث حالة القسط"""
-        if self.paid_amount >= self.amount:
-            self.status = 'PAID'
-        elif date.today() > self.due_date and self.paid_amount < self.amount:
-            self.status = 'LATE'
-        else:
-            self.status = 'PENDING'
+        self.status = self.compute_status()
         self.save(update_fields=['status'])
     
     def add_payment(self, amount):
@@ -38,6 +38,10 @@ class Item(models.Model):
         auto_now_add=True,
         verbose_name="تاريخ الإنشاء"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
 
     class Meta:
         verbose_name = "صنف"
@@ -112,6 +116,10 @@ class StockMove(models.Model):
         auto_now_add=True,
         verbose_name="تاريخ الإنشاء"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
 
     class Meta:
         verbose_name = "حركة مخزن"
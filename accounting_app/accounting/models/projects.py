@@ -58,6 +58,10 @@ class Project(models.Model):
         auto_now_add=True,
         verbose_name="تاريخ الإنشاء"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
 
     class Meta:
         verbose_name = "مشروع"
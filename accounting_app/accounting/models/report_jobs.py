@@ -0,0 +1,134 @@
+from django.db import models
+
+
+class ReportJob(models.Model):
+    """مهمة توليد تقرير في الخلفية مع ملف الناتج المخزن"""
+
+    REPORT_TYPES = [
+        ('treasury', 'تقرير الخزينة'),
+        ('installments', 'تقرير الأقساط'),
+        ('partners_balances', 'أرصدة الشركاء'),
+        ('project_expenses', 'مصروفات المشروع'),
+    ]
+
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'في الانتظار'),
+        ('RUNNING', 'جاري التوليد'),
+        ('DONE', 'جاهز'),
+        ('FAILED', 'فشل'),
+    ]
+
+    report_type = models.CharField(
+        max_length=30,
+        choices=REPORT_TYPES,
+        verbose_name="نوع التقرير"
+    )
+    file_format = models.CharField(
+        max_length=10,
+        choices=FORMATS,
+        default='csv',
+        verbose_name="الصيغة"
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="المعاملات"
+    )
+    params_key = models.CharField(
+        max_length=64,
+        verbose_name="بصمة النوع والمعاملات"
+    )
+    cache_key = models.CharField(
+        max_length=64,
+        verbose_name="بصمة التقرير مع إصدار البيانات"
+    )
+    data_version = models.CharField(
+        max_length=255,
+        verbose_name="إصدار البيانات"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='QUEUED',
+        verbose_name="الحالة"
+    )
+    rows_total = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="عدد الصفوف المتوقع"
+    )
+    rows_written = models.PositiveIntegerField(
+        default=0,
+        verbose_name="الصفوف المكتوبة"
+    )
+    file_path = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="مسار الملف"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="الخطأ"
+    )
+    created_by = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="أنشأ بواسطة"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاريخ الإنشاء"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="بدأ في"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="انتهى في"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="آخر تحديث"
+    )
+
+    class Meta:
+        verbose_name = "مهمة تقرير"
+        verbose_name_plural = "مهام التقارير"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['cache_key', 'status']),
+            models.Index(fields=['params_key']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} ({self.file_format}) - {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        """نسبة الإنجاز المئوية (عند معرفة عدد الصفوف المتوقع)"""
+        if self.status == 'DONE':
+            return 100
+        if not self.rows_total:
+            return None
+        return min(99, self.rows_written * 100 // self.rows_total)
+
+    @property
+    def is_pending(self):
+        return self.status in ('QUEUED', 'RUNNING')
+
+    @property
+    def is_superseded(self):
+        """مهمة مكتملة حُذف ملفها بعد توفر نسخة أحدث من نفس التقرير"""
+        return self.status == 'DONE' and not self.file_path
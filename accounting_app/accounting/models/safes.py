@@ -1,4 +1,5 @@
 from django.db import models
+from decimal import Decimal
 from django.core.exceptions import ValidationError
 from .partners import Partner
 
@@ -25,6 +26,10 @@ class Safe(models.Model):
         auto_now_add=True,
         verbose_name="تاريخ الإنشاء"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
 
     class Meta:
         verbose_name = "خزنة/محفظة"
@@ -57,4 +62,94 @@ class Safe(models.Model):
     def get_balance(self, from_date=None, to_date=None):
         """حساب رصيد الخزنة/المحفظة"""
         from ..services.treasury import TreasuryService
-        return TreasuryService.get_safe_balance(self, from_date, to_date)
\ No newline at end of file
+        return TreasuryService.get_safe_balance(self, from_date, to_date)
+
+
+class SafeBalance(models.Model):
+    """الرصيد المجمع للخزنة/المحفظة (يُحدّث مع كل سند)"""
+    safe = models.OneToOneField(
+        Safe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='balance',
+        verbose_name="الخزنة/المحفظة"
+    )
+    receipts_total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        verbose_name="إجمالي القبض"
+    )
+    payments_total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        verbose_name="إجمالي الصرف"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+
+    class Meta:
+        verbose_name = "رصيد خزنة"
+        verbose_name_plural = "أرصدة الخزائن"
+
+    def __str__(self):
+        return f"رصيد {self.safe}"
+
+    @property
+    def balance(self):
+        """الرصيد = القبض - الصرف"""
+        return self.receipts_total - self.payments_total
+
+
+
+class SafeDailyClose(models.Model):
+    """الإقفال اليومي للخزنة (الأرصدة التراكمية في نهاية اليوم)"""
+    safe = models.ForeignKey(
+        Safe,
+        on_delete=models.CASCADE,
+        related_name='daily_closes',
+        verbose_name="الخزنة/المحفظة"
+    )
+    date = models.DateField(
+        verbose_name="تاريخ الإقفال"
+    )
+    receipts_total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        verbose_name="إجمالي القبض حتى التاريخ"
+    )
+    payments_total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0'),
+        verbose_name="إجمالي الصرف حتى التاريخ"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="تاريخ الإنشاء"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+
+    class Meta:
+        verbose_name = "إقفال يومي"
+        verbose_name_plural = "الإقفالات اليومية"
+        ordering = ['-date']
+        unique_together = [['safe', 'date']]
+        indexes = [
+            models.Index(fields=['safe', 'date']),
+        ]
+
+    def __str__(self):
+        return f"إقفال {self.safe} - {self.date}"
+
+    @property
+    def balance(self):
+        """الرصيد في نهاية اليوم"""
+        return self.receipts_total - self.payments_total
@@ -0,0 +1,26 @@
+from django.db import models
+
+
+class DocumentSequence(models.Model):
+    """عداد ترقيم المستندات (سلسلة لكل بادئة/سنة/خزنة)"""
+    key = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="مفتاح السلسلة"
+    )
+    last_value = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="آخر رقم مستخدم"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="آخر تحديث"
+    )
+
+    class Meta:
+        verbose_name = "تسلسل مستندات"
+        verbose_name_plural = "تسلسلات المستندات"
+        ordering = ['key']
+
+    def __str__(self):
+        return f"{self.key}: {self.last_value}"
@@ -1,4 +1,7 @@
-from django.db import models
+import re
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Length
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from datetime import date
@@ -28,6 +31,10 @@ class VoucherBase(models.Model):
         auto_now_add=True,
         verbose_name="تاريخ الإنشاء"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
     created_by = models.ForeignKey(
         'auth.User',
         on_delete=models.SET_NULL,
@@ -44,11 +51,70 @@ class VoucherBase(models.Model):
             models.Index(fields=['safe']),
         ]
 
+    # حقل الرصيد المجمع الذي يتأثر بهذا النوع من السندات
+    LEDGER_FIELD = None
+
+    # بادئة رقم السند
+    NUMBER_PREFIX = None
+
+    def save(self, *args, **kwargs):
+        # حجز رقم السند وحفظه وترحيله لرصيد الخزنة المجمع في معاملة واحدة
+        with transaction.atomic():
+            if not self.voucher_number:
+                self.voucher_number = self.generate_voucher_number()
+            super().save(*args, **kwargs)
+
+    def generate_voucher_number(self):
+        """توليد رقم السند التلقائي"""
+        return self.allocate_voucher_numbers(1, voucher_date=self.date, safe=self.safe_id)[0]
+
+    @classmethod
+    def allocate_voucher_numbers(cls, count, voucher_date=None, safe=None):
+        """حجز كتلة أرقام سندات متتالية (للاستيراد المجمع)"""
+        from ..services.sequences import SequenceService
+
+        series = cls.number_series(voucher_date, safe)
+        max_length = cls._meta.get_field('voucher_number').max_length
+        # فحص الطول داخل معاملة الحجز حتى يعود العداد كما كان عند الرفض
+        with transaction.atomic():
+            first = SequenceService.allocate(
+                series, count, initial=lambda: cls._last_used_number(series)
+            )
+            numbers = [f"{series}-{number:06d}" for number in range(first, first + count)]
+            if len(numbers[-1]) > max_length:
+                raise ValueError(
+                    f"رقم السند {numbers[-1]} أطول من {max_length} حرفاً"
+                )
+        return numbers
+
+    @classmethod
+    def number_series(cls, voucher_date=None, safe=None):
+        """بادئة سلسلة الترقيم حسب إعداد VOUCHER_NUMBER_SERIES (global/year/safe/year_safe)"""
+        mode = getattr(settings, 'VOUCHER_NUMBER_SERIES', 'global')
+        parts = [cls.NUMBER_PREFIX]
+        if mode in ('year', 'year_safe'):
+            parts.append(str((voucher_date or date.today()).year))
+        if mode in ('safe', 'year_safe'):
+            parts.append(str(getattr(safe, 'pk', safe)))
+        return '-'.join(parts)
+
+    @classmethod
+    def _last_used_number(cls, series):
+        """آخر رقم مستخدم فعلياً في السلسلة (لتهيئة العداد من البيانات الموجودة)"""
+        last_number = cls._default_manager.filter(
+            voucher_number__regex=rf'^{re.escape(series)}-[0-9]+$'
+        ).annotate(
+            number_length=Length('voucher_number')
+        ).order_by('-number_length', '-voucher_number').values_list(
+            'voucher_number', flat=True
+        ).first()
+        return int(last_number.rsplit('-', 1)[1]) if last_number else 0
+
 
 class ReceiptVoucher(VoucherBase):
     """نموذج سندات القبض"""
     voucher_number = models.CharField(
-        max_length=20,
+        max_length=30,
         unique=True,
         verbose_name="رقم السند"
     )
@@ -88,38 +154,30 @@ class ReceiptVoucher(VoucherBase):
     class Meta:
         verbose_name = "سند قبض"
         verbose_name_plural = "سندات القبض"
+        indexes = [
+            # مفتاح ترتيب التيار والمؤشر (keyset) حتى يكون البحث بلا ترتيب إضافي
+            models.Index(fields=['date', 'created_at', 'id']),
+        ]
+
+    LEDGER_FIELD = 'receipts_total'
+    NUMBER_PREFIX = 'RV'
 
     def __str__(self):
         return f"سند قبض {self.voucher_number}"
     
     def save(self, *args, **kwargs):
-        # توليد رقم السند تلقائياً إذا لم يكن موجوداً
-        if not self.voucher_number:
-            self.voucher_number = self.generate_voucher_number()
-        
         super().save(*args, **kwargs)
         
         # تحديث القسط إذا كان مرتبطاً
         if self.installment:
             from ..services.installments import InstallmentService
             InstallmentService.process_payment(self.installment, self.amount)
-    
-    def generate_voucher_number(self):
-        """توليد رقم السند التلقائي"""
-        last_voucher = ReceiptVoucher.objects.order_by('-id').first()
-        if last_voucher and last_voucher.voucher_number.startswith('RV-'):
-            try:
-                last_number = int(last_voucher.voucher_number.split('-')[1])
-                return f"RV-{last_number + 1:06d}"
-            except:
-                pass
-        return "RV-000001"
 
 
 class PaymentVoucher(VoucherBase):
     """نموذج سندات الصرف"""
     voucher_number = models.CharField(
-        max_length=20,
+        max_length=30,
         unique=True,
         verbose_name="رقم السند"
     )
@@ -148,24 +206,13 @@ class PaymentVoucher(VoucherBase):
     class Meta:
         verbose_name = "سند صرف"
         verbose_name_plural = "سندات الصرف"
+        indexes = [
+            # مفتاح ترتيب التيار والمؤشر (keyset) حتى يكون البحث بلا ترتيب إضافي
+            models.Index(fields=['date', 'created_at', 'id']),
+        ]
+
+    LEDGER_FIELD = 'payments_total'
+    NUMBER_PREFIX = 'PV'
 
     def __str__(self):
         return f"سند صرف {self.voucher_number}"
-    
-    def save(self, *args, **kwargs):
-        # توليد رقم السند تلقائياً إذا لم يكن موجوداً
-        if not self.voucher_number:
-            self.voucher_number = self.generate_voucher_number()
-        
-        super().save(*args, **kwargs)
-    
-    def generate_voucher_number(self):
-        """توليد رقم السند التلقائي"""
-        last_voucher = PaymentVoucher.objects.order_by('-id').first()
-        if last_voucher and last_voucher.voucher_number.startswith('PV-'):
-            try:
-                last_number = int(last_voucher.voucher_number.split('-')[1])
-                return f"PV-{last_number + 1:06d}"
-            except:
-                pass
-        return "PV-000001"
\ No newline at end of file
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class Watermark(models.Model):
+    """علامة آخر تشغيل للمهام الدورية (لمعالجة التغييرات منذ آخر تشغيل فقط)"""
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="المهمة"
+    )
+    value = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="آخر تاريخ تمت معالجته"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="آخر تحديث"
+    )
+
+    class Meta:
+        verbose_name = "علامة تشغيل"
+        verbose_name_plural = "علامات التشغيل"
+        ordering = ['key']
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
@@ -0,0 +1,154 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('accounting.perf')
+
+# آخر الطلبات المسجلة في هذه العملية لصفحة /_perf/
+_history = deque(maxlen=getattr(settings, 'PERF_HISTORY_SIZE', 500))
+_history_lock = threading.Lock()
+
+# عدد أكثر الاستعلامات تكراراً المحفوظة مع كل طلب
+DUPLICATES_LIMIT = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """تجاوز عدد استعلامات طلب للحد المعلن للعرض"""
+    pass
+
+
+class QueryStats:
+    """إحصائيات استعلامات SQL ومدة كتلة من الكود"""
+
+    def __init__(self):
+        self.count = 0
+        self.sql_time = 0.0
+        self.elapsed = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """الاستعلامات المتكررة بنفس الشكل [(البصمة, العدد)] مرتبة من الأكثر تكراراً"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common(DUPLICATES_LIMIT) if count > 1]
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'total_ms': round(self.elapsed * 1000, 2),
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in self.duplicates],
+        }
+
+
+@contextmanager
+def record_queries():
+    """تسجيل عدد استعلامات SQL ومدتها وتكرارها والمدة الكلية داخل الكتلة
+
+        with record_queries() as stats:
+            ...
+        stats.count, stats.duplicates
+    """
+    stats = QueryStats()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        try:
+            yield stats
+        finally:
+            stats.elapsed = time.perf_counter() - started
+
+
+def query_budget(max_queries):
+    """إعلان الحد الأقصى لعدد استعلامات العرض (يُتحقق منه في PerfMiddleware)"""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def fingerprint(sql):
+    """شكل الاستعلام بعد استبدال القيم الحرفية، لاكتشاف تكرار N+1"""
+    sql = _STRING.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACES.sub(' ', sql).strip()
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def check_budget(record):
+    """مقارنة عدد الاستعلامات بحد العرض: استثناء في الاختبارات وتحذير في الإنتاج"""
+    budget = record.get('budget')
+    if budget is None or record['queries'] <= budget:
+        return
+    message = f"{record['view']} ran {record['queries']} queries (budget {budget})"
+    if settings.PERF_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message, extra={'perf': record})
+
+
+def recent_requests():
+    """نسخة من آخر الطلبات المسجلة (الأحدث أولاً)"""
+    with _history_lock:
+        return list(reversed(_history))
+
+
+def clear_history():
+    with _history_lock:
+        _history.clear()
+
+
+class PerfMiddleware:
+    """تسجيل عدد استعلامات كل طلب ومدتها في سجل منظم وفي صفحة /_perf/
+
+    يُفعّل بإضافته إلى MIDDLEWARE (أو PERF_INSTRUMENTATION=True).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with record_queries() as stats:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': (match.view_name if match else None) or request.path,
+            'status': response.status_code,
+            'budget': request.query_budget,
+            'at': time.time(),
+            **stats.as_dict(),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False), extra={'perf': record})
+        with _history_lock:
+            _history.append(record)
+
+        check_budget(record)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+        return None
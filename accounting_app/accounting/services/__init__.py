@@ -3,6 +3,12 @@ from .installments import InstallmentService
 from .treasury import TreasuryService
 from .settlements import SettlementService
 from .reports import ReportService
+from .customers import CustomerService
+from .sequences import SequenceService
+from .vouchers import VoucherService
+from .schedule import ScheduleEngine
+from .dashboard import DashboardService
+from .report_jobs import ReportJobService
 
 __all__ = [
     'ContractService',
@@ -10,4 +16,10 @@ __all__ = [
     'TreasuryService',
     'SettlementService',
     'ReportService',
+    'CustomerService',
+    'SequenceService',
+    'VoucherService',
+    'ScheduleEngine',
+    'DashboardService',
+    'ReportJobService',
 ]
\ No newline at end of file
@@ -1,60 +1,27 @@
-from decimal import Decimal, ROUND_HALF_UP
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
 from datetime import date
-from dateutil.relativedelta import relativedelta
-from ..models import Installment
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Contract, Customer, Unit, PartnersGroup, Installment
+from .schedule import ScheduleEngine
+from .dashboard import DashboardService
+from .importing import CENT, chunks, lookup, resolve, is_blank, clean, parse_date, parse_amount
 
 
 class ContractService:
     """خدمة إدارة العقود والأقساط"""
     
     @staticmethod
-    def generate_installments(contract):
+    def generate_installments(contract, balloons=None):
         """توليد جدول الأقساط للعقد"""
         if contract.installments_count == 0:
             return []
         
-        # حساب قيمة القسط الأساسية
-        remaining_amount = contract.unit_value - contract.down_payment
-        base_installment = remaining_amount / contract.installments_count
-        
-        # تقريب قيمة القسط إلى أقرب قرش
-        base_installment = base_installment.quantize(
-            Decimal('0.01'), 
-            rounding=ROUND_HALF_UP
-        )
-        
-        installments = []
-        current_date = contract.start_date
-        total_installments_amount = Decimal('0')
-        
-        # حدد الفترة الزمنية حسب نوع الجدولة
-        if contract.schedule_type == 'monthly':
-            delta = relativedelta(months=1)
-        elif contract.schedule_type == 'quarterly':
-            delta = relativedelta(months=3)
-        else:  # yearly
-            delta = relativedelta(years=1)
-        
-        # إنشاء الأقساط
-        for i in range(contract.installments_count):
-            if i == contract.installments_count - 1:
-                # آخر قسط يأخذ الفرق لضمان دقة المجموع
-                installment_amount = remaining_amount - total_installments_amount
-            else:
-                installment_amount = base_installment
-                total_installments_amount += installment_amount
-            
-            installment = Installment(
-                contract=contract,
-                seq_no=i + 1,
-                due_date=current_date,
-                amount=installment_amount,
-                paid_amount=Decimal('0'),
-                status='PENDING'
-            )
-            installments.append(installment)
-            
-            current_date += delta
+        installments = ContractService.build_installments(contract, balloons=balloons)
         
         # حفظ جميع الأقساط
         Installment.objects.bulk_create(installments)
@@ -63,92 +30,381 @@ class ContractService:
     
     @staticmethod
     def recalculate_installments(contract, new_schedule=None):
-        """إعادة حساب الأقساط (في حالة تعديل العقد)"""
-        # حذف الأقساط غير المدفوعة
-        contract.installments.filter(status__in=['PENDING', 'LATE']).delete()
+        """إعادة حساب الأقساط (في حالة تعديل العقد) بتطبيق الفروق فقط
         
-        # حساب المبلغ المتبقي
-        total_paid = contract.installments.filter(status='PAID').aggregate(
-            total=models.Sum('paid_amount')
-        )['total'] or Decimal('0')
-        
-        remaining_amount = contract.unit_value - contract.down_payment - total_paid
-        remaining_count = contract.installments_count - contract.installments.filter(status='PAID').count()
-        
-        if remaining_count > 0 and remaining_amount > 0:
-            # إنشاء أقساط جديدة للمبلغ المتبقي
-            base_installment = remaining_amount / remaining_count
-            base_installment = base_installment.quantize(
-                Decimal('0.01'), 
-                rounding=ROUND_HALF_UP
-            )
+        الأقساط المدفوعة لا تُمس، والأقساط المفتوحة تُعدل في مكانها فيحتفظ المدفوع منها
+        جزئياً بمبلغه وبالسندات المرتبطة به، ولا يُنشأ أو يُحذف إلا فرق عدد الأقساط.
+        يُرفض التعديل (ValueError) إذا صارت قيمة قسط مدفوع منه جزء أقل من المدفوع.
+        يُرجع {'created': [...], 'updated': [...], 'deleted': [أرقام الأقساط المحذوفة]}
+        """
+        with transaction.atomic():
+            existing = list(contract.installments.select_for_update().order_by('seq_no'))
+            paid = [installment for installment in existing if installment.status == 'PAID']
+            open_rows = [installment for installment in existing if installment.status != 'PAID']
             
-            # الحصول على آخر قسط مدفوع
-            last_paid = contract.installments.filter(status='PAID').order_by('-seq_no').first()
-            start_seq = (last_paid.seq_no + 1) if last_paid else 1
+            remaining_amount = (
+                contract.unit_value - contract.down_payment
+                - sum((installment.paid_amount for installment in paid), Decimal('0'))
+            )
+            remaining_count = contract.installments_count - len(paid)
+            if remaining_amount <= 0:
+                remaining_count = 0
+            remaining_count = max(remaining_count, 0)
             
-            # تحديد تاريخ البداية
-            if last_paid:
-                current_date = last_paid.due_date
-                if contract.schedule_type == 'monthly':
-                    current_date += relativedelta(months=1)
-                elif contract.schedule_type == 'quarterly':
-                    current_date += relativedelta(months=3)
-                else:
-                    current_date += relativedelta(years=1)
-            else:
-                current_date = new_schedule or contract.start_date
+            # الأقساط الزائدة تُحذف من الأحدث، ولا يُحذف قسط مدفوع منه جزء
+            deleted = []
+            surplus = len(open_rows) - remaining_count
+            if surplus > 0:
+                deleted = [installment for installment in reversed(open_rows) if not installment.paid_amount][:surplus]
+                if len(deleted) < surplus:
+                    raise ValueError("لا يمكن أن يقل عدد الأقساط المتبقية عن الأقساط المدفوع منها جزئياً")
+                deleted_pks = {installment.pk for installment in deleted}
+                open_rows = [installment for installment in open_rows if installment.pk not in deleted_pks]
             
-            # إنشاء الأقساط الجديدة
-            installments = []
-            total_new_amount = Decimal('0')
+            next_seq = existing[-1].seq_no + 1 if existing else 1
+            seqs = [installment.seq_no for installment in open_rows]
+            seqs += list(range(next_seq, next_seq + remaining_count - len(seqs)))
             
-            for i in range(remaining_count):
-                if i == remaining_count - 1:
-                    installment_amount = remaining_amount - total_new_amount
-                else:
-                    installment_amount = base_installment
-                    total_new_amount += installment_amount
-                
-                installment = Installment(
-                    contract=contract,
-                    seq_no=start_seq + i,
-                    due_date=current_date,
-                    amount=installment_amount,
-                    paid_amount=Decimal('0'),
-                    status='PENDING'
-                )
-                installments.append(installment)
+            created = []
+            updated = []
+            if seqs:
+                engine = ScheduleEngine.for_contract(contract)
                 
-                if contract.schedule_type == 'monthly':
-                    current_date += relativedelta(months=1)
-                elif contract.schedule_type == 'quarterly':
-                    current_date += relativedelta(months=3)
+                # التواريخ تتابع آخر قسط مدفوع، أو تبدأ من تاريخ الجدولة الجديد
+                if paid:
+                    anchor, anchor_seq = paid[-1].due_date, paid[-1].seq_no
                 else:
-                    current_date += relativedelta(years=1)
+                    anchor, anchor_seq = new_schedule or contract.start_date, 1
+                first = seqs[0] - anchor_seq
+                dates = engine.due_dates(anchor, seqs[-1] - seqs[0] + 1, offset=first)
+                amounts = engine.amounts(remaining_amount, len(seqs))
+                
+                today = date.today()
+                now = timezone.now()
+                for index, (seq_no, amount) in enumerate(zip(seqs, amounts)):
+                    due_date = dates[seq_no - anchor_seq - first]
+                    if index < len(open_rows):
+                        installment = open_rows[index]
+                        if installment.amount == amount and installment.due_date == due_date:
+                            continue
+                        if amount < installment.paid_amount:
+                            raise ValueError(
+                                f"قيمة القسط {seq_no} الجديدة أقل من المدفوع منه ({installment.paid_amount})"
+                            )
+                        installment.amount = amount
+                        installment.due_date = due_date
+                        installment.updated_at = now
+                        updated.append(installment)
+                    else:
+                        installment = Installment(
+                            contract=contract,
+                            seq_no=seq_no,
+                            due_date=due_date,
+                            amount=amount,
+                            paid_amount=Decimal('0')
+                        )
+                        created.append(installment)
+                    # الحالة تُحسب هنا لأن تحديث الحالات التزايدي لا يعود لتواريخ قبل آخر تشغيل
+                    installment.status = installment.compute_status(today)
             
-            Installment.objects.bulk_create(installments)
+            if deleted:
+                Installment.objects.filter(pk__in=[installment.pk for installment in deleted]).delete()
+            if updated:
+                Installment.objects.bulk_update(updated, ['amount', 'due_date', 'status', 'updated_at'])
+            if created:
+                Installment.objects.bulk_create(created)
+        
+        if updated or created:
+            DashboardService.invalidate_cache()
+        
+        return {
+            'created': created,
+            'updated': updated,
+            'deleted': [installment.seq_no for installment in deleted],
+        }
+    
+    @staticmethod
+    def build_installments(contract, engine=None, today=None, balloons=None):
+        """أقساط العقد غير المحفوظة حسب شروطه (للإدراج المجمع)
+        
+        engine اختياري لإعادة استخدام محرك الجدولة بين العقود (الافتراضي حسب نوع جدولة العقد).
+        الحالة تُحسب عند الإنشاء: عقد بتاريخ بدء سابق تنشأ أقساطه الفائتة متأخرة،
+        لأن التحديث التزايدي للحالات لا يرى إلا ما عبر تاريخ استحقاقه بعد آخر تشغيل.
+        """
+        today = today or date.today()
+        schedule = (engine or ScheduleEngine.for_contract(contract)).build(
+            contract.unit_value - contract.down_payment,
+            contract.installments_count,
+            contract.start_date,
+            balloons=balloons
+        )
+        installments = [
+            Installment(
+                contract=contract,
+                seq_no=row['seq_no'],
+                due_date=row['due_date'],
+                amount=row['amount'],
+                paid_amount=Decimal('0')
+            )
+            for row in schedule
+        ]
+        for installment in installments:
+            installment.status = installment.compute_status(today)
+        return installments
+    
+    @staticmethod
+    def import_contracts(rows, skip_invalid=False, dry_run=False, batch_size=2000,
+                         chunk_size=1000, progress=None):
+        """استيراد مجموعة عقود مع جداول أقساطها
+
+        كل صف قاموس بالمفاتيح: code, customer (الكود), unit (الكود), installments_count,
+        start_date، وبشكل اختياري unit_value (الافتراضي سعر الوحدة), down_payment,
+        schedule_type (الافتراضي monthly), partners_group (الاسم).
+        تُتحقق الصفوف كلها في الذاكرة باستعلامات بحث مجمعة، ثم تُحفظ على دفعات بحجم
+        chunk_size: قفل الوحدات، تحديدها كمباعة بتحديث واحد، إدراج العقود، ثم إدراج
+        أقساط كل عقود الدفعة معاً. مع skip_invalid كل دفعة في معاملة مستقلة، وبدونه
+        تُحفظ الدفعات كلها في معاملة واحدة فإذا بيعت وحدة أثناء الاستيراد لا يُحفظ شيء.
+        progress اختياري يُستدعى بعد كل دفعة بـ (عدد العقود المحفوظة، الإجمالي).
+        يُرجع {'created': العدد, 'installments': العدد, 'errors': [{'row': رقم الصف, 'errors': [...]}]}
+        """
+        rows = list(rows)
+        customers = lookup(Customer.objects, 'code', (row.get('customer') for row in rows))
+        units = lookup(
+            Unit.objects, 'code', (row.get('unit') for row in rows), 'is_sold', 'price_total'
+        )
+        groups = lookup(PartnersGroup.objects, 'name', (row.get('partners_group') for row in rows))
+        existing_codes = set()
+        for chunk in chunks(list({clean(row.get('code')) for row in rows})):
+            existing_codes.update(
+                Contract.objects.filter(code__in=chunk).values_list('code', flat=True)
+            )
+
+        contracts = []
+        errors = []
+        seen_codes = {}
+        seen_units = {}
+        for index, row in enumerate(rows, start=1):
+            row_errors = []
+            contract = ContractService._build_contract(index, row, customers, units, groups, row_errors)
+
+            if contract.code in existing_codes:
+                row_errors.append(f'كود العقد موجود مسبقاً: {contract.code}')
+            elif contract.code and contract.code in seen_codes:
+                row_errors.append(f'كود العقد مكرر في الملف (الصف {seen_codes[contract.code]})')
+            if contract.unit_id and contract.unit_id in seen_units:
+                row_errors.append(f'الوحدة مكررة في الملف (الصف {seen_units[contract.unit_id]})')
+            seen_codes.setdefault(contract.code, index)
+            seen_units.setdefault(contract.unit_id, index)
+
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+            else:
+                contracts.append(contract)
+
+        if dry_run or (errors and not skip_invalid) or not contracts:
+            return {'created': 0, 'installments': 0, 'errors': errors}
+
+        created = 0
+        installments_created = 0
+        engines = {}
+        with nullcontext() if skip_invalid else transaction.atomic():
+            for chunk in chunks(contracts, chunk_size):
+                with transaction.atomic():
+                    chunk = ContractService._lock_units(chunk, errors)
+                    if chunk:
+                        Unit.objects.filter(pk__in=[contract.unit_id for contract in chunk]).update(is_sold=True)
+                        Contract.objects.bulk_create(chunk, batch_size=batch_size)
+                        ContractService._fill_missing_pks(chunk)
+
+                        installments = []
+                        for contract in chunk:
+                            engine = engines.get(contract.schedule_type)
+                            if engine is None:
+                                engine = engines[contract.schedule_type] = ScheduleEngine.for_contract(contract)
+                            installments.extend(ContractService.build_installments(contract, engine))
+                        Installment.objects.bulk_create(installments, batch_size=batch_size)
+
+                        created += len(chunk)
+                        installments_created += len(installments)
+
+                if errors and not skip_invalid:
+                    # وحدة بيعت أثناء الاستيراد: إلغاء الدفعات السابقة أيضاً بدلاً من استيراد جزئي
+                    transaction.set_rollback(True)
+                    created = installments_created = 0
+                    break
+
+                if progress:
+                    progress(created, len(contracts))
+
+        if created:
+            DashboardService.invalidate_cache()
+        
+        errors.sort(key=lambda error: error['row'])
+        return {'created': created, 'installments': installments_created, 'errors': errors}
+    
+    @staticmethod
+    def _build_contract(index, row, customers, units, groups, row_errors):
+        """بناء العقد من صف الاستيراد والتحقق منه دون حفظ"""
+        contract = Contract()
+        contract._import_row = index
+        contract.code = clean(row.get('code'))
+        if not contract.code:
+            row_errors.append('كود العقد مطلوب')
+
+        if is_blank(row.get('customer')):
+            row_errors.append('العميل مطلوب')
+        else:
+            contract.customer_id = resolve(customers, row.get('customer'), 'العميل', row_errors)
+
+        unit = None
+        if is_blank(row.get('unit')):
+            row_errors.append('الوحدة مطلوبة')
+        else:
+            unit = resolve(units, row.get('unit'), 'الوحدة', row_errors)
+        if unit:
+            contract.unit_id, is_sold, price_total = unit
+            if is_sold:
+                row_errors.append(f'الوحدة مباعة بالفعل: {clean(row.get("unit"))}')
+
+        if is_blank(row.get('unit_value')):
+            contract.unit_value = unit[2] if unit else None
+        else:
+            contract.unit_value = parse_amount(row.get('unit_value'), row_errors)
+
+        contract.down_payment = Decimal('0')
+        if not is_blank(row.get('down_payment')):
+            try:
+                contract.down_payment = Decimal(clean(row.get('down_payment')).replace(',', '')).quantize(CENT)
+            except (InvalidOperation, ValueError):
+                row_errors.append(f'دفعة مقدمة غير صالحة: {clean(row.get("down_payment"))}')
+            else:
+                if contract.down_payment < 0:
+                    row_errors.append('الدفعة المقدمة لا يمكن أن تكون سالبة')
+
+        try:
+            contract.installments_count = int(clean(row.get('installments_count')))
+        except ValueError:
+            contract.installments_count = None
+        if not contract.installments_count or contract.installments_count < 1:
+            row_errors.append(f'عدد أقساط غير صالح: {clean(row.get("installments_count"))}')
+
+        contract.schedule_type = clean(row.get('schedule_type')).lower() or 'monthly'
+        if contract.schedule_type not in dict(Contract.SCHEDULE_TYPES):
+            row_errors.append(f'نوع جدولة غير معروف: {contract.schedule_type}')
+
+        contract.start_date = parse_date(row.get('start_date'), row_errors)
+        contract.partners_group_id = resolve(groups, row.get('partners_group'), 'مجموعة الشركاء', row_errors)
+
+        if not row_errors:
+            try:
+                contract.clean()
+            except ValidationError as error:
+                row_errors.extend(error.messages)
+
+        return contract
     
     @staticmethod
-    def get_contract_summary(contract):
-        """الحصول على ملخص العقد"""
-        installments = contract.installments.all()
+    def _lock_units(contracts, errors):
+        """قفل وحدات الدفعة واستبعاد ما بيع منها منذ التحقق"""
+        unit_ids = [contract.unit_id for contract in contracts]
+        available = set(
+            Unit.objects.select_for_update().filter(pk__in=unit_ids, is_sold=False).values_list('pk', flat=True)
+        )
+        available -= set(Contract.objects.filter(unit_id__in=available).values_list('unit_id', flat=True))
+
+        locked = []
+        for contract in contracts:
+            if contract.unit_id in available:
+                locked.append(contract)
+            else:
+                errors.append({'row': contract._import_row, 'errors': ['الوحدة بيعت أثناء الاستيراد']})
+        return locked
+    
+    @staticmethod
+    def _fill_missing_pks(contracts):
+        """استكمال معرفات العقود على قواعد البيانات التي لا تُرجعها مع الإدراج المجمع"""
+        missing = [contract for contract in contracts if contract.pk is None]
+        if not missing:
+            return
+
+        pks = dict(
+            Contract.objects.filter(code__in=[contract.code for contract in missing]).values_list('code', 'pk')
+        )
+        for contract in missing:
+            contract.pk = pks[contract.code]
+    
+    @staticmethod
+    def annotate_installment_stats(queryset):
+        """إضافة إحصائيات الأقساط لكل عقد في نفس الاستعلام (بدلاً من استعلامات لكل عقد)"""
+        money = DecimalField(max_digits=15, decimal_places=2)
+        return queryset.annotate(
+            paid_installments=Count('installments', filter=Q(installments__status='PAID')),
+            late_installments=Count('installments', filter=Q(installments__status='LATE')),
+            total_paid=ExpressionWrapper(
+                F('down_payment') + Coalesce(
+                    Sum('installments__paid_amount'), Value(Decimal('0')), output_field=money
+                ),
+                output_field=money
+            ),
+        ).annotate(
+            balance_due=ExpressionWrapper(F('unit_value') - F('total_paid'), output_field=money)
+        )
+    
+    @staticmethod
+    def get_contract_summary(contract, installments=None):
+        """الحصول على ملخص العقد
+        
+        إذا مُررت أقساط العقد المحملة مسبقاً يُحسب الملخص منها في الذاكرة دون استعلامات،
+        وإلا يُحسب باستعلام تجميعي واحد.
+        """
+        if installments is None:
+            return ContractService.get_contract_summaries([contract])[contract.pk]
         
-        paid_installments = installments.filter(status='PAID')
-        late_installments = installments.filter(status='LATE')
-        pending_installments = installments.filter(status='PENDING')
+        stats = {'paid_count': 0, 'late_count': 0, 'pending_count': 0, 'paid_total': Decimal('0')}
+        for installment in installments:
+            if installment.status == 'PAID':
+                stats['paid_count'] += 1
+                stats['paid_total'] += installment.paid_amount
+            elif installment.status == 'LATE':
+                stats['late_count'] += 1
+            elif installment.status == 'PENDING':
+                stats['pending_count'] += 1
         
-        total_paid = paid_installments.aggregate(
-            total=models.Sum('paid_amount')
-        )['total'] or Decimal('0')
+        return ContractService._build_summary(contract, stats)
+    
+    @staticmethod
+    def get_contract_summaries(contracts):
+        """ملخصات مجموعة عقود باستعلام تجميعي واحد {معرف العقد: الملخص}"""
+        contracts = list(contracts)
+        rows = {
+            row['contract']: row
+            for row in Installment.objects.filter(
+                contract__in=[contract.pk for contract in contracts]
+            ).order_by().values('contract').annotate(
+                paid_count=Count('pk', filter=Q(status='PAID')),
+                late_count=Count('pk', filter=Q(status='LATE')),
+                pending_count=Count('pk', filter=Q(status='PENDING')),
+                paid_total=Sum('paid_amount', filter=Q(status='PAID')),
+            )
+        }
+        
+        return {
+            contract.pk: ContractService._build_summary(contract, rows.get(contract.pk, {}))
+            for contract in contracts
+        }
+    
+    @staticmethod
+    def _build_summary(contract, stats):
+        """بناء ملخص العقد من إحصائيات الأقساط"""
+        total_paid = stats.get('paid_total') or Decimal('0')
         
         return {
             'contract_value': contract.unit_value,
             'down_payment': contract.down_payment,
             'total_installments': contract.installments_count,
-            'paid_installments_count': paid_installments.count(),
-            'late_installments_count': late_installments.count(),
-            'pending_installments_count': pending_installments.count(),
+            'paid_installments_count': stats.get('paid_count', 0),
+            'late_installments_count': stats.get('late_count', 0),
+            'pending_installments_count': stats.get('pending_count', 0),
             'total_paid': contract.down_payment + total_paid,
             'remaining_amount': contract.unit_value - (contract.down_payment + total_paid),
             'completion_percentage': ((contract.down_payment + total_paid) / contract.unit_value * 100) if contract.unit_value > 0 else 0
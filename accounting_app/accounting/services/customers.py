@@ -0,0 +1,113 @@
+from decimal import Decimal
+from django.db.models import (
+    Value, CharField, DecimalField, IntegerField, OuterRef, Subquery, Count, Sum
+)
+from django.db.models.functions import Coalesce, Concat, TruncDate
+from ..models import Contract, ReceiptVoucher
+from .ledger import LedgerStream, ledger_source
+
+
+class CustomerService:
+    """خدمة العملاء وكشوف الحساب"""
+    
+    @staticmethod
+    def annotate_totals(queryset):
+        """إضافة عدد العقود وإجمالي قيمتها والمدفوع لكل عميل باستعلامات فرعية في نفس الاستعلام"""
+        money = DecimalField(max_digits=18, decimal_places=2)
+        contracts = Contract.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+        receipts = ReceiptVoucher.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+        
+        # استعلامات فرعية مستقلة حتى لا يتضاعف المجموع بسبب ربط جدولين متعددين
+        return queryset.annotate(
+            contracts_count=Coalesce(
+                Subquery(contracts.annotate(total=Count('pk')).values('total'), output_field=IntegerField()),
+                Value(0)
+            ),
+            total_contracts_value=Coalesce(
+                Subquery(contracts.annotate(total=Sum('unit_value')).values('total'), output_field=money),
+                Value(Decimal('0')),
+                output_field=money
+            ),
+            total_paid=Coalesce(
+                Subquery(receipts.annotate(total=Sum('amount')).values('total'), output_field=money),
+                Value(Decimal('0')),
+                output_field=money
+            ),
+        )
+    
+    @staticmethod
+    def iter_statement(customer, from_date=None, to_date=None):
+        """توليد حركات كشف حساب العميل مرتبة مع الرصيد التراكمي"""
+        stream = CustomerService._statement_stream(customer, from_date, to_date)
+        for row in stream.rows():
+            yield CustomerService._statement_row(row)
+    
+    @staticmethod
+    def get_statement_page(customer, from_date=None, to_date=None, after=None, page_size=50):
+        """صفحة من كشف حساب العميل بمؤشر مع الرصيد المرحل والرصيد النهائي"""
+        stream = CustomerService._statement_stream(customer, from_date, to_date)
+        # الرصيد النهائي يُحسب مع الصفحة الأولى فقط ثم يُحمل في المؤشر
+        page = stream.page(
+            after=after,
+            page_size=page_size,
+            carry=lambda: {'final_balance': str(stream.balance_through())}
+        )
+        page['rows'] = [CustomerService._statement_row(row) for row in page['rows']]
+        page['final_balance'] = Decimal(page['carry']['final_balance'])
+        return page
+    
+    @staticmethod
+    def _statement_stream(customer, from_date, to_date):
+        """تيار العقود والدفعات المقدمة وسندات القبض للعميل"""
+        contracts = Contract.objects.filter(customer=customer)
+        
+        # سندات القبض فقط تُفلتر بالتاريخ
+        receipts = ReceiptVoucher.objects.filter(customer=customer)
+        if from_date:
+            receipts = receipts.filter(date__gte=from_date)
+        if to_date:
+            receipts = receipts.filter(date__lte=to_date)
+        
+        return LedgerStream([
+            ledger_source(
+                contracts,
+                'contract',
+                date=TruncDate('created_at'),
+                reference='code',
+                description=Concat(
+                    Value('عقد '), 'code', Value(' - وحدة '), 'unit__name',
+                    output_field=CharField()
+                ),
+                debit='unit_value'
+            ),
+            ledger_source(
+                contracts.filter(down_payment__gt=Decimal('0')),
+                'down_payment',
+                date=TruncDate('created_at'),
+                reference='code',
+                description=Concat(
+                    Value('دفعة مقدمة - عقد '), 'code',
+                    output_field=CharField()
+                ),
+                credit='down_payment'
+            ),
+            ledger_source(
+                receipts,
+                'receipt',
+                reference='voucher_number',
+                credit='amount'
+            ),
+        ])
+    
+    @staticmethod
+    def _statement_row(row):
+        """تحويل حركة التيار إلى صف كشف الحساب"""
+        return {
+            'date': row['date'],
+            'type': row['type'],
+            'description': row['description'],
+            'debit': row['debit'],
+            'credit': row['credit'],
+            'reference': row['reference'],
+            'balance': row['balance']
+        }
@@ -0,0 +1,184 @@
+from decimal import Decimal
+from datetime import date
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import (
+    DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce, TruncMonth
+from ..models import (
+    ReceiptVoucher, PaymentVoucher, Installment, Contract, Customer, Unit,
+    Project, SafeBalance, StockMove
+)
+
+
+DASHBOARD_CACHE = 'dashboard'
+
+# رقم الجيل يدخل في مفاتيح التخزين المؤقت، وزيادته تُبطل كل النتائج السابقة دفعة واحدة
+GENERATION_KEY = 'dashboard:generation'
+
+
+class DashboardService:
+    """خدمة مؤشرات لوحة التحكم بعدد ثابت من الاستعلامات"""
+
+    @staticmethod
+    def cached(name, compute):
+        """نتيجة compute من ذاكرة التخزين المؤقت للوحة التحكم أو حسابها وتخزينها"""
+        cache = caches[DASHBOARD_CACHE]
+        generation = cache.get(GENERATION_KEY, 1)
+        key = f'dashboard:{name}'
+
+        result = cache.get(key, version=generation)
+        if result is None:
+            result = compute()
+            cache.set(key, result, version=generation)
+        return result
+
+    @staticmethod
+    def invalidate_cache():
+        """إبطال كل نتائج لوحة التحكم المخزنة"""
+        cache = caches[DASHBOARD_CACHE]
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 2, timeout=None)
+        else:
+            # incr في الملفات وقاعدة البيانات يعيد الكتابة بالمهلة الافتراضية، والجيل لا ينتهي
+            cache.touch(GENERATION_KEY, timeout=None)
+
+    @staticmethod
+    def get_cached_kpis():
+        return DashboardService.cached('kpis', DashboardService.get_kpis)
+
+    @staticmethod
+    def get_cached_monthly_chart(months=12):
+        # تاريخ اليوم جزء من المفتاح حتى يتحرك الرسم مع بداية كل شهر
+        today = date.today()
+        return DashboardService.cached(
+            f'chart:{months}:{today.isoformat()}',
+            lambda: DashboardService.get_monthly_chart(months, today)
+        )
+
+    @staticmethod
+    def get_cached_over_budget_projects():
+        return DashboardService.cached('over_budget', DashboardService.get_over_budget_projects)
+
+    @staticmethod
+    def get_kpis():
+        """المؤشرات الرئيسية: الإجماليات من دفتر أرصدة الخزائن والأعداد في استعلام واحد"""
+        totals = SafeBalance.objects.aggregate(
+            receipts=Sum('receipts_total'),
+            payments=Sum('payments_total'),
+        )
+        total_receipts = totals['receipts'] or Decimal('0')
+        total_payments = totals['payments'] or Decimal('0')
+
+        counts = _count_all(
+            late_installments_count=Installment.objects.filter(status='LATE'),
+            active_contracts=Contract.objects.all(),
+            total_customers=Customer.objects.filter(is_active=True),
+            available_units=Unit.objects.filter(is_sold=False),
+            ongoing_projects=Project.objects.filter(status='ongoing'),
+        )
+
+        return {
+            'total_receipts': total_receipts,
+            'total_payments': total_payments,
+            'net_balance': total_receipts - total_payments,
+            **counts,
+        }
+
+    @staticmethod
+    def get_monthly_chart(months=12, today=None):
+        """القبض والصرف لكل شهر في آخر عدد من الشهور باستعلام GROUP BY واحد لكل نوع سند"""
+        today = today or date.today()
+        month_starts = []
+        year, month = today.year, today.month
+        for _ in range(months):
+            month_starts.append(date(year, month, 1))
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        month_starts.reverse()
+
+        totals = {}
+        for key, model in (('receipts', ReceiptVoucher), ('payments', PaymentVoucher)):
+            grouped = model.objects.filter(
+                date__gte=month_starts[0], date__lte=today
+            ).annotate(month=TruncMonth('date')).order_by().values('month').annotate(
+                total=Sum('amount')
+            )
+            totals[key] = {_month_start(row['month']): row['total'] for row in grouped}
+
+        return [
+            {
+                'month': month_start.strftime('%Y-%m'),
+                'receipts': float(totals['receipts'].get(month_start, 0)),
+                'payments': float(totals['payments'].get(month_start, 0)),
+            }
+            for month_start in month_starts
+        ]
+
+    @staticmethod
+    def annotate_expenses(queryset):
+        """إضافة إجمالي مصروفات المشروع (السندات وتكلفة المواد المنصرفة) باستعلامات فرعية"""
+        money = DecimalField(max_digits=18, decimal_places=2)
+        payments = PaymentVoucher.objects.filter(project=OuterRef('pk')).order_by().values('project')
+        materials = StockMove.objects.filter(
+            project=OuterRef('pk'), direction='OUT'
+        ).order_by().values('project')
+
+        return queryset.annotate(
+            total_expenses=ExpressionWrapper(
+                Coalesce(
+                    Subquery(payments.annotate(total=Sum('amount')).values('total'), output_field=money),
+                    Value(Decimal('0')),
+                    output_field=money
+                ) + Coalesce(
+                    Subquery(
+                        materials.annotate(
+                            total=Sum(F('qty') * F('item__unit_price'), output_field=money)
+                        ).values('total'),
+                        output_field=money
+                    ),
+                    Value(Decimal('0')),
+                    output_field=money
+                ),
+                output_field=money
+            )
+        )
+
+    @staticmethod
+    def get_over_budget_projects():
+        """المشاريع الجارية التي تجاوزت ميزانيتها في استعلام واحد"""
+        projects = DashboardService.annotate_expenses(
+            Project.objects.filter(status='ongoing')
+        ).filter(total_expenses__gt=F('budget'))
+
+        return [
+            {
+                'project': project,
+                'over_amount': project.total_expenses - project.budget,
+                'percentage': (project.total_expenses / project.budget * 100) if project.budget else 0
+            }
+            for project in projects
+        ]
+
+
+def _month_start(value):
+    """توحيد ناتج TruncMonth (تاريخ أو تاريخ ووقت حسب قاعدة البيانات) إلى أول الشهر"""
+    if hasattr(value, 'date'):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def _count_all(**querysets):
+    """عدّ عدة استعلامات في جملة SELECT واحدة من استعلامات فرعية عددية {الاسم: العدد}"""
+    columns = []
+    params = []
+    for name, queryset in querysets.items():
+        sql, query_params = queryset.order_by().values('pk').query.sql_with_params()
+        columns.append(f'(SELECT COUNT(*) FROM ({sql}) counted) AS {connection.ops.quote_name(name)}')
+        params.extend(query_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columns)}", params)
+        return dict(zip(querysets, cursor.fetchone()))
@@ -0,0 +1,114 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from datetime import date, datetime
+from openpyxl import load_workbook
+
+
+CENT = Decimal('0.01')
+
+# حجم دفعات البحث (IN) حتى لا نتجاوز حد المعاملات في قاعدة البيانات
+LOOKUP_CHUNK = 900
+
+
+def read_rows(path):
+    """قراءة الصفوف كقواميس بأسماء الأعمدة من ملف CSV أو XLSX"""
+    if path.suffix.lower() in ('.xlsx', '.xlsm'):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            values = workbook.active.iter_rows(values_only=True)
+            header = [normalize_header(name) for name in next(values, [])]
+            return [
+                dict(zip(header, row))
+                for row in values
+                if any(cell not in (None, '') for cell in row)
+            ]
+        finally:
+            workbook.close()
+
+    if path.suffix.lower() != '.csv':
+        raise ValueError(f'Unsupported file type: {path.suffix}')
+
+    with path.open(encoding='utf-8-sig', newline='') as handle:
+        reader = csv.reader(handle)
+        header = [normalize_header(name) for name in next(reader, [])]
+        return [dict(zip(header, row)) for row in reader if any(row)]
+
+
+def normalize_header(name):
+    return str(name or '').strip().lower().replace(' ', '_')
+
+
+def chunks(values, size=LOOKUP_CHUNK):
+    """تقسيم القيم إلى دفعات"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def lookup(manager, field, values, *extra):
+    """تحميل {قيمة الحقل: المعرف} (أو صف بالحقول الإضافية) لكل القيم باستعلامات مجمعة"""
+    values = list({clean(value) for value in values if not is_blank(value)})
+    found = {}
+    for chunk in chunks(values):
+        for row in manager.filter(**{f'{field}__in': chunk}).values_list(field, 'pk', *extra):
+            found[str(row[0])] = row[1:] if extra else row[1]
+    return found
+
+
+def resolve(found, value, label, row_errors):
+    """إرجاع معرف المرجع أو تسجيل خطأ إذا لم يوجد"""
+    if is_blank(value):
+        return None
+    result = found.get(clean(value))
+    if result is None:
+        row_errors.append(f'{label} غير موجود أو غير محدد: {clean(value)}')
+    return result
+
+
+def is_blank(value):
+    return value is None or str(value).strip() == ''
+
+
+def clean(value):
+    """تنظيف القيمة النصية (مع تحويل الأرقام الصحيحة من Excel مثل 12.0 إلى 12)"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_date(value, row_errors):
+    """تحويل التاريخ من النص أو من خلية Excel"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if is_blank(value):
+        row_errors.append('التاريخ مطلوب')
+        return None
+
+    value = clean(value)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in ('%d/%m/%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    row_errors.append(f'تاريخ غير صالح: {value}')
+    return None
+
+
+def parse_amount(value, row_errors):
+    """تحويل المبلغ إلى Decimal بدقة القرش"""
+    try:
+        amount = Decimal(clean(value).replace(',', '')).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        row_errors.append(f'مبلغ غير صالح: {clean(value)}')
+        return None
+    if amount <= 0:
+        row_errors.append('المبلغ يجب أن يكون أكبر من صفر')
+        return None
+    return amount
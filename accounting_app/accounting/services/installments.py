@@ -1,6 +1,17 @@
+from collections import defaultdict
 from decimal import Decimal
 from datetime import date
-from ..models import ReceiptVoucher
+from django.db import models, transaction
+from django.utils import timezone
+from ..models import ReceiptVoucher, Installment, Watermark
+from .dashboard import DashboardService
+
+
+# مفتاح علامة آخر تحديث لحالات الأقساط
+STATUS_WATERMARK = 'installment_status'
+
+# حجم دفعات قفل أقساط العقود
+LOCK_CHUNK = 900
 
 
 class InstallmentService:
@@ -12,15 +23,16 @@ class InstallmentService:
         if amount <= 0:
             raise ValueError("مبلغ الدفعة يجب أن يكون أكبر من صفر")
         
-        # إضافة المبلغ المدفوع
-        installment.paid_amount += amount
-        
-        # التأكد من عدم تجاوز قيمة القسط
-        if installment.paid_amount > installment.amount:
-            installment.paid_amount = installment.amount
-        
-        # تحديث حالة القسط
-        installment.update_status()
+        with transaction.atomic():
+            # قراءة المدفوع الحالي مع قفل الصف حتى لا تضيع دفعة متزامنة
+            paid_amount = Installment.objects.select_for_update().filter(
+                pk=installment.pk
+            ).values_list('paid_amount', flat=True).get()
+            
+            # التأكد من عدم تجاوز قيمة القسط
+            installment.paid_amount = min(paid_amount + amount, installment.amount)
+            installment.status = installment.compute_status()
+            installment.save(update_fields=['paid_amount', 'status', 'updated_at'])
         
         return installment
     
@@ -40,30 +52,56 @@ class InstallmentService:
     @staticmethod
     def update_all_installments_status():
         """تحديث حالة جميع الأقساط في النظام"""
-        from ..models import Installment
+        return InstallmentService.refresh_statuses(full=True)
+    
+    @staticmethod
+    def refresh_statuses(today=None, full=False):
+        """تحديث حالات الأقساط التي تغيرت منذ آخر تشغيل وإرجاع عدد الصفوف المعدلة
+        
+        التشغيل التزايدي يحوّل إلى متأخر فقط الأقساط التي عبر تاريخ استحقاقها
+        اليوم منذ العلامة المخزنة (نطاق على فهرس due_date)، أما التشغيل الكامل
+        فيصحح كل قسط حالته المخزنة تخالف حالته الفعلية.
+        """
+        today = today or date.today()
+        now = timezone.now()
+        
+        with transaction.atomic():
+            # قفل العلامة حتى لا يتداخل تشغيلان متزامنان
+            watermark, _ = Watermark.objects.select_for_update().get_or_create(
+                key=STATUS_WATERMARK
+            )
+            
+            if full or watermark.value is None or watermark.value > today:
+                unpaid = Installment.objects.filter(paid_amount__lt=models.F('amount'))
+                changed = Installment.objects.filter(
+                    paid_amount__gte=models.F('amount')
+                ).exclude(status='PAID').update(status='PAID', updated_at=now)
+                changed += unpaid.filter(due_date__lt=today).exclude(
+                    status='LATE'
+                ).update(status='LATE', updated_at=now)
+                changed += unpaid.filter(due_date__gte=today).exclude(
+                    status='PENDING'
+                ).update(status='PENDING', updated_at=now)
+            else:
+                changed = Installment.objects.filter(
+                    due_date__gte=watermark.value,
+                    due_date__lt=today,
+                    status='PENDING',
+                    paid_amount__lt=models.F('amount')
+                ).update(status='LATE', updated_at=now)
+            
+            watermark.value = today
+            watermark.save(update_fields=['value', 'updated_at'])
         
-        # الأقساط المدفوعة بالكامل
-        Installment.objects.filter(
-            paid_amount__gte=models.F('amount')
-        ).update(status='PAID')
-        
-        # الأقساط المتأخرة
-        Installment.objects.filter(
-            due_date__lt=date.today(),
-            paid_amount__lt=models.F('amount')
-        ).update(status='LATE')
-        
-        # الأقساط المعلقة
-        Installment.objects.filter(
-            due_date__gte=date.today(),
-            paid_amount__lt=models.F('amount')
-        ).update(status='PENDING')
+        # التحديث المجمع لا يطلق الإشارات، لذا تُبطل نتائج لوحة التحكم صراحةً
+        if changed:
+            DashboardService.invalidate_cache()
+        
+        return changed
     
     @staticmethod
     def get_customer_installments_summary(customer):
         """ملخص أقساط العميل"""
-        from ..models import Installment
-        
         installments = Installment.objects.filter(
             contract__customer=customer
         )
@@ -127,30 +165,65 @@ class InstallmentService:
     @staticmethod
     def distribute_payment_to_installments(contract, payment_amount):
         """توزيع دفعة على أقساط العقد حسب الأولوية"""
-        remaining_payment = payment_amount
-        updated_installments = []
-        
-        # الحصول على الأقساط غير المدفوعة بالترتيب
-        unpaid_installments = contract.installments.filter(
-            status__in=['LATE', 'PENDING']
-        ).order_by('seq_no')
-        
-        for installment in unpaid_installments:
-            if remaining_payment <= 0:
-                break
-            
-            # المبلغ المتبقي من القسط
-            remaining_installment = installment.amount - installment.paid_amount
+        return InstallmentService.distribute_payments([(contract, payment_amount)])[0]
+    
+    @staticmethod
+    def distribute_payments(payments, today=None):
+        """توزيع مجموعة دفعات [(العقد، المبلغ)] على الأقساط غير المسددة في معاملة واحدة
+        
+        تُقفل أقساط العقود بترتيب ثابت (العقد ثم رقم القسط) لتجنب التخصيص المزدوج
+        والجمود بين المعاملات المتزامنة، ويُحسب التوزيع في الذاكرة ثم يُحفظ بتحديث مجمع واحد.
+        يُرجع لكل دفعة (الأقساط المحدثة، المبلغ المتبقي) بنفس الترتيب.
+        """
+        payments = [(getattr(contract, 'pk', contract), amount) for contract, amount in payments]
+        for _, amount in payments:
+            if amount <= 0:
+                raise ValueError("مبلغ الدفعة يجب أن يكون أكبر من صفر")
+        
+        today = today or date.today()
+        now = timezone.now()
+        contract_ids = sorted({contract_id for contract_id, _ in payments})
+        
+        with transaction.atomic():
+            unpaid = defaultdict(list)
+            for start in range(0, len(contract_ids), LOCK_CHUNK):
+                for installment in Installment.objects.select_for_update().filter(
+                    contract_id__in=contract_ids[start:start + LOCK_CHUNK],
+                    paid_amount__lt=models.F('amount')
+                ).order_by('contract_id', 'seq_no'):
+                    unpaid[installment.contract_id].append(installment)
             
-            if remaining_installment > 0:
-                # تحديد المبلغ المدفوع لهذا القسط
-                payment_for_this = min(remaining_payment, remaining_installment)
+            results = []
+            changed = {}
+            for contract_id, payment_amount in payments:
+                remaining_payment = payment_amount
+                updated_installments = []
                 
-                # تحديث القسط
-                installment.paid_amount += payment_for_this
-                installment.update_status()
+                for installment in unpaid[contract_id]:
+                    if remaining_payment <= 0:
+                        break
+                    
+                    # المبلغ المتبقي من القسط (بعد دفعات سابقة في نفس الدفعة المجمعة)
+                    remaining_installment = installment.amount - installment.paid_amount
+                    if remaining_installment <= 0:
+                        continue
+                    
+                    payment_for_this = min(remaining_payment, remaining_installment)
+                    installment.paid_amount += payment_for_this
+                    installment.status = installment.compute_status(today)
+                    installment.updated_at = now
+                    
+                    updated_installments.append(installment)
+                    changed[installment.pk] = installment
+                    remaining_payment -= payment_for_this
                 
-                updated_installments.append(installment)
-                remaining_payment -= payment_for_this
+                results.append((updated_installments, remaining_payment))
+            
+            Installment.objects.bulk_update(
+                list(changed.values()), ['paid_amount', 'status', 'updated_at'], batch_size=2000
+            )
+        
+        if changed:
+            DashboardService.invalidate_cache()
         
-        return updated_installments, remaining_payment
\ No newline at end of file
+        return results
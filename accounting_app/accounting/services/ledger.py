@@ -0,0 +1,212 @@
+from decimal import Decimal
+from datetime import date, datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.db.models import F, Value, CharField, DecimalField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+CENT = Decimal('0.01')
+
+# أعمدة التيار الموحد بالترتيب
+LEDGER_COLUMNS = [
+    'row_date', 'row_created_at', 'row_kind', 'row_id',
+    'row_reference', 'row_description', 'row_debit', 'row_credit', 'row_safe',
+]
+
+# مفتاح الترتيب الثابت لحركات التيار (ويُستخدم كمؤشر للترقيم)
+LEDGER_ORDER = 'flow.row_date, flow.row_created_at, flow.row_kind, flow.row_id'
+LEDGER_KEY = f'({LEDGER_ORDER})'
+
+CURSOR_SALT = 'accounting.ledger.cursor'
+
+
+def ledger_source(queryset, kind, date=None, created_at='created_at',
+                  reference=None, description='description',
+                  debit=None, credit=None, safe=None):
+    """تحويل استعلام إلى مصدر حركات بأعمدة التيار الموحد"""
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    empty = Value('', output_field=CharField())
+
+    def expression(value, default):
+        if value is None:
+            return default
+        if isinstance(value, str):
+            return F(value)
+        return value
+
+    return queryset.order_by().annotate(
+        row_date=expression(date, F('date')),
+        row_created_at=expression(created_at, F('created_at')),
+        row_kind=Value(kind, output_field=CharField()),
+        row_id=F('pk'),
+        row_reference=expression(reference, empty),
+        row_description=expression(description, empty),
+        row_debit=expression(debit, zero),
+        row_credit=expression(credit, zero),
+        row_safe=expression(safe, empty),
+    ).values(*LEDGER_COLUMNS)
+
+
+class LedgerStream:
+    """دمج عدة مصادر حركات (UNION ALL) في تيار واحد مرتب برصيد تراكمي محسوب في قاعدة البيانات"""
+
+    def __init__(self, sources):
+        self.sources = [source for source in sources if source is not None]
+
+    def _union_sql(self):
+        """نص الاستعلام الموحد ومعاملاته"""
+        first, rest = self.sources[0], self.sources[1:]
+        union = first.union(*rest, all=True) if rest else first
+        return union.query.sql_with_params()
+
+    def _key_params(self, key):
+        """تحويل مفتاح المؤشر إلى معاملات متوافقة مع قاعدة البيانات"""
+        row_date, row_created_at, row_kind, row_id = key
+        return [
+            connection.ops.adapt_datefield_value(row_date),
+            connection.ops.adapt_datetimefield_value(row_created_at),
+            row_kind,
+            row_id,
+        ]
+
+    def balance_through(self, key=None):
+        """مجموع (مدين - دائن) لكل الحركات حتى المؤشر (شاملاً) باستعلام تجميعي واحد"""
+        if not self.sources:
+            return Decimal('0')
+
+        union_sql, params = self._union_sql()
+        sql = f'SELECT SUM(flow.row_debit - flow.row_credit) FROM ({union_sql}) flow'
+        params = list(params)
+        if key is not None:
+            sql += f' WHERE {LEDGER_KEY} <= (%s, %s, %s, %s)'
+            params += self._key_params(key)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return _to_decimal(cursor.fetchone()[0])
+
+    def rows(self, opening_balance=Decimal('0'), after=None, limit=None, chunk_size=2000):
+        """توليد الحركات بالترتيب مع الرصيد التراكمي دون تحميلها كلها في الذاكرة"""
+        if not self.sources:
+            return
+
+        union_sql, params = self._union_sql()
+        params = list(params)
+        where = ''
+        if after is not None:
+            where = f' WHERE {LEDGER_KEY} > (%s, %s, %s, %s)'
+            params += self._key_params(after)
+
+        sql = (
+            f'SELECT flow.*, SUM(flow.row_debit - flow.row_credit) OVER ('
+            f'ORDER BY {LEDGER_ORDER} ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW'
+            f') AS row_balance FROM ({union_sql}) flow{where} ORDER BY {LEDGER_ORDER}'
+        )
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(int(limit))
+
+        # مؤشر على جانب الخادم في PostgreSQL حتى تبقى الذاكرة ثابتة
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                for values in chunk:
+                    row = dict(zip(names, values))
+                    yield {
+                        'date': _to_date(row['row_date']),
+                        'created_at': _to_datetime(row['row_created_at']),
+                        'type': row['row_kind'],
+                        'id': row['row_id'],
+                        'reference': row['row_reference'],
+                        'description': row['row_description'],
+                        'debit': _to_decimal(row['row_debit']),
+                        'credit': _to_decimal(row['row_credit']),
+                        'safe': row['row_safe'],
+                        'balance': opening_balance + _to_decimal(row['row_balance']),
+                    }
+
+    def page(self, after=None, page_size=50, opening_balance=Decimal('0'), carry=None):
+        """صفحة من التيار بمؤشر (keyset) مع رصيد افتتاحي مُرحّل من الصفحات السابقة
+
+        الرصيد التراكمي لآخر صف يُحمل داخل المؤشر الموقّع، فتكلفة أي صفحة مثل الأولى.
+        carry دالة اختيارية تُرجع قيماً (قابلة للتحويل إلى JSON) تُحسب في الصفحة الأولى فقط
+        ثم تُحمل في المؤشر، وتُرجع في 'carry'.
+        """
+        key, state = decode_cursor(after)
+        if key is not None:
+            opening_balance = state['balance']
+            carried = state['carry']
+        else:
+            carried = carry() if carry else None
+
+        rows = list(self.rows(opening_balance, after=key, limit=page_size + 1))
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        return {
+            'rows': rows,
+            'opening_balance': opening_balance,
+            'has_next': has_next,
+            'next_cursor': encode_cursor(rows[-1], carried) if has_next else None,
+            'carry': carried,
+        }
+
+
+def encode_cursor(row, carry=None):
+    """ترميز مفتاح الحركة (التاريخ، وقت الإنشاء، النوع، المعرف) ورصيدها التراكمي كمؤشر موقّع"""
+    return signing.dumps(
+        [row['date'].isoformat(), row['created_at'].isoformat(), row['type'], row['id'],
+         str(row['balance']), carry],
+        salt=CURSOR_SALT
+    )
+
+
+def decode_cursor(token):
+    """فك المؤشر إلى (المفتاح، {'balance', 'carry'})، ويُرجع (None, None) للمؤشر الفارغ أو غير الصالح"""
+    if not token:
+        return None, None
+    try:
+        row_date, row_created_at, row_kind, row_id, balance, carry = signing.loads(token, salt=CURSOR_SALT)
+        key = (
+            date.fromisoformat(row_date),
+            datetime.fromisoformat(row_created_at),
+            row_kind,
+            int(row_id),
+        )
+        return key, {'balance': Decimal(balance), 'carry': carry}
+    except (signing.BadSignature, ValueError, TypeError, ArithmeticError):
+        return None, None
+
+
+def _to_decimal(value):
+    """تحويل القيم الرقمية الخام (قد تكون float في SQLite) إلى Decimal بدقة القرش"""
+    if value is None:
+        return Decimal('0')
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+
+def _to_date(value):
+    """تحويل التاريخ الخام إلى كائن تاريخ"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _to_datetime(value):
+    """تحويل الوقت الخام (نص في SQLite) إلى وقت مع المنطقة الزمنية"""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and settings.USE_TZ and timezone.is_naive(value):
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+from ..models import (
+    ReportJob, ReceiptVoucher, PaymentVoucher, Installment, Contract, Customer,
+    Partner, Safe, SafeBalance, SafeDailyClose, Project, StockMove, Item
+)
+from .reports import ReportService, write_csv, write_xlsx
+
+
+# مجلد ملفات التقارير داخل MEDIA_ROOT
+REPORT_DIR = 'reports'
+
+# تحديث عدد الصفوف المكتوبة (ونبض المهمة) كل عدد من الصفوف
+PROGRESS_EVERY = 500
+
+
+def _date(params, key):
+    value = params.get(key)
+    return date.fromisoformat(value) if value else None
+
+
+def _instance(model, pk):
+    return model.objects.get(pk=pk) if pk else None
+
+
+def _count_cash_flow(from_date, to_date, safe):
+    vouchers = {}
+    if safe:
+        vouchers['safe'] = safe
+    if from_date:
+        vouchers['date__gte'] = from_date
+    if to_date:
+        vouchers['date__lte'] = to_date
+    return ReceiptVoucher.objects.filter(**vouchers).count() + PaymentVoucher.objects.filter(**vouchers).count()
+
+
+# تعريف كل تقرير: تحويل المعاملات إلى وسائط، مولد الصفوف، والجداول التي يُحسب منها إصدار البيانات
+REPORTS = {
+    'treasury': {
+        'title': 'تقرير الخزينة',
+        'formats': ('csv', 'xlsx', 'pdf'),
+        'args': lambda params: (
+            _date(params, 'from_date'), _date(params, 'to_date'), _instance(Safe, params.get('safe'))
+        ),
+        'rows': ReportService.treasury_rows,
+        'pdf': ReportService.write_treasury_report_pdf,
+        'count': _count_cash_flow,
+        'filename': lambda params: f"treasury_report_{params.get('from_date', '')}_{params.get('to_date', '')}",
+        'sources': [
+            (SafeBalance, 'updated_at'), (ReceiptVoucher, 'updated_at'), (PaymentVoucher, 'updated_at'), (Safe, 'updated_at')
+        ],
+    },
+    'installments': {
+        'title': 'تقرير الأقساط',
+        'formats': ('csv', 'xlsx'),
+        'args': lambda params: (
+            _date(params, 'from_date'), _date(params, 'to_date'), params.get('status'), params.get('customer')
+        ),
+        'rows': ReportService.installments_rows,
+        'count': lambda *args: ReportService.installments_queryset(*args).count(),
+        'filename': lambda params: 'installments_report',
+        'sources': [(Installment, 'updated_at'), (Contract, 'updated_at'), (Customer, 'updated_at')],
+    },
+    'partners_balances': {
+        'title': 'أرصدة الشركاء',
+        'formats': ('csv', 'xlsx'),
+        'defaults': lambda: {'as_of_date': date.today().isoformat()},
+        'args': lambda params: (_date(params, 'as_of_date'),),
+        'rows': ReportService.partners_balances_rows,
+        'filename': lambda params: f"partners_balances_{params['as_of_date']}",
+        'sources': [
+            (Partner, 'updated_at'), (SafeBalance, 'updated_at'), (SafeDailyClose, 'updated_at'), (Safe, 'updated_at')
+        ],
+    },
+    'project_expenses': {
+        'title': 'مصروفات المشروع',
+        'formats': ('csv', 'xlsx'),
+        'args': lambda params: (
+            Project.objects.get(pk=params['project']), _date(params, 'from_date'), _date(params, 'to_date')
+        ),
+        'rows': ReportService.project_expenses_rows,
+        'filename': lambda params: f"project_expenses_{params['project']}",
+        'sources': [
+            (Project, 'updated_at'), (PaymentVoucher, 'updated_at'), (StockMove, 'updated_at'), (Item, 'updated_at'),
+            (SafeBalance, 'updated_at')
+        ],
+    },
+}
+
+
+class ReportJobService:
+    """خدمة توليد التقارير في الخلفية مع إعادة استخدام الملفات الجاهزة"""
+
+    @staticmethod
+    def request(report_type, file_format='csv', params=None, user=None):
+        """طلب تقرير
+
+        يُرجع مهمة جاهزة بنفس النوع والمعاملات وإصدار البيانات إن وُجد ملفها، أو مهمة مماثلة
+        قيد التنفيذ، وإلا يُنشئ مهمة جديدة في قائمة الانتظار.
+        """
+        definition = REPORTS.get(report_type)
+        if definition is None:
+            raise ValueError(f"نوع تقرير غير معروف: {report_type}")
+        if file_format not in definition['formats']:
+            raise ValueError(f"الصيغة {file_format} غير متاحة لهذا التقرير")
+
+        params = {
+            key: str(value)
+            for key, value in {**definition.get('defaults', dict)(), **(params or {})}.items()
+            if value not in (None, '')
+        }
+        try:
+            definition['args'](params)
+        except (KeyError, ValueError, ObjectDoesNotExist) as error:
+            raise ValueError(f"معاملات التقرير غير صالحة: {error}")
+
+        params_key = _digest(report_type, file_format, params)
+        data_version = ReportJobService.data_version(report_type)
+        cache_key = _digest(params_key, data_version)
+
+        existing = ReportJob.objects.filter(cache_key=cache_key).exclude(status='FAILED').first()
+        if existing and (existing.is_pending or ReportJobService.artifact_exists(existing)):
+            return existing
+
+        return ReportJob.objects.create(
+            report_type=report_type,
+            file_format=file_format,
+            params=params,
+            params_key=params_key,
+            cache_key=cache_key,
+            data_version=data_version,
+            created_by=user
+        )
+
+    @staticmethod
+    def data_version(report_type):
+        """بصمة حالة البيانات التي يعتمد عليها التقرير (العدد وآخر تعديل أو آخر معرف لكل جدول)
+
+        الإضافة والحذف يغيران العدد، والتعديل يغير آخر تحديث للجداول التي لها updated_at
+        (تعديل تاريخ سند لا يغير رصيد خزنته المجمع فلا يكفي الاعتماد على الأرصدة).
+        """
+        parts = []
+        for model, field in REPORTS[report_type]['sources']:
+            stats = model.objects.aggregate(count=Count('pk'), last=Max(field))
+            parts.append(f"{model.__name__}:{stats['count']}:{stats['last']}")
+        return _digest(*parts)
+
+    @staticmethod
+    def artifact_path(job):
+        return os.path.join(settings.MEDIA_ROOT, job.file_path) if job.file_path else None
+
+    @staticmethod
+    def artifact_exists(job):
+        path = ReportJobService.artifact_path(job)
+        return job.status == 'DONE' and path is not None and os.path.exists(path)
+
+    @staticmethod
+    def latest_artifact(job):
+        """أحدث مهمة مكتملة لنفس التقرير والمعاملات لا يزال ملفها موجوداً (لروابط النسخ المستبدلة)"""
+        candidates = ReportJob.objects.filter(
+            params_key=job.params_key, status='DONE'
+        ).exclude(file_path='').order_by('-finished_at')
+        return next((candidate for candidate in candidates if ReportJobService.artifact_exists(candidate)), None)
+
+    @staticmethod
+    def download_name(job):
+        return f"{REPORTS[job.report_type]['filename'](job.params)}.{job.file_format}"
+
+    @staticmethod
+    def run(job):
+        """حجز مهمة منتظرة وتنفيذها وكتابة ناتجها، ويُرجع True عند النجاح"""
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(pk=job.pk, status='QUEUED').update(
+            status='RUNNING', started_at=now, updated_at=now, rows_written=0, error=''
+        )
+        if not claimed:
+            return False
+        job.refresh_from_db()
+
+        # المحاولة تملك المهمة بوقت حجزها: إذا أُعيدت للانتظار وحجزتها محاولة أخرى
+        # لا تلمس هذه المحاولة حالتها، ولكل محاولة ملفها الجزئي الخاص
+        attempt = ReportJob.objects.filter(pk=job.pk, status='RUNNING', started_at=job.started_at)
+
+        definition = REPORTS[job.report_type]
+        relative_path = os.path.join(REPORT_DIR, f'{job.report_type}_{job.cache_key[:20]}.{job.file_format}')
+        path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        partial_path = f'{path}.{job.pk}.{job.started_at:%Y%m%d%H%M%S%f}.part'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            args = definition['args'](job.params)
+            if 'count' in definition:
+                _heartbeat(attempt, job)
+                # صف العناوين محسوب ضمن الإجمالي
+                job.rows_total = definition['count'](*args) + 1
+                attempt.update(rows_total=job.rows_total, updated_at=timezone.now())
+
+            if job.file_format == 'pdf':
+                with open(partial_path, 'wb') as handle:
+                    definition['pdf'](
+                        handle, *args, progress=lambda written: _heartbeat(attempt, job, written + 1)
+                    )
+            else:
+                rows = _track_progress(attempt, job, definition['rows'](*args))
+                if job.file_format == 'csv':
+                    with open(partial_path, 'w', encoding='utf-8-sig', newline='') as handle:
+                        write_csv(rows, handle)
+                else:
+                    with open(partial_path, 'wb') as handle:
+                        write_xlsx(rows, handle, definition['title'])
+
+            # الملف النهائي يظهر كاملاً أو لا يظهر، ولا تنشره إلا المحاولة المالكة
+            _heartbeat(attempt, job)
+            os.replace(partial_path, path)
+        except Exception as error:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            attempt.update(
+                status='FAILED', error=str(error), finished_at=timezone.now(), updated_at=timezone.now()
+            )
+            return False
+
+        done = attempt.update(
+            status='DONE', file_path=relative_path, rows_written=job.rows_written,
+            finished_at=timezone.now(), updated_at=timezone.now()
+        )
+        if not done:
+            return False
+        ReportJobService._purge_superseded(job, relative_path)
+        return True
+
+    @staticmethod
+    def requeue_stale():
+        """إعادة المهام التي توقف عاملها (لم تُحدّث منذ مدة) إلى قائمة الانتظار لتُستأنف"""
+        stale_before = timezone.now() - timedelta(minutes=settings.REPORT_JOB_STALE_MINUTES)
+        return ReportJob.objects.filter(status='RUNNING', updated_at__lt=stale_before).update(
+            status='QUEUED', updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def run_pending(workers=2, limit=None):
+        """تنفيذ المهام المنتظرة بمجموعة خيوط محلية، ويُرجع عدد المهام التي اكتملت"""
+        ReportJobService.requeue_stale()
+        pending = ReportJob.objects.filter(status='QUEUED').order_by('created_at').values_list('pk', flat=True)
+        if limit:
+            pending = pending[:limit]
+        pending = list(pending)
+
+        if workers <= 1:
+            return sum(ReportJobService.run(job) for job in ReportJob.objects.filter(pk__in=pending))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(_run_in_thread, pending))
+
+    @staticmethod
+    def _purge_superseded(job, relative_path):
+        """حذف ملفات النسخ الأقدم من نفس التقرير بعد توفر نسخة أحدث"""
+        superseded = ReportJob.objects.filter(
+            params_key=job.params_key, status='DONE'
+        ).exclude(pk=job.pk).exclude(file_path__in=['', relative_path])
+        for old_job in superseded:
+            path = ReportJobService.artifact_path(old_job)
+            if os.path.exists(path):
+                os.remove(path)
+        superseded.update(file_path='')
+
+
+def _track_progress(attempt, job, rows):
+    """تمرير الصفوف مع تسجيل عدد المكتوب منها ونبض المهمة على فترات"""
+    for index, row in enumerate(rows, start=1):
+        yield row
+        job.rows_written = index
+        if index % PROGRESS_EVERY == 0:
+            _heartbeat(attempt, job)
+
+
+def _heartbeat(attempt, job, rows_written=None):
+    """تحديث نبض المهمة وعدد صفوفها المكتوبة، وإيقاف المحاولة إذا لم تعد تملك المهمة"""
+    if rows_written is not None:
+        job.rows_written = rows_written
+    if not attempt.update(rows_written=job.rows_written, updated_at=timezone.now()):
+        raise RuntimeError("أُعيدت المهمة إلى قائمة الانتظار وتنفذها محاولة أخرى")
+
+
+def _run_in_thread(pk):
+    """تنفيذ مهمة في خيط مستقل بإغلاق اتصال قاعدة البيانات الخاص به في النهاية"""
+    try:
+        return ReportJobService.run(ReportJob.objects.get(pk=pk))
+    finally:
+        connection.close()
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
@@ -1,27 +1,44 @@
 import csv
-import io
+import tempfile
+from itertools import islice
 from datetime import date, datetime
 from decimal import Decimal
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
 from django.template.loader import render_to_string
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_RIGHT, TA_CENTER
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 import os
 from django.conf import settings
 
 
+# عدد الصفوف التي تُجلب من قاعدة البيانات في كل دفعة أثناء بث التقارير
+STREAM_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# عدد الحركات في كل صفحة من تقرير PDF (جدول واحد لكل صفحة)
+PDF_ROWS_PER_PAGE = 22
+PDF_MARGIN = 30
+PDF_TITLE_HEIGHT = 50
+
+PDF_TREASURY_HEADER = ['الرصيد', 'صرف', 'قبض', 'البيان', 'النوع', 'رقم السند', 'التاريخ']
+
+
 class ReportService:
     """خدمة إنشاء التقارير"""
     
     @staticmethod
     def setup_arabic_font():
         """إعداد الخط العربي للتقارير PDF"""
+        # يُسجّل الخط مرة واحدة لكل عملية
+        if 'Arabic' in pdfmetrics.getRegisteredFontNames():
+            return 'Arabic'
         try:
             # محاولة تحميل خط عربي
             font_path = os.path.join(settings.STATIC_ROOT, 'fonts', 'NotoSansArabic-Regular.ttf')
@@ -33,19 +50,15 @@ class ReportService:
         return 'Helvetica'
     
     @staticmethod
-    def generate_treasury_report_csv(from_date, to_date, safe=None):
-        """توليد تقرير الخزينة بصيغة CSV"""
+    def treasury_rows(from_date, to_date, safe=None):
+        """صفوف تقرير الخزينة (العناوين ثم الحركات) بقيم مكتوبة الأنواع"""
         from .treasury import TreasuryService
         
         # الحصول على بيانات التدفق النقدي
-        cash_flow = TreasuryService.get_cash_flow(from_date, to_date, safe)
-        
-        # إنشاء ملف CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
+        cash_flow = TreasuryService.iter_cash_flow(from_date, to_date, safe)
         
         # العناوين
-        writer.writerow([
+        yield [
             'التاريخ',
             'رقم السند',
             'النوع',
@@ -54,110 +67,125 @@ class ReportService:
             'صرف',
             'الرصيد',
             'الخزنة'
-        ])
+        ]
         
         # البيانات
         for item in cash_flow:
-            writer.writerow([
-                item['date'].strftime('%Y-%m-%d'),
+            yield [
+                item['date'],
                 item['voucher_number'],
                 'قبض' if item['type'] == 'receipt' else 'صرف',
                 item['description'],
-                str(item['amount_in']),
-                str(item['amount_out']),
-                str(item['balance']),
+                item['amount_in'],
+                item['amount_out'],
+                item['balance'],
                 item['safe']
-            ])
-        
-        # إنشاء الاستجابة
-        response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="treasury_report_{from_date}_{to_date}.csv"'
+            ]
+    
+    @staticmethod
+    def generate_treasury_report_csv(from_date, to_date, safe=None):
+        """توليد تقرير الخزينة بصيغة CSV"""
+        return _csv_response(
+            ReportService.treasury_rows(from_date, to_date, safe),
+            f'treasury_report_{from_date}_{to_date}.csv'
+        )
+    
+    @staticmethod
+    def generate_treasury_report_xlsx(from_date, to_date, safe=None):
+        """توليد تقرير الخزينة بصيغة Excel"""
+        return _xlsx_response(
+            ReportService.treasury_rows(from_date, to_date, safe),
+            f'treasury_report_{from_date}_{to_date}.xlsx',
+            'تقرير الخزينة'
+        )
+    
+    @staticmethod
+    def generate_treasury_report_pdf(from_date, to_date, safe=None):
+        """توليد تقرير الخزينة بصيغة PDF"""
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="treasury_report_{from_date}_{to_date}.pdf"'
         
-        # إضافة BOM لدعم Excel مع UTF-8
-        response.content = '\ufeff' + output.getvalue()
+        ReportService.write_treasury_report_pdf(response, from_date, to_date, safe)
         
         return response
     
     @staticmethod
-    def generate_treasury_report_pdf(from_date, to_date, safe=None):
-        """توليد تقرير الخزينة بصيغة PDF"""
+    def write_treasury_report_pdf(handle, from_date, to_date, safe=None, progress=None):
+        """كتابة تقرير الخزينة بصيغة PDF في ملف أو استجابة
+
+        تُرسم كل صفحة كجدول مستقل بعدد ثابت من الحركات مع الرصيد المرحل من الصفحة السابقة
+        وإجمالي الصفحة، فلا يُحمّل التقرير كله في الذاكرة ويبقى وقت التخطيط خطياً في عدد الصفحات.
+        progress اختياري يُستدعى بعد كل صفحة بعدد الحركات المكتوبة حتى الآن.
+        """
         from .treasury import TreasuryService
         
         # الحصول على بيانات التدفق النقدي
-        cash_flow = TreasuryService.get_cash_flow(from_date, to_date, safe)
-        
-        # إنشاء ملف PDF
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="treasury_report_{from_date}_{to_date}.pdf"'
-        
-        # إعداد الوثيقة
-        doc = SimpleDocTemplate(response, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+        cash_flow = TreasuryService.iter_cash_flow(from_date, to_date, safe)
         
         # الخط العربي
         arabic_font = ReportService.setup_arabic_font()
         
-        # الأنماط
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1a202c'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName=arabic_font
-        )
-        
-        # العناصر
-        elements = []
+        # إعداد الوثيقة
+        page_width, page_height = landscape(A4)
+        pdf = canvas.Canvas(handle, pagesize=(page_width, page_height), pageCompression=1)
+        table_style = _treasury_table_style(arabic_font)
         
         # العنوان
         title_text = f"تقرير الخزينة من {from_date} إلى {to_date}"
         if safe:
             title_text += f" - {safe.name}"
-        elements.append(Paragraph(title_text, title_style))
-        elements.append(Spacer(1, 20))
         
-        # الجدول
-        data = [['الرصيد', 'صرف', 'قبض', 'البيان', 'النوع', 'رقم السند', 'التاريخ']]
-        
-        for item in cash_flow:
-            data.append([
-                f"{item['balance']:,.2f}",
-                f"{item['amount_out']:,.2f}" if item['amount_out'] > 0 else '-',
-                f"{item['amount_in']:,.2f}" if item['amount_in'] > 0 else '-',
-                item['description'][:50],
-                'قبض' if item['type'] == 'receipt' else 'صرف',
-                item['voucher_number'],
-                item['date'].strftime('%Y-%m-%d')
-            ])
-        
-        # إنشاء الجدول
-        table = Table(data, repeatRows=1)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), arabic_font),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('FONTNAME', (0, 1), (-1, -1), arabic_font),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-        ]))
-        
-        elements.append(table)
+        balance = Decimal('0')
+        written = 0
+        pages = _batches(cash_flow, PDF_ROWS_PER_PAGE)
+        for page_number, page_rows in enumerate(pages, start=1):
+            carried_forward = balance
+            total_in = sum((item['amount_in'] for item in page_rows), Decimal('0'))
+            total_out = sum((item['amount_out'] for item in page_rows), Decimal('0'))
+            if page_rows:
+                balance = page_rows[-1]['balance']
+            
+            data = [PDF_TREASURY_HEADER]
+            data.append([_money(carried_forward), '', '', 'رصيد مرحل', '', '', ''])
+            for item in page_rows:
+                data.append([
+                    _money(item['balance']),
+                    _money(item['amount_out']) if item['amount_out'] > 0 else '-',
+                    _money(item['amount_in']) if item['amount_in'] > 0 else '-',
+                    item['description'][:50],
+                    'قبض' if item['type'] == 'receipt' else 'صرف',
+                    item['voucher_number'],
+                    item['date'].strftime('%Y-%m-%d')
+                ])
+            data.append([_money(balance), _money(total_out), _money(total_in), 'إجمالي الصفحة', '', '', ''])
+            
+            # العنوان ورقم الصفحة
+            pdf.setFont(arabic_font, 18)
+            pdf.drawCentredString(page_width / 2, page_height - PDF_MARGIN - 18, title_text)
+            pdf.setFont(arabic_font, 9)
+            pdf.drawString(PDF_MARGIN, PDF_MARGIN / 2, str(page_number))
+            
+            # الجدول
+            table = Table(data, repeatRows=1)
+            table.setStyle(table_style)
+            table_width, table_height = table.wrapOn(pdf, page_width - 2 * PDF_MARGIN, page_height)
+            table.drawOn(
+                pdf,
+                page_width - PDF_MARGIN - table_width,
+                page_height - PDF_MARGIN - PDF_TITLE_HEIGHT - table_height
+            )
+            pdf.showPage()
+            
+            written += len(page_rows)
+            if progress:
+                progress(written)
         
         # بناء PDF
-        doc.build(elements)
-        
-        return response
+        pdf.save()
     
     @staticmethod
-    def generate_installments_report_csv(from_date=None, to_date=None, status=None, customer=None):
-        """توليد تقرير الأقساط بصيغة CSV"""
+    def installments_queryset(from_date=None, to_date=None, status=None, customer=None):
+        """الأقساط المطلوبة في تقرير الأقساط"""
         from ..models import Installment
         
         # فلترة الأقساط
@@ -172,12 +200,15 @@ class ReportService:
         if customer:
             installments = installments.filter(contract__customer=customer)
         
-        # إنشاء ملف CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
+        return installments
+    
+    @staticmethod
+    def installments_rows(from_date=None, to_date=None, status=None, customer=None):
+        """صفوف تقرير الأقساط بقيم مكتوبة الأنواع"""
+        installments = ReportService.installments_queryset(from_date, to_date, status, customer)
         
         # العناوين
-        writer.writerow([
+        yield [
             'رقم العقد',
             'العميل',
             'رقم القسط',
@@ -186,88 +217,92 @@ class ReportService:
             'المدفوع',
             'المتبقي',
             'الحالة'
-        ])
+        ]
         
         # البيانات
-        for installment in installments:
-            writer.writerow([
+        for installment in installments.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            yield [
                 installment.contract.code,
                 installment.contract.customer.name,
                 installment.seq_no,
-                installment.due_date.strftime('%Y-%m-%d'),
-                str(installment.amount),
-                str(installment.paid_amount),
-                str(installment.get_remaining_amount()),
+                installment.due_date,
+                installment.amount,
+                installment.paid_amount,
+                installment.get_remaining_amount(),
                 installment.get_status_display()
-            ])
-        
-        # إنشاء الاستجابة
-        response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="installments_report.csv"'
-        
-        # إضافة BOM
-        response.content = '\ufeff' + output.getvalue()
-        
-        return response
+            ]
     
     @staticmethod
-    def generate_partners_balances_report(as_of_date=None):
-        """توليد تقرير أرصدة الشركاء"""
+    def generate_installments_report_csv(from_date=None, to_date=None, status=None, customer=None):
+        """توليد تقرير الأقساط بصيغة CSV"""
+        return _csv_response(
+            ReportService.installments_rows(from_date, to_date, status, customer),
+            'installments_report.csv'
+        )
+    
+    @staticmethod
+    def generate_installments_report_xlsx(from_date=None, to_date=None, status=None, customer=None):
+        """توليد تقرير الأقساط بصيغة Excel"""
+        return _xlsx_response(
+            ReportService.installments_rows(from_date, to_date, status, customer),
+            'installments_report.xlsx',
+            'تقرير الأقساط'
+        )
+    
+    @staticmethod
+    def partners_balances_rows(as_of_date):
+        """صفوف تقرير أرصدة الشركاء مع الإجمالي"""
         from .treasury import TreasuryService
         from ..models import Partner
         
-        if not as_of_date:
-            as_of_date = date.today()
-        
-        partners = Partner.objects.all()
-        balances = []
-        
-        for partner in partners:
-            balance = TreasuryService.get_partner_balance(partner)
-            balances.append({
-                'partner': partner,
-                'balance': balance,
-                'share_percent': partner.share_percent
-            })
-        
-        # إنشاء ملف CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
+        partners = list(Partner.objects.all())
+        partner_balances = TreasuryService.get_partner_balances(partners, as_of_date)
         
         # العناوين
-        writer.writerow([
+        yield [
             'كود الشريك',
             'اسم الشريك',
             'نسبة الشراكة %',
             'الرصيد'
-        ])
+        ]
         
         # البيانات
         total_balance = Decimal('0')
-        for item in balances:
-            writer.writerow([
-                item['partner'].code,
-                item['partner'].name,
-                str(item['share_percent']),
-                str(item['balance'])
-            ])
-            total_balance += item['balance']
+        for partner in partners:
+            balance = partner_balances[partner.pk]
+            yield [
+                partner.code,
+                partner.name,
+                partner.share_percent,
+                balance
+            ]
+            total_balance += balance
         
         # الإجمالي
-        writer.writerow(['', '', 'الإجمالي:', str(total_balance)])
-        
-        # إنشاء الاستجابة
-        response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="partners_balances_{as_of_date}.csv"'
-        
-        # إضافة BOM
-        response.content = '\ufeff' + output.getvalue()
-        
-        return response
+        yield ['', '', 'الإجمالي:', total_balance]
     
     @staticmethod
-    def generate_project_expenses_report(project, from_date=None, to_date=None):
-        """توليد تقرير مصروفات المشروع"""
+    def generate_partners_balances_report(as_of_date=None):
+        """توليد تقرير أرصدة الشركاء"""
+        as_of_date = as_of_date or date.today()
+        return _csv_response(
+            ReportService.partners_balances_rows(as_of_date),
+            f'partners_balances_{as_of_date}.csv'
+        )
+    
+    @staticmethod
+    def generate_partners_balances_report_xlsx(as_of_date=None):
+        """توليد تقرير أرصدة الشركاء بصيغة Excel"""
+        as_of_date = as_of_date or date.today()
+        return _xlsx_response(
+            ReportService.partners_balances_rows(as_of_date),
+            f'partners_balances_{as_of_date}.xlsx',
+            'أرصدة الشركاء'
+        )
+    
+    @staticmethod
+    def project_expenses_rows(project, from_date=None, to_date=None):
+        """صفوف تقرير مصروفات المشروع: المصروفات النقدية ثم المواد ثم الملخص"""
         from ..models import PaymentVoucher, StockMove
         
         # فلترة المصروفات
@@ -278,73 +313,189 @@ class ReportService:
             expenses = expenses.filter(date__lte=to_date)
         
         # فلترة المواد
-        materials = StockMove.objects.filter(project=project, direction='OUT')
+        materials = StockMove.objects.filter(project=project, direction='OUT').select_related('item')
         if from_date:
             materials = materials.filter(date__gte=from_date)
         if to_date:
             materials = materials.filter(date__lte=to_date)
         
-        # إنشاء ملف CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
         # معلومات المشروع
-        writer.writerow(['تقرير مصروفات المشروع'])
-        writer.writerow(['كود المشروع:', project.code])
-        writer.writerow(['اسم المشروع:', project.name])
-        writer.writerow(['الميزانية:', str(project.budget)])
-        writer.writerow([])
+        yield ['تقرير مصروفات المشروع']
+        yield ['كود المشروع:', project.code]
+        yield ['اسم المشروع:', project.name]
+        yield ['الميزانية:', project.budget]
+        yield []
         
         # المصروفات النقدية
-        writer.writerow(['المصروفات النقدية'])
-        writer.writerow(['التاريخ', 'رقم السند', 'البيان', 'المبلغ'])
+        yield ['المصروفات النقدية']
+        yield ['التاريخ', 'رقم السند', 'البيان', 'المبلغ']
         
         total_cash = Decimal('0')
-        for expense in expenses:
-            writer.writerow([
-                expense.date.strftime('%Y-%m-%d'),
+        for expense in expenses.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            yield [
+                expense.date,
                 expense.voucher_number,
                 expense.description,
-                str(expense.amount)
-            ])
+                expense.amount
+            ]
             total_cash += expense.amount
         
-        writer.writerow(['', '', 'إجمالي المصروفات النقدية:', str(total_cash)])
-        writer.writerow([])
+        yield ['', '', 'إجمالي المصروفات النقدية:', total_cash]
+        yield []
         
         # المواد المستخدمة
-        writer.writerow(['المواد المستخدمة'])
-        writer.writerow(['التاريخ', 'الصنف', 'الكمية', 'سعر الوحدة', 'القيمة'])
+        yield ['المواد المستخدمة']
+        yield ['التاريخ', 'الصنف', 'الكمية', 'سعر الوحدة', 'القيمة']
         
         total_materials = Decimal('0')
-        for material in materials:
+        for material in materials.iterator(chunk_size=STREAM_CHUNK_SIZE):
             value = material.get_move_value()
-            writer.writerow([
-                material.date.strftime('%Y-%m-%d'),
+            yield [
+                material.date,
                 material.item.name,
                 f"{material.qty} {material.item.uom}",
-                str(material.item.unit_price),
-                str(value)
-            ])
+                material.item.unit_price,
+                value
+            ]
             total_materials += value
         
-        writer.writerow(['', '', '', 'إجمالي قيمة المواد:', str(total_materials)])
-        writer.writerow([])
+        yield ['', '', '', 'إجمالي قيمة المواد:', total_materials]
+        yield []
         
         # الملخص
         total_expenses = total_cash + total_materials
         remaining_budget = project.budget - total_expenses
         
-        writer.writerow(['ملخص المشروع'])
-        writer.writerow(['إجمالي المصروفات:', str(total_expenses)])
-        writer.writerow(['المتبقي من الميزانية:', str(remaining_budget)])
-        writer.writerow(['نسبة الاستهلاك:', f"{project.get_budget_percentage():.2f}%"])
-        
-        # إنشاء الاستجابة
-        response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="project_expenses_{project.code}.csv"'
-        
-        # إضافة BOM
-        response.content = '\ufeff' + output.getvalue()
-        
-        return response
\ No newline at end of file
+        yield ['ملخص المشروع']
+        yield ['إجمالي المصروفات:', total_expenses]
+        yield ['المتبقي من الميزانية:', remaining_budget]
+        yield ['نسبة الاستهلاك:', f"{project.get_budget_percentage():.2f}%"]
+    
+    @staticmethod
+    def generate_project_expenses_report(project, from_date=None, to_date=None):
+        """توليد تقرير مصروفات المشروع"""
+        return _csv_response(
+            ReportService.project_expenses_rows(project, from_date, to_date),
+            f'project_expenses_{project.code}.csv'
+        )
+    
+    @staticmethod
+    def generate_project_expenses_report_xlsx(project, from_date=None, to_date=None):
+        """توليد تقرير مصروفات المشروع بصيغة Excel"""
+        return _xlsx_response(
+            ReportService.project_expenses_rows(project, from_date, to_date),
+            f'project_expenses_{project.code}.xlsx',
+            'مصروفات المشروع'
+        )
+
+
+class _Echo:
+    """كائن كتابة يعيد السطر بدلاً من تخزينه، حتى يكتب csv.writer سطراً واحداً في كل مرة"""
+    
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    """تمثيل القيمة في CSV (التواريخ بصيغة ISO والمبالغ كما هي)"""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _csv_response(rows, filename):
+    """استجابة CSV متدفقة: BOM أولاً (لدعم Excel مع UTF-8) ثم سطر لكل صف دون تجميع الملف في الذاكرة"""
+    writer = csv.writer(_Echo())
+    
+    def stream():
+        yield '\ufeff'
+        for row in rows:
+            yield writer.writerow([_csv_value(value) for value in row])
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_csv(rows, handle):
+    """كتابة الصفوف إلى ملف CSV نصي مفتوح (يُفتح بترميز utf-8-sig ليبدأ بـ BOM)"""
+    writer = csv.writer(handle)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+
+
+def write_xlsx(rows, handle, title):
+    """كتابة الصفوف إلى ملف Excel بوضع الكتابة فقط (الصفوف تُكتب تباعاً ولا تبقى في الذاكرة)
+
+    المبالغ تُكتب أرقاماً عشرية والتواريخ تواريخ بتنسيقات مناسبة، والورقة من اليمين لليسار.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.sheet_view.rightToLeft = True
+    
+    for row in rows:
+        sheet.append([_xlsx_cell(sheet, value) for value in row])
+    
+    workbook.save(handle)
+
+
+def _xlsx_cell(sheet, value):
+    """خلية مكتوبة النوع مع تنسيق الأرقام والتواريخ"""
+    if isinstance(value, Decimal):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = '#,##0.00'
+        return cell
+    if isinstance(value, (date, datetime)):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = 'yyyy-mm-dd'
+        return cell
+    return value
+
+
+def _xlsx_response(rows, filename, title):
+    """استجابة Excel تُبنى في ملف مؤقت على القرص ثم تُرسل على دفعات"""
+    handle = tempfile.TemporaryFile()
+    write_xlsx(rows, handle, title)
+    handle.seek(0)
+    
+    return FileResponse(
+        handle,
+        as_attachment=True,
+        filename=filename,
+        content_type=XLSX_CONTENT_TYPE
+    )
+
+
+def _batches(rows, size):
+    """تقسيم مولد الصفوف إلى قوائم بحجم ثابت (قائمة فارغة واحدة إن لم توجد صفوف)"""
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    yield batch
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _treasury_table_style(font_name):
+    """نمط جدول صفحة الخزينة (العناوين والرصيد المرحل في الأعلى وإجمالي الصفحة في الأسفل)"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 2), (-1, -2), [colors.white, colors.lightgrey]),
+        ('BACKGROUND', (0, 1), (-1, 1), colors.beige),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.beige),
+    ])
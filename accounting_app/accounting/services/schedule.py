@@ -0,0 +1,104 @@
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP, ROUND_DOWN
+
+
+CENT = Decimal('0.01')
+
+
+class ScheduleEngine:
+    """محرك جدولة الأقساط: حساب المبالغ وتواريخ الاستحقاق دون أي وصول لقاعدة البيانات
+
+    المبالغ بدقة القرش ويأخذ آخر قسط الفرق حتى يساوي المجموع المبلغ المطلوب تماماً،
+    والتواريخ تُحسب من تاريخ البداية مباشرة (وليس بالتراكم) فلا ينزاح يوم الاستحقاق
+    بعد الشهور القصيرة.
+    """
+
+    # عدد الشهور في كل فترة حسب نوع الجدولة
+    PERIOD_MONTHS = {
+        'monthly': 1,
+        'quarterly': 3,
+        'semiannual': 6,
+        'yearly': 12,
+    }
+
+    def __init__(self, schedule_type='monthly', period_months=None, period_days=None):
+        if period_months is None and period_days is None:
+            if schedule_type not in self.PERIOD_MONTHS:
+                raise ValueError(f"نوع جدولة غير معروف: {schedule_type}")
+            period_months = self.PERIOD_MONTHS[schedule_type]
+
+        if (period_months or 0) < 0 or (period_days or 0) < 0 or not (period_months or period_days):
+            raise ValueError("مدة الفترة يجب أن تكون موجبة")
+
+        self.period_months = period_months or 0
+        self.period_days = period_days or 0
+
+    @classmethod
+    def for_contract(cls, contract):
+        """محرك الجدولة المناسب لنوع جدولة العقد"""
+        return cls(contract.schedule_type)
+
+    def amounts(self, total, count, balloons=None):
+        """توزيع المبلغ على عدد الأقساط مع دفعات إضافية اختيارية {رقم الفترة (من 1): المبلغ}"""
+        if count <= 0:
+            return []
+
+        balloons = {int(period): Decimal(amount) for period, amount in (balloons or {}).items()}
+        if any(period < 1 or period > count for period in balloons):
+            raise ValueError("رقم فترة الدفعة الإضافية خارج الجدول")
+
+        total = Decimal(total)
+        spread = total - sum(balloons.values(), Decimal('0'))
+        if spread < 0:
+            raise ValueError("مجموع الدفعات الإضافية أكبر من المبلغ المطلوب")
+
+        base = (spread / count).quantize(CENT, rounding=ROUND_HALF_UP)
+        if base * (count - 1) > spread:
+            # التقريب لأعلى قد يجعل آخر قسط سالباً مع المبالغ الصغيرة
+            base = (spread / count).quantize(CENT, rounding=ROUND_DOWN)
+
+        amounts = [base] * count
+        amounts[-1] = spread - base * (count - 1)
+        for period, amount in balloons.items():
+            amounts[period - 1] += amount
+
+        return amounts
+
+    def due_dates(self, start_date, count, offset=0):
+        """تواريخ استحقاق count فترة بدءاً من الفترة offset بعد تاريخ البداية"""
+        periods = range(offset, offset + count)
+
+        if not self.period_months:
+            step = timedelta(days=self.period_days)
+            return [start_date + step * period for period in periods]
+
+        year, month, day = start_date.year, start_date.month, start_date.day
+        month_days = {}
+        dates = []
+        for period in periods:
+            months = month - 1 + period * self.period_months
+            target_year, target_month = year + months // 12, months % 12 + 1
+
+            # تقييد اليوم بآخر يوم في الشهر (31 يناير -> 28/29 فبراير -> 31 مارس)
+            last_day = month_days.get((target_year, target_month))
+            if last_day is None:
+                last_day = month_days[(target_year, target_month)] = calendar.monthrange(
+                    target_year, target_month
+                )[1]
+
+            due_date = date(target_year, target_month, min(day, last_day))
+            if self.period_days:
+                due_date += timedelta(days=self.period_days * period)
+            dates.append(due_date)
+
+        return dates
+
+    def build(self, total, count, start_date, start_seq=1, offset=0, balloons=None):
+        """الجدول الكامل: قائمة {seq_no, due_date, amount}"""
+        amounts = self.amounts(total, count, balloons)
+        dates = self.due_dates(start_date, count, offset)
+        return [
+            {'seq_no': start_seq + index, 'due_date': due_date, 'amount': amount}
+            for index, (due_date, amount) in enumerate(zip(dates, amounts))
+        ]
@@ -0,0 +1,57 @@
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from ..models import DocumentSequence
+
+
+class SequenceService:
+    """خدمة ترقيم المستندات بعدادات مخزنة"""
+    
+    @staticmethod
+    def allocate(key, count=1, initial=None):
+        """حجز عدد من الأرقام المتتالية في السلسلة وإرجاع أول رقم محجوز
+        
+        الحجز تحديث ذري واحد لصف السلسلة يقفل الصف حتى نهاية المعاملة،
+        فلا تتكرر الأرقام مع الإدخال المتزامن ولا تحتاج لإعادة المحاولة،
+        وإلغاء المعاملة يعيد الأرقام فلا تظهر فجوات في الترقيم.
+        """
+        if count < 1:
+            raise ValueError("عدد الأرقام المطلوب حجزها يجب أن يكون موجباً")
+        
+        with transaction.atomic():
+            if not SequenceService._increment(key, count):
+                SequenceService._create(key, initial)
+                SequenceService._increment(key, count)
+            
+            last_value = DocumentSequence.objects.filter(key=key).values_list(
+                'last_value', flat=True
+            ).get()
+        
+        return last_value - count + 1
+    
+    @staticmethod
+    def current(key):
+        """آخر رقم مستخدم في السلسلة"""
+        return DocumentSequence.objects.filter(key=key).values_list(
+            'last_value', flat=True
+        ).first() or 0
+    
+    @staticmethod
+    def _increment(key, count):
+        """زيادة العداد في قاعدة البيانات (يقفل الصف)"""
+        return DocumentSequence.objects.filter(key=key).update(
+            last_value=F('last_value') + count,
+            updated_at=timezone.now()
+        )
+    
+    @staticmethod
+    def _create(key, initial):
+        """إنشاء السلسلة عند أول استخدام بقيمة ابتدائية"""
+        if callable(initial):
+            initial = initial()
+        try:
+            with transaction.atomic():
+                DocumentSequence.objects.create(key=key, last_value=initial or 0)
+        except IntegrityError:
+            # أنشأتها معاملة متزامنة، يكفي التحديث بعدها
+            pass
@@ -1,7 +1,13 @@
+from collections import defaultdict
 from decimal import Decimal
-from datetime import date, datetime
-from django.db.models import Sum, Q
-from ..models import ReceiptVoucher, PaymentVoucher, Safe, Partner
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.db.models import Sum, Q, F
+from django.utils import timezone
+from ..models import (
+    ReceiptVoucher, PaymentVoucher, Safe, SafeBalance, SafeDailyClose, Partner
+)
+from .ledger import LedgerStream, ledger_source
 
 
 class TreasuryService:
@@ -10,71 +16,368 @@ class TreasuryService:
     @staticmethod
     def get_safe_balance(safe, from_date=None, to_date=None):
         """حساب رصيد الخزنة/المحفظة"""
-        # فلترة التواريخ
-        date_filter = Q()
-        if from_date:
-            date_filter &= Q(date__gte=from_date)
+        # الرصيد الكلي يُقرأ مباشرة من جدول الأرصدة المجمعة
+        if not from_date and not to_date:
+            row = SafeBalance.objects.filter(safe=safe).values(
+                'receipts_total', 'payments_total'
+            ).first()
+            receipts_total = row['receipts_total'] if row else Decimal('0')
+            payments_total = row['payments_total'] if row else Decimal('0')
+            return {
+                'receipts': receipts_total,
+                'payments': payments_total,
+                'balance': receipts_total - payments_total
+            }
+        
+        # الرصيد حتى نهاية الفترة
         if to_date:
-            date_filter &= Q(date__lte=to_date)
+            closing = TreasuryService.get_safe_balance_as_of(safe, to_date)
+        else:
+            closing = TreasuryService.get_safe_balance(safe)
         
-        # حساب إجمالي القبض
-        receipts_total = ReceiptVoucher.objects.filter(
-            safe=safe
-        ).filter(date_filter).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
+        # طرح الرصيد السابق لبداية الفترة
+        if from_date:
+            opening = TreasuryService.get_safe_balance_as_of(
+                safe, _to_date(from_date) - timedelta(days=1)
+            )
+            receipts_total = closing['receipts'] - opening['receipts']
+            payments_total = closing['payments'] - opening['payments']
+        else:
+            receipts_total = closing['receipts']
+            payments_total = closing['payments']
         
-        # حساب إجمالي الصرف
-        payments_total = PaymentVoucher.objects.filter(
-            safe=safe
-        ).filter(date_filter).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
+        return {
+            'receipts': receipts_total,
+            'payments': payments_total,
+            'balance': receipts_total - payments_total
+        }
+    
+    @staticmethod
+    def get_safe_balance_as_of(safe, as_of_date):
+        """رصيد الخزنة في نهاية يوم محدد (آخر إقفال يومي + الحركات بعده)"""
+        as_of_date = _to_date(as_of_date)
         
-        # الرصيد = القبض - الصرف
-        balance = receipts_total - payments_total
+        last_close = SafeDailyClose.objects.filter(
+            safe=safe,
+            date__lte=as_of_date
+        ).order_by('-date').first()
+        
+        date_filter = Q(date__lte=as_of_date)
+        if last_close:
+            receipts_total = last_close.receipts_total
+            payments_total = last_close.payments_total
+            date_filter &= Q(date__gt=last_close.date)
+        else:
+            receipts_total = Decimal('0')
+            payments_total = Decimal('0')
+        
+        # إضافة الحركات منذ آخر إقفال فقط
+        if not last_close or last_close.date < as_of_date:
+            receipts_total += ReceiptVoucher.objects.filter(
+                safe=safe
+            ).filter(date_filter).aggregate(
+                total=Sum('amount')
+            )['total'] or Decimal('0')
+            
+            payments_total += PaymentVoucher.objects.filter(
+                safe=safe
+            ).filter(date_filter).aggregate(
+                total=Sum('amount')
+            )['total'] or Decimal('0')
         
         return {
             'receipts': receipts_total,
             'payments': payments_total,
-            'balance': balance
+            'balance': receipts_total - payments_total
         }
     
     @staticmethod
-    def get_partner_balance(partner):
-        """حساب رصيد الشريك (محفظته + حصته من الخزائن العامة)"""
-        balance = partner.opening_balance
+    def close_day(close_date=None):
+        """تسجيل الإقفال اليومي لجميع الخزائن (الافتراضي: أمس)"""
+        if close_date is None:
+            close_date = date.today() - timedelta(days=1)
+        close_date = _to_date(close_date)
+        
+        closes = []
+        for safe in Safe.objects.all():
+            balance = TreasuryService.get_safe_balance_as_of(safe, close_date)
+            closes.append(SafeDailyClose(
+                safe=safe,
+                date=close_date,
+                receipts_total=balance['receipts'],
+                payments_total=balance['payments']
+            ))
+        
+        with transaction.atomic():
+            SafeDailyClose.objects.filter(date=close_date).delete()
+            SafeDailyClose.objects.bulk_create(closes)
+        
+        return closes
+    
+    @staticmethod
+    def post_ledger_deltas(receipt_deltas=None, payment_deltas=None):
+        """ترحيل فروق المبالغ {safe_id: مبلغ} إلى أرصدة الخزائن المجمعة"""
+        deltas = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+        for safe_id, amount in (receipt_deltas or {}).items():
+            deltas[safe_id][0] += amount
+        for safe_id, amount in (payment_deltas or {}).items():
+            deltas[safe_id][1] += amount
+        
+        with transaction.atomic():
+            for safe_id, (receipts, payments) in deltas.items():
+                if not receipts and not payments:
+                    continue
+                
+                rows = SafeBalance.objects.filter(safe_id=safe_id)
+                changes = {
+                    'receipts_total': F('receipts_total') + receipts,
+                    'payments_total': F('payments_total') + payments,
+                    'updated_at': timezone.now(),
+                }
+                if not rows.update(**changes):
+                    # أول حركة على خزنة لا يوجد لها صف رصيد بعد
+                    SafeBalance.objects.get_or_create(safe_id=safe_id)
+                    rows.update(**changes)
+    
+    @staticmethod
+    def record_voucher_change(voucher, previous=None, deleted=False):
+        """تحديث الرصيد المجمع بعد حفظ أو تعديل أو حذف سند"""
+        deltas = defaultdict(Decimal)
+        affected_dates = {voucher.safe_id: _to_date(voucher.date)}
+        
+        # عكس أثر القيم السابقة عند التعديل
+        if previous:
+            deltas[previous['safe_id']] -= previous['amount']
+            previous_date = _to_date(previous['date'])
+            if previous['safe_id'] in affected_dates:
+                previous_date = min(previous_date, affected_dates[previous['safe_id']])
+            affected_dates[previous['safe_id']] = previous_date
+        
+        if deleted:
+            deltas[voucher.safe_id] -= voucher.amount
+        else:
+            deltas[voucher.safe_id] += voucher.amount
+        
+        if voucher.LEDGER_FIELD == 'receipts_total':
+            TreasuryService.post_ledger_deltas(receipt_deltas=deltas)
+        else:
+            TreasuryService.post_ledger_deltas(payment_deltas=deltas)
+        
+        TreasuryService.invalidate_daily_closes(affected_dates)
+    
+    @staticmethod
+    def invalidate_daily_closes(affected_dates):
+        """حذف الإقفالات اليومية التي تغيرت بسبب حركة بتاريخ سابق {safe_id: تاريخ}"""
+        stale = Q()
+        for safe_id, changed_date in affected_dates.items():
+            stale |= Q(safe_id=safe_id, date__gte=changed_date)
+        if stale:
+            SafeDailyClose.objects.filter(stale).delete()
+    
+    @staticmethod
+    def rebuild_safe_balances(commit=True):
+        """إعادة بناء أرصدة الخزائن المجمعة من السندات والتحقق من مطابقتها"""
+        mismatches = []
+        
+        with transaction.atomic():
+            # قفل صفوف الأرصدة أولاً حتى لا تضيع حركات تتم أثناء إعادة البناء
+            stored = {
+                row.safe_id: row
+                for row in SafeBalance.objects.select_for_update()
+            }
+            
+            receipts = dict(
+                ReceiptVoucher.objects.order_by().values('safe').annotate(
+                    total=Sum('amount')
+                ).values_list('safe', 'total')
+            )
+            payments = dict(
+                PaymentVoucher.objects.order_by().values('safe').annotate(
+                    total=Sum('amount')
+                ).values_list('safe', 'total')
+            )
+            
+            to_create = []
+            to_update = []
+            now = timezone.now()
+            
+            for safe in Safe.objects.order_by('pk'):
+                expected_receipts = receipts.get(safe.pk) or Decimal('0')
+                expected_payments = payments.get(safe.pk) or Decimal('0')
+                row = stored.get(safe.pk)
+                
+                if row is None:
+                    mismatches.append({
+                        'safe': safe,
+                        'stored_receipts': None,
+                        'stored_payments': None,
+                        'receipts': expected_receipts,
+                        'payments': expected_payments,
+                    })
+                    to_create.append(SafeBalance(
+                        safe=safe,
+                        receipts_total=expected_receipts,
+                        payments_total=expected_payments
+                    ))
+                elif (row.receipts_total != expected_receipts or
+                        row.payments_total != expected_payments):
+                    mismatches.append({
+                        'safe': safe,
+                        'stored_receipts': row.receipts_total,
+                        'stored_payments': row.payments_total,
+                        'receipts': expected_receipts,
+                        'payments': expected_payments,
+                    })
+                    row.receipts_total = expected_receipts
+                    row.payments_total = expected_payments
+                    row.updated_at = now
+                    to_update.append(row)
+            
+            if commit:
+                SafeBalance.objects.bulk_create(to_create, batch_size=500)
+                SafeBalance.objects.bulk_update(
+                    to_update,
+                    ['receipts_total', 'payments_total', 'updated_at'],
+                    batch_size=500
+                )
+        
+        return mismatches
+    
+    @staticmethod
+    def get_safes_balances(safe_ids=None, as_of_date=None):
+        """أرصدة عدة خزائن دفعة واحدة بعدد ثابت من الاستعلامات {safe_id: {...}}"""
+        receipts = defaultdict(Decimal)
+        payments = defaultdict(Decimal)
+        
+        if as_of_date is None:
+            rows = SafeBalance.objects.all()
+            if safe_ids is not None:
+                rows = rows.filter(safe_id__in=safe_ids)
+            for safe_id, receipts_total, payments_total in rows.values_list(
+                'safe_id', 'receipts_total', 'payments_total'
+            ):
+                receipts[safe_id] = receipts_total
+                payments[safe_id] = payments_total
+        else:
+            as_of_date = _to_date(as_of_date)
+            if safe_ids is None:
+                safe_ids = list(Safe.objects.values_list('pk', flat=True))
+            
+            # آخر إقفال يومي لكل خزنة حتى التاريخ المطلوب
+            closes = SafeDailyClose.objects.filter(
+                safe_id__in=safe_ids,
+                date__lte=as_of_date
+            ).order_by('safe_id', '-date').values_list(
+                'safe_id', 'date', 'receipts_total', 'payments_total'
+            )
+            last_close_dates = {}
+            for safe_id, close_date, receipts_total, payments_total in closes:
+                if safe_id not in last_close_dates:
+                    last_close_dates[safe_id] = close_date
+                    receipts[safe_id] = receipts_total
+                    payments[safe_id] = payments_total
+            
+            # الحركات بعد آخر إقفال لكل خزنة في استعلام مجمع واحد لكل نوع سند
+            since_close = Q(safe_id__in=[
+                safe_id for safe_id in safe_ids if safe_id not in last_close_dates
+            ])
+            for safe_id, close_date in last_close_dates.items():
+                if close_date < as_of_date:
+                    since_close |= Q(safe_id=safe_id, date__gt=close_date)
+            
+            for model, totals in ((ReceiptVoucher, receipts), (PaymentVoucher, payments)):
+                grouped = model.objects.filter(
+                    since_close, date__lte=as_of_date
+                ).order_by().values('safe').annotate(total=Sum('amount'))
+                for row in grouped:
+                    totals[row['safe']] += row['total']
+        
+        return {
+            safe_id: {
+                'receipts': receipts[safe_id],
+                'payments': payments[safe_id],
+                'balance': receipts[safe_id] - payments[safe_id]
+            }
+            for safe_id in set(receipts) | set(payments)
+        }
+    
+    @staticmethod
+    def get_partner_balances(partners=None, as_of_date=None):
+        """أرصدة مجموعة من الشركاء دفعة واحدة {partner_id: الرصيد}"""
+        if partners is None:
+            partners = Partner.objects.all()
+        partners = list(partners)
+        if not partners:
+            return {}
         
-        # رصيد محفظة الشريك الشخصية
-        try:
-            wallet = partner.wallet
-            wallet_balance = TreasuryService.get_safe_balance(wallet)
-            balance += wallet_balance['balance']
-        except Safe.DoesNotExist:
-            pass
+        safes = list(Safe.objects.values_list('pk', 'is_partner_wallet', 'partner_id'))
+        balances = TreasuryService.get_safes_balances(
+            safe_ids=[safe_id for safe_id, _, _ in safes] if as_of_date else None,
+            as_of_date=as_of_date
+        )
+        zero = {'balance': Decimal('0')}
         
-        # حصة الشريك من الخزائن العامة
-        general_safes = Safe.objects.filter(is_partner_wallet=False)
-        for safe in general_safes:
-            safe_balance = TreasuryService.get_safe_balance(safe)
-            # حصة الشريك = رصيد الخزنة × نسبة الشريك
-            partner_share = safe_balance['balance'] * (partner.share_percent / 100)
-            balance += partner_share
+        # مصفوفة الحصص: كل شريك يملك نفس النسبة من كل خزنة عامة،
+        # فحاصل ضرب المصفوفة في متجه الأرصدة = النسبة × مجموع أرصدة الخزائن العامة
+        general_total = sum(
+            (balances.get(safe_id, zero)['balance']
+             for safe_id, is_wallet, _ in safes if not is_wallet),
+            Decimal('0')
+        )
+        wallets = {
+            partner_id: balances.get(safe_id, zero)['balance']
+            for safe_id, is_wallet, partner_id in safes
+            if is_wallet and partner_id
+        }
         
-        return balance
+        return {
+            partner.pk: (
+                partner.opening_balance
+                + wallets.get(partner.pk, Decimal('0'))
+                + general_total * (partner.share_percent / 100)
+            )
+            for partner in partners
+        }
+    
+    @staticmethod
+    def get_partner_balance(partner, as_of_date=None):
+        """حساب رصيد الشريك (محفظته + حصته من الخزائن العامة)"""
+        return TreasuryService.get_partner_balances([partner], as_of_date)[partner.pk]
+    
+    @staticmethod
+    def attach_balances(safes):
+        """إضافة الرصيد والقبض والصرف لكل خزنة في القائمة باستعلام واحد"""
+        safes = list(safes)
+        balances = TreasuryService.get_safes_balances([safe.pk for safe in safes])
+        zero = {
+            'receipts': Decimal('0'),
+            'payments': Decimal('0'),
+            'balance': Decimal('0')
+        }
+        
+        for safe in safes:
+            balance_data = balances.get(safe.pk, zero)
+            safe.current_balance = balance_data['balance']
+            safe.total_receipts = balance_data['receipts']
+            safe.total_payments = balance_data['payments']
+        
+        return safes
     
     @staticmethod
     def get_all_safes_summary():
         """ملخص جميع الخزائن والمحافظ"""
-        safes = Safe.objects.all()
+        safes = TreasuryService.attach_balances(Safe.objects.select_related('partner'))
         summary = []
         total_balance = Decimal('0')
         
         for safe in safes:
-            safe_data = TreasuryService.get_safe_balance(safe)
-            safe_data['safe'] = safe
-            summary.append(safe_data)
-            total_balance += safe_data['balance']
+            summary.append({
+                'safe': safe,
+                'receipts': safe.total_receipts,
+                'payments': safe.total_payments,
+                'balance': safe.current_balance
+            })
+            total_balance += safe.current_balance
         
         return {
             'safes': summary,
@@ -84,58 +387,67 @@ class TreasuryService:
     @staticmethod
     def get_cash_flow(from_date, to_date, safe=None):
         """تقرير التدفق النقدي"""
-        # فلترة الخزنة
-        safe_filter = Q()
+        return list(TreasuryService.iter_cash_flow(from_date, to_date, safe))
+    
+    @staticmethod
+    def iter_cash_flow(from_date=None, to_date=None, safe=None, opening_balance=Decimal('0')):
+        """توليد حركات التدفق النقدي مرتبة مع الرصيد التراكمي (الدمج والترتيب والرصيد في قاعدة البيانات)"""
+        stream = TreasuryService._cash_flow_stream(from_date, to_date, safe)
+        for row in stream.rows(opening_balance):
+            yield TreasuryService._cash_flow_row(row)
+    
+    @staticmethod
+    def get_cash_flow_page(from_date=None, to_date=None, safe=None, after=None, page_size=50):
+        """صفحة من التدفق النقدي بمؤشر مع الرصيد المرحل من الصفحات السابقة"""
+        stream = TreasuryService._cash_flow_stream(from_date, to_date, safe)
+        page = stream.page(after=after, page_size=page_size)
+        page['rows'] = [TreasuryService._cash_flow_row(row) for row in page['rows']]
+        return page
+    
+    @staticmethod
+    def _cash_flow_stream(from_date, to_date, safe):
+        """تيار سندات القبض والصرف بعد الفلترة"""
+        # فلترة الخزنة والتواريخ
+        flow_filter = Q()
         if safe:
-            safe_filter = Q(safe=safe)
-        
-        # فلترة التواريخ
-        date_filter = Q(date__gte=from_date, date__lte=to_date)
-        
-        # الحصول على السندات
-        receipts = ReceiptVoucher.objects.filter(
-            date_filter & safe_filter
-        ).order_by('date')
-        
-        payments = PaymentVoucher.objects.filter(
-            date_filter & safe_filter
-        ).order_by('date')
-        
-        # دمج وترتيب السندات
-        cash_flow = []
-        
-        for receipt in receipts:
-            cash_flow.append({
-                'date': receipt.date,
-                'type': 'receipt',
-                'voucher_number': receipt.voucher_number,
-                'description': receipt.description,
-                'amount_in': receipt.amount,
-                'amount_out': Decimal('0'),
-                'safe': receipt.safe.name
-            })
-        
-        for payment in payments:
-            cash_flow.append({
-                'date': payment.date,
-                'type': 'payment',
-                'voucher_number': payment.voucher_number,
-                'description': payment.description,
-                'amount_in': Decimal('0'),
-                'amount_out': payment.amount,
-                'safe': payment.safe.name
-            })
-        
-        # ترتيب حسب التاريخ
-        cash_flow.sort(key=lambda x: x['date'])
-        
-        # حساب الرصيد التراكمي
-        running_balance = Decimal('0')
-        for item in cash_flow:
-            running_balance += item['amount_in'] - item['amount_out']
-            item['balance'] = running_balance
+            flow_filter &= Q(safe=safe)
+        if from_date:
+            flow_filter &= Q(date__gte=from_date)
+        if to_date:
+            flow_filter &= Q(date__lte=to_date)
         
-        return cash_flow
+        return LedgerStream([
+            ledger_source(
+                ReceiptVoucher.objects.filter(flow_filter),
+                'receipt',
+                reference='voucher_number',
+                debit='amount',
+                safe='safe__name'
+            ),
+            ledger_source(
+                PaymentVoucher.objects.filter(flow_filter),
+                'payment',
+                reference='voucher_number',
+                credit='amount',
+                safe='safe__name'
+            ),
+        ])
+    
+    @staticmethod
+    def _cash_flow_row(row):
+        """تحويل حركة التيار إلى صف التدفق النقدي"""
+        return {
+            'id': row['id'],
+            'date': row['date'],
+            'created_at': row['created_at'],
+            'type': row['type'],
+            'voucher_number': row['reference'],
+            'description': row['description'],
+            'amount_in': row['debit'],
+            'amount_out': row['credit'],
+            'safe': row['safe'],
+            'balance': row['balance']
+        }
     
     @staticmethod
     def transfer_between_safes(from_safe, to_safe, amount, description, user=None):
@@ -172,8 +484,20 @@ class TreasuryService:
     @staticmethod
     def get_partner_transactions(partner, from_date=None, to_date=None):
         """الحصول على معاملات الشريك"""
-        transactions = []
-        
+        stream = TreasuryService._partner_stream(partner, from_date, to_date)
+        return [TreasuryService._partner_row(row) for row in stream.rows()]
+    
+    @staticmethod
+    def get_partner_transactions_page(partner, from_date=None, to_date=None, after=None, page_size=20):
+        """صفحة من معاملات الشريك بمؤشر مع الرصيد المرحل"""
+        stream = TreasuryService._partner_stream(partner, from_date, to_date)
+        page = stream.page(after=after, page_size=page_size)
+        page['rows'] = [TreasuryService._partner_row(row) for row in page['rows']]
+        return page
+    
+    @staticmethod
+    def _partner_stream(partner, from_date, to_date):
+        """تيار سندات القبض المباشرة للشريك وسندات الصرف من محفظته"""
         # فلترة التواريخ
         date_filter = Q()
         if from_date:
@@ -181,43 +505,45 @@ class TreasuryService:
         if to_date:
             date_filter &= Q(date__lte=to_date)
         
-        # سندات القبض المباشرة للشريك
-        receipts = ReceiptVoucher.objects.filter(
-            partner=partner
-        ).filter(date_filter)
-        
-        for receipt in receipts:
-            transactions.append({
-                'date': receipt.date,
-                'type': 'receipt',
-                'voucher_number': receipt.voucher_number,
-                'description': receipt.description,
-                'debit': receipt.amount,
-                'credit': Decimal('0'),
-                'safe': receipt.safe.name
-            })
-        
-        # سندات الصرف من محفظة الشريك
-        try:
-            partner_wallet = partner.wallet
-            payments = PaymentVoucher.objects.filter(
-                safe=partner_wallet
-            ).filter(date_filter)
-            
-            for payment in payments:
-                transactions.append({
-                    'date': payment.date,
-                    'type': 'payment',
-                    'voucher_number': payment.voucher_number,
-                    'description': payment.description,
-                    'debit': Decimal('0'),
-                    'credit': payment.amount,
-                    'safe': payment.safe.name
-                })
-        except Safe.DoesNotExist:
-            pass
-        
-        # ترتيب حسب التاريخ
-        transactions.sort(key=lambda x: x['date'])
-        
-        return transactions
\ No newline at end of file
+        return LedgerStream([
+            ledger_source(
+                ReceiptVoucher.objects.filter(partner=partner).filter(date_filter),
+                'receipt',
+                reference='voucher_number',
+                debit='amount',
+                safe='safe__name'
+            ),
+            # محفظة الشريك هي الخزنة الوحيدة المرتبطة به
+            ledger_source(
+                PaymentVoucher.objects.filter(safe__partner=partner).filter(date_filter),
+                'payment',
+                reference='voucher_number',
+                credit='amount',
+                safe='safe__name'
+            ),
+        ])
+    
+    @staticmethod
+    def _partner_row(row):
+        """تحويل حركة التيار إلى صف معاملات الشريك"""
+        return {
+            'id': row['id'],
+            'date': row['date'],
+            'created_at': row['created_at'],
+            'type': row['type'],
+            'voucher_number': row['reference'],
+            'description': row['description'],
+            'debit': row['debit'],
+            'credit': row['credit'],
+            'safe': row['safe'],
+            'balance': row['balance']
+        }
+
+
+def _to_date(value):
+    """تحويل التاريخ القادم من الطلبات (نص ISO) إلى كائن تاريخ"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
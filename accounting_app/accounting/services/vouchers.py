@@ -0,0 +1,269 @@
+from collections import defaultdict
+from decimal import Decimal
+from datetime import date
+from django.db import transaction
+from django.utils import timezone
+from ..models import (
+    ReceiptVoucher, PaymentVoucher, Safe, Customer, Partner, Supplier,
+    Contract, Installment, Project
+)
+from .treasury import TreasuryService
+from .dashboard import DashboardService
+from .importing import chunks, lookup, resolve, is_blank, clean, parse_date, parse_amount
+
+
+class VoucherService:
+    """خدمة الترحيل المجمع للسندات"""
+
+    @staticmethod
+    def post_receipts(rows, user=None, skip_invalid=False, dry_run=False, batch_size=2000):
+        """ترحيل مجموعة سندات قبض في معاملة واحدة
+
+        كل صف قاموس بالمفاتيح: date, amount, safe (المعرف أو الاسم), description,
+        وبشكل اختياري voucher_number, customer (الكود), partner (الكود),
+        contract (الكود), installment (رقم القسط داخل العقد).
+        يُرجع {'created': العدد, 'errors': [{'row': رقم الصف, 'errors': [...]}]}
+        """
+        rows = list(rows)
+        safes = VoucherService._safes_lookup(row.get('safe') for row in rows)
+        customers = lookup(Customer.objects, 'code', (row.get('customer') for row in rows))
+        partners = lookup(Partner.objects, 'code', (row.get('partner') for row in rows))
+        contracts = lookup(
+            Contract.objects, 'code', (row.get('contract') for row in rows), 'customer_id'
+        )
+        installments = VoucherService._installments_lookup(rows, contracts)
+
+        vouchers = []
+        errors = []
+        for index, row in enumerate(rows, start=1):
+            row_errors = []
+            voucher = VoucherService._build_voucher(ReceiptVoucher, index, row, safes, user, row_errors)
+
+            voucher.customer_id = resolve(customers, row.get('customer'), 'العميل', row_errors)
+            voucher.partner_id = resolve(partners, row.get('partner'), 'الشريك', row_errors)
+
+            contract = resolve(contracts, row.get('contract'), 'العقد', row_errors)
+            if contract:
+                voucher.contract_id, customer_id = contract
+                voucher.customer_id = voucher.customer_id or customer_id
+
+            if not is_blank(row.get('installment')):
+                if not contract:
+                    row_errors.append('يجب تحديد العقد مع رقم القسط')
+                else:
+                    voucher.installment_id = installments.get(
+                        (voucher.contract_id, clean(row.get('installment')))
+                    )
+                    if voucher.installment_id is None:
+                        row_errors.append(f'القسط غير موجود: {clean(row.get("installment"))}')
+
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+            else:
+                vouchers.append(voucher)
+
+        return VoucherService._post(
+            ReceiptVoucher, vouchers, errors, skip_invalid, dry_run, batch_size,
+            effects=VoucherService._apply_installment_payments
+        )
+
+    @staticmethod
+    def post_payments(rows, user=None, skip_invalid=False, dry_run=False, batch_size=2000):
+        """ترحيل مجموعة سندات صرف في معاملة واحدة
+
+        كل صف قاموس بالمفاتيح: date, amount, safe, description,
+        وبشكل اختياري voucher_number, supplier (الاسم), project (الكود), expense_head.
+        """
+        rows = list(rows)
+        safes = VoucherService._safes_lookup(row.get('safe') for row in rows)
+        suppliers = lookup(Supplier.objects, 'name', (row.get('supplier') for row in rows))
+        projects = lookup(Project.objects, 'code', (row.get('project') for row in rows))
+
+        vouchers = []
+        errors = []
+        for index, row in enumerate(rows, start=1):
+            row_errors = []
+            voucher = VoucherService._build_voucher(PaymentVoucher, index, row, safes, user, row_errors)
+            voucher.supplier_id = resolve(suppliers, row.get('supplier'), 'المورد', row_errors)
+            voucher.project_id = resolve(projects, row.get('project'), 'المشروع', row_errors)
+            voucher.expense_head = clean(row.get('expense_head'))
+
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+            else:
+                vouchers.append(voucher)
+
+        return VoucherService._post(
+            PaymentVoucher, vouchers, errors, skip_invalid, dry_run, batch_size
+        )
+
+    @staticmethod
+    def _build_voucher(model, index, row, safes, user, row_errors):
+        """بناء السند من الحقول المشتركة والتحقق منها"""
+        voucher = model(created_by=user)
+        voucher._import_row = index
+        voucher.date = parse_date(row.get('date'), row_errors)
+        voucher.amount = parse_amount(row.get('amount'), row_errors)
+        voucher.description = clean(row.get('description'))
+        voucher.voucher_number = clean(row.get('voucher_number'))
+
+        if not voucher.description:
+            row_errors.append('البيان مطلوب')
+
+        if is_blank(row.get('safe')):
+            row_errors.append('الخزنة مطلوبة')
+        else:
+            voucher.safe_id = resolve(safes, row.get('safe'), 'الخزنة', row_errors)
+
+        return voucher
+
+    @staticmethod
+    def _post(model, vouchers, errors, skip_invalid, dry_run, batch_size, effects=None):
+        """ترقيم السندات وإدراجها وترحيل آثارها دفعة واحدة"""
+        VoucherService._check_numbers(model, vouchers, errors)
+
+        if dry_run or (errors and not skip_invalid):
+            return {'created': 0, 'errors': errors}
+
+        if errors:
+            invalid_rows = {error['row'] for error in errors}
+            vouchers = [voucher for voucher in vouchers if voucher._import_row not in invalid_rows]
+
+        if not vouchers:
+            return {'created': 0, 'errors': errors}
+
+        with transaction.atomic():
+            VoucherService.allocate_numbers(model, vouchers)
+            model.objects.bulk_create(vouchers, batch_size=batch_size)
+
+            if effects:
+                effects(vouchers)
+
+            # الإدراج المجمع لا يطلق الإشارات، لذا يُرحّل الرصيد المجمع صراحةً
+            deltas = defaultdict(Decimal)
+            affected_dates = {}
+            for voucher in vouchers:
+                deltas[voucher.safe_id] += voucher.amount
+                affected_dates[voucher.safe_id] = min(
+                    voucher.date, affected_dates.get(voucher.safe_id, voucher.date)
+                )
+
+            if model.LEDGER_FIELD == 'receipts_total':
+                TreasuryService.post_ledger_deltas(receipt_deltas=deltas)
+            else:
+                TreasuryService.post_ledger_deltas(payment_deltas=deltas)
+            TreasuryService.invalidate_daily_closes(affected_dates)
+
+        DashboardService.invalidate_cache()
+        return {'created': len(vouchers), 'errors': errors}
+
+    @staticmethod
+    def _check_numbers(model, vouchers, errors):
+        """التحقق من طول أرقام السندات المحددة يدوياً وعدم تكرارها"""
+        max_length = model._meta.get_field('voucher_number').max_length
+        numbered = defaultdict(list)
+        for voucher in vouchers:
+            if len(voucher.voucher_number) > max_length:
+                errors.append({'row': voucher._import_row, 'errors': [
+                    f'رقم السند أطول من {max_length} حرفاً: {voucher.voucher_number}'
+                ]})
+            elif voucher.voucher_number:
+                numbered[voucher.voucher_number].append(voucher)
+
+        existing = set()
+        for chunk in chunks(list(numbered)):
+            existing.update(
+                model.objects.filter(voucher_number__in=chunk).values_list('voucher_number', flat=True)
+            )
+
+        for number, items in numbered.items():
+            if number in existing or len(items) > 1:
+                for voucher in items:
+                    errors.append({'row': voucher._import_row, 'errors': [f'رقم السند مكرر: {number}']})
+        errors.sort(key=lambda error: error['row'])
+
+    @staticmethod
+    def allocate_numbers(model, vouchers):
+        """ترقيم السندات غير المرقمة بحجز كتلة أرقام واحدة لكل سلسلة ترقيم (قبل الإدراج المجمع)"""
+        series = defaultdict(list)
+        for voucher in vouchers:
+            if not voucher.voucher_number:
+                series[model.number_series(voucher.date, voucher.safe_id)].append(voucher)
+
+        for items in series.values():
+            numbers = model.allocate_voucher_numbers(
+                len(items), voucher_date=items[0].date, safe=items[0].safe_id
+            )
+            for voucher, number in zip(items, numbers):
+                voucher.voucher_number = number
+
+    @staticmethod
+    def _apply_installment_payments(vouchers):
+        """إضافة مبالغ السندات إلى الأقساط المرتبطة بتحديث مجمع واحد"""
+        payments = defaultdict(Decimal)
+        for voucher in vouchers:
+            if voucher.installment_id:
+                payments[voucher.installment_id] += voucher.amount
+
+        if not payments:
+            return []
+
+        installments = []
+        for chunk in chunks(list(payments)):
+            installments.extend(
+                Installment.objects.select_for_update().filter(pk__in=chunk)
+            )
+
+        today = date.today()
+        now = timezone.now()
+        for installment in installments:
+            installment.paid_amount = min(
+                installment.paid_amount + payments[installment.pk],
+                installment.amount
+            )
+            installment.status = installment.compute_status(today)
+            installment.updated_at = now
+
+        Installment.objects.bulk_update(
+            installments, ['paid_amount', 'status', 'updated_at'], batch_size=2000
+        )
+        return installments
+
+    @staticmethod
+    def _safes_lookup(values):
+        """البحث عن الخزائن بالمعرف أو الاسم"""
+        values = {clean(value) for value in values if not is_blank(value)}
+        ids = {value for value in values if value.isdigit()}
+
+        found = {}
+        for chunk in chunks(list(ids)):
+            found.update(
+                (str(pk), pk) for pk in Safe.objects.filter(pk__in=chunk).values_list('pk', flat=True)
+            )
+
+        names = defaultdict(list)
+        for chunk in chunks(list(values - set(found))):
+            for pk, name in Safe.objects.filter(name__in=chunk).values_list('pk', 'name'):
+                names[name].append(pk)
+        for name, pks in names.items():
+            # الاسم المكرر لا يحدد خزنة بعينها
+            found[name] = pks[0] if len(pks) == 1 else None
+
+        return found
+
+    @staticmethod
+    def _installments_lookup(rows, contracts):
+        """البحث عن الأقساط بالعقد ورقم القسط"""
+        contract_ids = set()
+        for row in rows:
+            contract = contracts.get(clean(row.get('contract')))
+            if contract and not is_blank(row.get('installment')):
+                contract_ids.add(contract[0])
+
+        found = {}
+        for chunk in chunks(list(contract_ids)):
+            for pk, contract_id, seq_no in Installment.objects.filter(
+                contract_id__in=chunk
+            ).values_list('pk', 'contract_id', 'seq_no'):
+                found[(contract_id, str(seq_no))] = pk
+        return found
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Safe, SafeBalance, ReceiptVoucher, PaymentVoucher, Installment, Contract,
+    Project, Customer, Unit, Item, StockMove
+)
+
+
+@receiver(post_save, sender=Safe)
+def create_safe_balance(sender, instance, created, raw=False, **kwargs):
+    """إنشاء صف الرصيد المجمع مع كل خزنة جديدة"""
+    if created and not raw:
+        SafeBalance.objects.get_or_create(safe=instance)
+
+
+@receiver(pre_save, sender=ReceiptVoucher)
+@receiver(pre_save, sender=PaymentVoucher)
+def remember_voucher_previous_state(sender, instance, raw=False, **kwargs):
+    """حفظ الخزنة والمبلغ السابقين للسند قبل التعديل"""
+    instance._ledger_previous = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    instance._ledger_previous = sender.objects.filter(
+        pk=instance.pk
+    ).values('safe_id', 'amount', 'date').first()
+
+
+@receiver(post_save, sender=ReceiptVoucher)
+@receiver(post_save, sender=PaymentVoucher)
+def post_voucher_to_ledger(sender, instance, raw=False, **kwargs):
+    """ترحيل السند إلى رصيد الخزنة المجمع"""
+    if raw:
+        return
+    from .services.treasury import TreasuryService
+    TreasuryService.record_voucher_change(
+        instance,
+        previous=getattr(instance, '_ledger_previous', None)
+    )
+    instance._ledger_previous = None
+
+
+@receiver(post_delete, sender=ReceiptVoucher)
+@receiver(post_delete, sender=PaymentVoucher)
+def reverse_voucher_from_ledger(sender, instance, **kwargs):
+    """عكس أثر السند المحذوف من رصيد الخزنة المجمع"""
+    from .services.treasury import TreasuryService
+    TreasuryService.record_voucher_change(instance, deleted=True)
+
+
+def invalidate_dashboard_cache(sender, raw=False, **kwargs):
+    """إبطال نتائج لوحة التحكم المخزنة عند تغير أي بيانات تدخل في حسابها
+    
+    الإبطال بعد تأكيد المعاملة، وإلا قد يعيد طلب متزامن حساب النتائج من البيانات القديمة
+    ويخزنها تحت الجيل الجديد.
+    """
+    if raw:
+        return
+    from .services.dashboard import DashboardService
+    transaction.on_commit(DashboardService.invalidate_cache)
+
+
+for model in (ReceiptVoucher, PaymentVoucher, Installment, Contract, Project, Customer, Unit, Item, StockMove):
+    post_save.connect(invalidate_dashboard_cache, sender=model, dispatch_uid=f'dashboard_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_cache, sender=model, dispatch_uid=f'dashboard_cache_delete_{model.__name__}')
@@ -0,0 +1,84 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from django.core.management import call_command, CommandError
+from django.test import TestCase, SimpleTestCase
+from ..benchmarks import compare, BENCHMARKS, FIXTURE_PREFIX, FIXTURE_DATE
+from .test_seed_scale import seed_small
+
+
+class BenchmarkCompareTestCase(SimpleTestCase):
+    """اختبارات مقارنة النتائج بخط الأساس"""
+    
+    def test_compare_flags_regressions_beyond_threshold(self):
+        """اختبار اكتشاف التراجع في الوقت والاستعلامات والذاكرة مع تجاهل الضوضاء"""
+        baseline = {
+            'a': {'wall_ms': 100, 'queries': 5, 'peak_kb': 1000},
+            'b': {'wall_ms': 1, 'queries': 2, 'peak_kb': 10},
+        }
+        results = {
+            'a': {'wall_ms': 130, 'queries': 6, 'peak_kb': 1300},
+            'b': {'wall_ms': 2, 'queries': 2, 'peak_kb': 20},
+            'new': {'wall_ms': 50, 'queries': 1, 'peak_kb': 5},
+        }
+        
+        regressions = compare(results, baseline, threshold=0.25)
+        
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(regression.startswith('a:') for regression in regressions))
+        self.assertEqual(compare(results, baseline, threshold=0.5), ['a: queries 5 -> 6'])
+
+
+class BenchCommandTestCase(TestCase):
+    """اختبارات أمر bench"""
+    
+    def test_bench_writes_results_and_compares(self):
+        """اختبار تشغيل القياسات على بيانات صغيرة وحفظ خط الأساس ثم المقارنة به"""
+        seed_small('BENCH', '2025-06-30')
+        
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        paths = ['--output', os.path.join(directory, 'latest.json'),
+                 '--baseline', os.path.join(directory, 'baseline.json')]
+        
+        # بدون خط أساس محفوظ يفشل الأمر بدلاً من النجاح دون مقارنة
+        with self.assertRaises(CommandError):
+            call_command('bench', 'treasury', '--repeat', '1', *paths, stdout=io.StringIO())
+        
+        call_command('bench', 'treasury', 'generate_installments', '--repeat', '1', '--save-baseline',
+                     *paths, stdout=io.StringIO())
+        
+        with open(os.path.join(directory, 'baseline.json'), encoding='utf-8') as handle:
+            results = json.load(handle)['results']
+        self.assertEqual(set(results), {
+            'treasury.get_cash_flow', 'treasury.get_partner_balance',
+            'reports.treasury_csv', 'reports.treasury_xlsx', 'reports.treasury_pdf',
+            'contracts.generate_installments',
+        })
+        self.assertEqual(results['contracts.generate_installments']['queries'], 1)
+        
+        # خط أساس أسرع مما يمكن تحقيقه يجعل الأمر يفشل
+        for result in results.values():
+            result['queries'] = 0
+        with open(os.path.join(directory, 'baseline.json'), 'w', encoding='utf-8') as handle:
+            json.dump({'results': results}, handle)
+        with self.assertRaises(CommandError):
+            call_command('bench', 'treasury', '--repeat', '1', *paths, stdout=io.StringIO(), stderr=io.StringIO())
+    
+    def test_every_benchmark_runs(self):
+        """اختبار تشغيل كل القياسات المسجلة مرة واحدة حتى يمكن حفظ خط أساس كامل"""
+        seed_small(FIXTURE_PREFIX, FIXTURE_DATE.isoformat())
+        
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        call_command(
+            'bench', '--repeat', '1', '--save-baseline',
+            '--output', os.path.join(directory, 'latest.json'),
+            '--baseline', os.path.join(directory, 'baseline.json'),
+            stdout=io.StringIO()
+        )
+        
+        with open(os.path.join(directory, 'baseline.json'), encoding='utf-8') as handle:
+            self.assertEqual(set(json.load(handle)['results']), set(BENCHMARKS))
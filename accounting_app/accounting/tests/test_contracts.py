@@ -1,7 +1,14 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from django.db.models import Sum
 from ..models import Contract, Customer, Unit, Installment, Partner, PartnersGroup
+from ..services import ContractService, ScheduleEngine
 
 
 class ContractTestCase(TestCase):
@@ -132,4 +139,289 @@ class ContractTestCase(TestCase):
         
         # إعادة تحميل الوحدة من قاعدة البيانات
         self.unit.refresh_from_db()
-        self.assertTrue(self.unit.is_sold)
\ No newline at end of file
+        self.assertTrue(self.unit.is_sold)
+    
+    def test_annotate_installment_stats(self):
+        """اختبار إحصائيات الأقساط المحسوبة في استعلام قائمة العقود"""
+        contract = Contract.objects.create(
+            code='CNT006',
+            customer=self.customer,
+            unit=self.unit,
+            unit_value=Decimal('1000000.00'),
+            down_payment=Decimal('100000.00'),
+            installments_count=10,
+            schedule_type='monthly',
+            start_date=date.today() - timedelta(days=100)
+        )
+        # الأقساط الفائتة تُنشأ متأخرة، والأول منها يُسدد هنا
+        overdue = contract.installments.filter(due_date__lt=date.today()).count()
+        first, second = contract.installments.order_by('seq_no')[:2]
+        Installment.objects.filter(pk=first.pk).update(paid_amount=first.amount, status='PAID')
+        Installment.objects.filter(pk=second.pk).update(paid_amount=Decimal('500.00'), status='LATE')
+        
+        with self.assertNumQueries(1):
+            annotated = ContractService.annotate_installment_stats(
+                Contract.objects.filter(pk=contract.pk)
+            ).get()
+        
+        self.assertEqual(annotated.paid_installments, 1)
+        self.assertEqual(annotated.late_installments, overdue - 1)
+        self.assertEqual(annotated.total_paid, contract.get_total_paid())
+        self.assertEqual(annotated.balance_due, contract.get_balance_due())
+    
+    def test_contract_summaries(self):
+        """اختبار ملخص العقد المجمع والمحسوب في الذاكرة"""
+        contract = Contract.objects.create(
+            code='CNT007',
+            customer=self.customer,
+            unit=self.unit,
+            unit_value=Decimal('1000000.00'),
+            down_payment=Decimal('100000.00'),
+            installments_count=10,
+            schedule_type='monthly',
+            start_date=date.today() - timedelta(days=100)
+        )
+        overdue = contract.installments.filter(due_date__lt=date.today()).count()
+        first, second = contract.installments.order_by('seq_no')[:2]
+        Installment.objects.filter(pk=first.pk).update(paid_amount=first.amount, status='PAID')
+        Installment.objects.filter(pk=second.pk).update(status='LATE')
+        
+        with self.assertNumQueries(1):
+            summaries = ContractService.get_contract_summaries([contract])
+        summary = summaries[contract.pk]
+        
+        self.assertEqual(summary['paid_installments_count'], 1)
+        self.assertEqual(summary['late_installments_count'], overdue - 1)
+        self.assertEqual(summary['pending_installments_count'], 10 - overdue)
+        self.assertEqual(summary['total_paid'], Decimal('190000.00'))
+        self.assertEqual(summary['remaining_amount'], Decimal('810000.00'))
+        
+        installments = list(contract.installments.all())
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                ContractService.get_contract_summary(contract, installments),
+                summary
+            )
+
+    
+    def test_recalculate_installments_applies_diff(self):
+        """اختبار إعادة الحساب بالفروق مع الاحتفاظ بالمدفوع جزئياً"""
+        contract = Contract.objects.create(
+            code='CNT008',
+            customer=self.customer,
+            unit=self.unit,
+            unit_value=Decimal('1000000.00'),
+            down_payment=Decimal('200000.00'),
+            installments_count=10,
+            schedule_type='monthly',
+            start_date=date(2024, 1, 31)
+        )
+        first, second = contract.installments.order_by('seq_no')[:2]
+        Installment.objects.filter(pk=first.pk).update(paid_amount=first.amount, status='PAID')
+        Installment.objects.filter(pk=second.pk).update(paid_amount=Decimal('30000.00'))
+        
+        Contract.objects.filter(pk=contract.pk).update(installments_count=12)
+        contract.refresh_from_db()
+        changes = ContractService.recalculate_installments(contract)
+        
+        self.assertEqual([installment.seq_no for installment in changes['created']], [11, 12])
+        self.assertEqual([installment.seq_no for installment in changes['updated']], list(range(2, 11)))
+        self.assertEqual(changes['deleted'], [])
+        
+        second.refresh_from_db()
+        self.assertEqual(second.paid_amount, Decimal('30000.00'))
+        self.assertEqual(second.amount, Decimal('65454.55'))
+        self.assertEqual(
+            contract.installments.exclude(status='PAID').aggregate(total=Sum('amount'))['total'],
+            Decimal('720000.00')
+        )
+        self.assertEqual(contract.installments.get(seq_no=12).due_date, date(2024, 12, 31))
+        
+        Contract.objects.filter(pk=contract.pk).update(installments_count=5)
+        contract.refresh_from_db()
+        changes = ContractService.recalculate_installments(contract)
+        
+        self.assertEqual(changes['deleted'], [12, 11, 10, 9, 8, 7, 6])
+        self.assertEqual(contract.installments.count(), 5)
+        self.assertTrue(contract.installments.filter(pk=second.pk, paid_amount=Decimal('30000.00')).exists())
+
+    
+    def test_recalculate_installments_rejects_amount_below_paid(self):
+        """اختبار رفض إعادة حساب تجعل القسط المدفوع منه جزء أقل من المدفوع"""
+        contract = Contract.objects.create(
+            code='CNT009',
+            customer=self.customer,
+            unit=self.unit,
+            unit_value=Decimal('1000000.00'),
+            down_payment=Decimal('200000.00'),
+            installments_count=10,
+            schedule_type='monthly',
+            start_date=date(2024, 1, 31)
+        )
+        first = contract.installments.get(seq_no=1)
+        Installment.objects.filter(pk=first.pk).update(paid_amount=Decimal('70000.00'))
+        
+        Contract.objects.filter(pk=contract.pk).update(installments_count=20)
+        contract.refresh_from_db()
+        with self.assertRaises(ValueError):
+            ContractService.recalculate_installments(contract)
+        
+        first.refresh_from_db()
+        self.assertEqual(first.amount, Decimal('80000.00'))
+        self.assertEqual(contract.installments.count(), 10)
+
+
+class ContractImportTestCase(TestCase):
+    """اختبارات الاستيراد المجمع للعقود"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.customer = Customer.objects.create(
+            code='C001',
+            name='عميل اختباري',
+            phone='01234567890'
+        )
+        self.units = [
+            Unit.objects.create(
+                code=f'U00{i}',
+                name=f'وحدة {i}',
+                unit_type='residential',
+                price_total=Decimal('120000.00'),
+                group='res'
+            )
+            for i in range(1, 4)
+        ]
+    
+    def test_import_contracts(self):
+        """اختبار استيراد العقود وتوليد أقساطها وتحديد الوحدات كمباعة"""
+        progress = []
+        result = ContractService.import_contracts([
+            {'code': 'CNT001', 'customer': 'C001', 'unit': 'U001', 'down_payment': '20000',
+             'installments_count': '10', 'start_date': '2024-01-31'},
+            {'code': 'CNT002', 'customer': 'C001', 'unit': 'U002', 'unit_value': '90000',
+             'installments_count': 4, 'schedule_type': 'quarterly', 'start_date': '2024-01-15'},
+        ], chunk_size=1, progress=lambda done, total: progress.append((done, total)))
+        
+        self.assertEqual(result, {'created': 2, 'installments': 14, 'errors': []})
+        self.assertEqual(progress, [(1, 2), (2, 2)])
+        self.assertEqual(
+            list(Unit.objects.filter(is_sold=True).values_list('code', flat=True)),
+            ['U001', 'U002']
+        )
+        
+        first = Contract.objects.get(code='CNT001')
+        self.assertEqual(first.unit_value, Decimal('120000.00'))
+        self.assertEqual(first.installments.count(), 10)
+        self.assertEqual(
+            first.installments.aggregate(total=Sum('amount'))['total'],
+            Decimal('100000.00')
+        )
+        self.assertEqual(first.installments.get(seq_no=2).due_date, date(2024, 2, 29))
+        
+        second = Contract.objects.get(code='CNT002')
+        self.assertEqual(second.installments.get(seq_no=4).due_date, date(2024, 10, 15))
+    
+    def test_import_contracts_reports_row_errors(self):
+        """اختبار إيقاف الاستيراد عند وجود أخطاء وتخطي الصفوف غير الصالحة عند الطلب"""
+        Contract.objects.create(
+            code='OLD001',
+            customer=self.customer,
+            unit=self.units[2],
+            unit_value=Decimal('120000.00'),
+            installments_count=1,
+            start_date=date(2024, 1, 1)
+        )
+        rows = [
+            {'code': 'CNT001', 'customer': 'C001', 'unit': 'U001',
+             'installments_count': '12', 'start_date': '2024-01-01'},
+            {'code': 'OLD001', 'customer': 'X', 'unit': 'U003',
+             'installments_count': '0', 'start_date': 'غدا', 'schedule_type': 'weekly'},
+            {'code': 'CNT003', 'customer': 'C001', 'unit': 'U001', 'down_payment': '120000',
+             'installments_count': '12', 'start_date': '2024-01-01'},
+        ]
+        
+        result = ContractService.import_contracts(rows)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+        self.assertEqual(len(result['errors'][0]['errors']), 6)
+        self.assertFalse(Contract.objects.filter(code='CNT001').exists())
+        
+        result = ContractService.import_contracts(rows, skip_invalid=True)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(Contract.objects.get(code='CNT001').installments.count(), 12)
+    
+    def test_import_contracts_rolls_back_when_unit_sold_midway(self):
+        """اختبار عدم حفظ أي دفعة إذا بيعت وحدة أثناء الاستيراد بدون skip_invalid"""
+        lock_units = ContractService._lock_units
+        
+        def sell_second_unit(contracts, errors):
+            Unit.objects.filter(code='U002').update(is_sold=True)
+            return lock_units(contracts, errors)
+        
+        rows = [
+            {'code': 'CNT001', 'customer': 'C001', 'unit': 'U001',
+             'installments_count': '12', 'start_date': '2024-01-01'},
+            {'code': 'CNT002', 'customer': 'C001', 'unit': 'U002',
+             'installments_count': '12', 'start_date': '2024-01-01'},
+        ]
+        with mock.patch.object(ContractService, '_lock_units', side_effect=sell_second_unit):
+            result = ContractService.import_contracts(rows, chunk_size=1)
+        
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['row'] for error in result['errors']], [2])
+        self.assertFalse(Contract.objects.exists())
+        self.assertFalse(Unit.objects.filter(is_sold=True).exists())
+    
+    def test_import_contracts_command(self):
+        """اختبار أمر استيراد العقود من ملف CSV"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write('Code,Customer,Unit,Down Payment,Installments Count,Schedule Type,Start Date\n')
+            handle.write('CNT001,C001,U001,0,12,monthly,2024-01-01\n')
+            handle.write('CNT002,C001,U002,"20,000.00",5,yearly,01/06/2024\n')
+        self.addCleanup(os.remove, handle.name)
+        
+        call_command('import_contracts', handle.name, stdout=io.StringIO())
+        
+        self.assertEqual(Contract.objects.count(), 2)
+        self.assertEqual(Installment.objects.count(), 17)
+
+
+class ScheduleEngineTestCase(SimpleTestCase):
+    """اختبارات محرك جدولة الأقساط"""
+    
+    def test_amounts_exact_cents(self):
+        """اختبار أن مجموع الأقساط يساوي المبلغ بالقرش وآخر قسط يأخذ الفرق"""
+        amounts = ScheduleEngine().amounts(Decimal('1000.00'), 3)
+        self.assertEqual(amounts, [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        
+        amounts = ScheduleEngine().amounts(Decimal('0.05'), 10)
+        self.assertEqual(sum(amounts), Decimal('0.05'))
+        self.assertTrue(all(amount >= 0 for amount in amounts))
+    
+    def test_month_end_due_dates(self):
+        """اختبار تواريخ الاستحقاق في نهاية الشهر دون انزياح"""
+        dates = ScheduleEngine('monthly').due_dates(date(2024, 1, 31), 4)
+        self.assertEqual(dates, [
+            date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+        ])
+        
+        dates = ScheduleEngine('quarterly').due_dates(date(2024, 11, 15), 2, offset=1)
+        self.assertEqual(dates, [date(2025, 2, 15), date(2025, 5, 15)])
+    
+    def test_custom_period_and_balloon(self):
+        """اختبار الفترات المخصصة والدفعات الإضافية"""
+        dates = ScheduleEngine(period_days=14).due_dates(date(2024, 1, 1), 3)
+        self.assertEqual(dates, [date(2024, 1, 1), date(2024, 1, 15), date(2024, 1, 29)])
+        
+        schedule = ScheduleEngine('yearly').build(
+            Decimal('100000.00'), 4, date(2024, 6, 1), balloons={4: Decimal('40000.00')}
+        )
+        self.assertEqual(
+            [row['amount'] for row in schedule],
+            [Decimal('15000.00')] * 3 + [Decimal('55000.00')]
+        )
+        self.assertEqual(schedule[-1]['seq_no'], 4)
+        self.assertEqual(schedule[-1]['due_date'], date(2027, 6, 1))
+        
+        with self.assertRaises(ValueError):
+            ScheduleEngine().amounts(Decimal('100.00'), 2, balloons={3: Decimal('10.00')})
@@ -0,0 +1,84 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from decimal import Decimal
+from datetime import date
+from ..models import Safe, Customer, Unit, Contract, ReceiptVoucher
+from ..services import CustomerService
+
+
+class CustomersListTestCase(TestCase):
+    """اختبارات قائمة العملاء"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='testuser', password='testpass123')
+        
+        safe = Safe.objects.create(name='الخزنة الرئيسية')
+        
+        for i in range(30):
+            Customer.objects.create(
+                code=f'C{i+1:03d}',
+                name=f'عميل {i+1}',
+                phone=f'01234567{i:03d}'
+            )
+        
+        self.customer = Customer.objects.get(code='C001')
+        for i in range(2):
+            unit = Unit.objects.create(
+                code=f'U{i+1:03d}',
+                name=f'وحدة {i+1}',
+                unit_type='residential',
+                price_total=Decimal('100000.00'),
+                group='res'
+            )
+            Contract.objects.create(
+                code=f'CNT{i+1:03d}',
+                customer=self.customer,
+                unit=unit,
+                unit_value=Decimal('100000.00'),
+                down_payment=Decimal('40000.00'),
+                installments_count=2,
+                schedule_type='monthly',
+                start_date=date.today()
+            )
+        for amount in (Decimal('1500.00'), Decimal('2500.50')):
+            ReceiptVoucher.objects.create(
+                amount=amount,
+                safe=safe,
+                customer=self.customer,
+                description='دفعة'
+            )
+    
+    def test_annotate_totals(self):
+        """اختبار إجماليات العملاء المحسوبة باستعلامات فرعية"""
+        customers = {
+            customer.code: customer
+            for customer in CustomerService.annotate_totals(Customer.objects.all())
+        }
+        
+        customer = customers['C001']
+        self.assertEqual(customer.contracts_count, 2)
+        self.assertEqual(customer.total_contracts_value, self.customer.get_total_contracts_value())
+        self.assertEqual(customer.total_paid, self.customer.get_total_paid())
+        
+        self.assertEqual(customers['C002'].contracts_count, 0)
+        self.assertEqual(customers['C002'].total_paid, Decimal('0'))
+    
+    def test_customers_list_paginated_table(self):
+        """اختبار أن جدول العملاء مقسم لصفحات بعدد ثابت من الاستعلامات"""
+        url = reverse('accounting:customers_list')
+        
+        # جلسة + مستخدم + عدد العملاء + صفحة العملاء
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'page': 2}, HTTP_HX_REQUEST='true')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'accounting/customers/_table.html')
+        self.assertEqual(len(response.context['customers']), 5)
+        self.assertContains(response, 'C030')
@@ -5,8 +5,9 @@ from decimal import Decimal
 from datetime import date
 from ..models import (
     Safe, Customer, ReceiptVoucher, PaymentVoucher,
-    Contract, Unit, Installment
+    Contract, Unit, Installment, Project, Item, StockMove
 )
+from ..services import DashboardService
 
 
 class DashboardTestCase(TestCase):
@@ -20,6 +21,9 @@ class DashboardTestCase(TestCase):
             password='testpass123'
         )
         
+        # بدء كل اختبار بذاكرة تخزين مؤقت فارغة للوحة التحكم
+        DashboardService.invalidate_cache()
+        
         # إنشاء عميل الاختبار
         self.client = Client()
         self.client.login(username='testuser', password='testpass123')
@@ -143,7 +147,7 @@ class DashboardTestCase(TestCase):
             )
             receipts.append(receipt)
         
-        response = self.client.get(reverse('accounting:dashboard'))
+        response = self.client.get(reverse('accounting:dashboard_panel', args=['recent']))
         
         # يجب عرض آخر 10 سندات فقط
         recent_receipts = response.context['recent_receipts']
@@ -153,4 +157,95 @@ class DashboardTestCase(TestCase):
         self.assertEqual(
             recent_receipts[0].voucher_number,
             receipts[-1].voucher_number
-        )
\ No newline at end of file
+        )
+    
+    def test_dashboard_monthly_chart(self):
+        """اختبار تجميع الرسم البياني بالشهور التقويمية"""
+        ReceiptVoucher.objects.create(
+            date=date(2024, 3, 31), amount=Decimal('1000.00'), safe=self.safe, description='مارس'
+        )
+        ReceiptVoucher.objects.create(
+            date=date(2024, 3, 1), amount=Decimal('500.00'), safe=self.safe, description='مارس'
+        )
+        PaymentVoucher.objects.create(
+            date=date(2023, 4, 1), amount=Decimal('200.00'), safe=self.safe, description='أبريل'
+        )
+        
+        chart = DashboardService.get_monthly_chart(months=12, today=date(2024, 3, 31))
+        
+        self.assertEqual([row['month'] for row in chart][:2], ['2023-04', '2023-05'])
+        self.assertEqual(chart[-1], {'month': '2024-03', 'receipts': 1500.0, 'payments': 0.0})
+        self.assertEqual(chart[0]['payments'], 200.0)
+    
+    def test_dashboard_over_budget_projects(self):
+        """اختبار المشاريع المتجاوزة للميزانية في استعلام واحد"""
+        over = Project.objects.create(
+            code='P001', name='مشروع 1', start_date=date(2024, 1, 1), budget=Decimal('1000.00')
+        )
+        Project.objects.create(
+            code='P002', name='مشروع 2', start_date=date(2024, 1, 1), budget=Decimal('5000.00')
+        )
+        for i in range(2):
+            PaymentVoucher.objects.create(
+                date=date.today(), amount=Decimal('750.00'), safe=self.safe,
+                description=f'مصروف {i+1}', project=over
+            )
+        
+        with self.assertNumQueries(1):
+            projects = DashboardService.get_over_budget_projects()
+        
+        self.assertEqual(len(projects), 1)
+        self.assertEqual(projects[0]['project'], over)
+        self.assertEqual(projects[0]['over_amount'], Decimal('500.00'))
+        self.assertEqual(projects[0]['percentage'], Decimal('150'))
+        
+        with self.assertNumQueries(2):
+            DashboardService.get_kpis()
+    
+    def test_dashboard_cache_invalidation(self):
+        """اختبار تخزين المؤشرات مؤقتاً وإبطالها عند تغير السندات"""
+        self.assertEqual(DashboardService.get_cached_kpis()['total_receipts'], Decimal('0'))
+        
+        with self.assertNumQueries(0):
+            DashboardService.get_cached_kpis()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            ReceiptVoucher.objects.create(
+                date=date.today(), amount=Decimal('2500.00'), safe=self.safe, description='إيداع'
+            )
+            # الإبطال ينتظر تأكيد المعاملة
+            self.assertEqual(DashboardService.get_cached_kpis()['total_receipts'], Decimal('0'))
+        
+        self.assertEqual(DashboardService.get_cached_kpis()['total_receipts'], Decimal('2500.00'))
+    
+    def test_over_budget_cache_follows_stock_moves_and_prices(self):
+        """اختبار إبطال لوحة المشاريع المتجاوزة عند صرف مواد أو تغير سعر الصنف"""
+        project = Project.objects.create(
+            code='P001', name='مشروع 1', start_date=date(2024, 1, 1), budget=Decimal('1000.00')
+        )
+        item = Item.objects.create(code='I001', name='أسمنت', uom='كيس', unit_price=Decimal('100.00'))
+        self.assertEqual(DashboardService.get_cached_over_budget_projects(), [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMove.objects.create(
+                item=item, project=project, qty=Decimal('11'), direction='OUT', date=date.today()
+            )
+        self.assertEqual(
+            DashboardService.get_cached_over_budget_projects()[0]['over_amount'], Decimal('100.00')
+        )
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            item.unit_price = Decimal('200.00')
+            item.save()
+        self.assertEqual(
+            DashboardService.get_cached_over_budget_projects()[0]['over_amount'], Decimal('1200.00')
+        )
+    
+    def test_dashboard_panels(self):
+        """اختبار تحميل لوحات لوحة التحكم كل منها مستقلة"""
+        for panel in ('kpis', 'alerts', 'recent', 'chart'):
+            response = self.client.get(reverse('accounting:dashboard_panel', args=[panel]))
+            self.assertEqual(response.status_code, 200)
+        
+        response = self.client.get(reverse('accounting:dashboard_panel', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
@@ -129,4 +129,77 @@ class InstallmentTestCase(TestCase):
         
         # التحقق من السداد الجزئي للقسط الثالث
         self.assertEqual(installments[2].paid_amount, installments[2].amount / 2)
-        self.assertNotEqual(installments[2].status, 'PAID')
\ No newline at end of file
+        self.assertNotEqual(installments[2].status, 'PAID')
+    
+    def test_refresh_statuses_incremental(self):
+        """اختبار تحديث الحالات التزايدي منذ آخر تشغيل"""
+        overdue = self.contract.installments.filter(due_date__lt=date.today()).count()
+        self.contract.installments.update(status='PENDING')
+        
+        # التشغيل الأول كامل ويصحح كل الأقساط المتأخرة
+        self.assertEqual(InstallmentService.refresh_statuses(), overdue)
+        self.assertEqual(self.contract.installments.filter(status='LATE').count(), overdue)
+        
+        # لا شيء تغير منذ آخر تشغيل
+        self.assertEqual(InstallmentService.refresh_statuses(), 0)
+        
+        # بعد مرور الوقت تتحول فقط الأقساط التي عبرت تاريخ استحقاقها
+        later = date.today() + timedelta(days=62)
+        crossed = self.contract.installments.filter(
+            due_date__gte=date.today(), due_date__lt=later
+        ).count()
+        self.assertEqual(InstallmentService.refresh_statuses(today=later), crossed)
+        self.assertEqual(
+            self.contract.installments.filter(status='LATE').count(),
+            overdue + crossed
+        )
+    
+    def test_refresh_statuses_after_backdated_contract(self):
+        """اختبار أن عقداً بتاريخ بدء سابق لا يترك أقساطاً فائتة معلقة بعد آخر تشغيل"""
+        InstallmentService.refresh_statuses()
+        
+        unit = Unit.objects.create(
+            code='U002',
+            name='وحدة ثانية',
+            unit_type='residential',
+            price_total=Decimal('500000.00'),
+            group='res'
+        )
+        contract = Contract.objects.create(
+            code='CNT002',
+            customer=self.customer,
+            unit=unit,
+            unit_value=Decimal('500000.00'),
+            down_payment=Decimal('0.00'),
+            installments_count=12,
+            schedule_type='monthly',
+            start_date=date.today() - timedelta(days=365)
+        )
+        
+        InstallmentService.refresh_statuses()
+        self.assertFalse(
+            contract.installments.filter(due_date__lt=date.today(), status='PENDING').exists()
+        )
+    
+    def test_distribute_payments_batch(self):
+        """اختبار توزيع عدة دفعات على نفس العقد في معاملة واحدة"""
+        first, second, third = self.contract.installments.order_by('seq_no')[:3]
+        
+        with self.assertNumQueries(4):
+            results = InstallmentService.distribute_payments([
+                (self.contract, first.amount + Decimal('100.00')),
+                (self.contract.pk, second.amount),
+            ])
+        
+        (updated, remaining), (second_updated, second_remaining) = results
+        self.assertEqual([inst.seq_no for inst in updated], [1, 2])
+        self.assertEqual(remaining, Decimal('0'))
+        self.assertEqual([inst.seq_no for inst in second_updated], [2, 3])
+        self.assertEqual(second_remaining, Decimal('0'))
+        
+        for inst in (first, second, third):
+            inst.refresh_from_db()
+        self.assertEqual(first.status, 'PAID')
+        self.assertEqual(second.status, 'PAID')
+        self.assertEqual(third.paid_amount, Decimal('100.00'))
+        self.assertNotEqual(third.status, 'PAID')
@@ -0,0 +1,82 @@
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from ..models import Customer
+from ..perf import (
+    PerfMiddleware, QueryBudgetExceeded, record_queries, query_budget, fingerprint,
+    recent_requests, clear_history
+)
+
+
+class PerfInstrumentationTestCase(TestCase):
+    """اختبارات قياس الاستعلامات وحدود العروض"""
+    
+    def setUp(self):
+        """إعداد عملاء ومستخدم إداري"""
+        for i in range(3):
+            Customer.objects.create(code=f'C{i+1:03d}', name=f'عميل {i+1}', phone=f'0123456{i:04d}')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        clear_history()
+    
+    def test_record_queries_detects_duplicates(self):
+        """اختبار عدّ الاستعلامات واكتشاف الاستعلامات المتكررة بنفس الشكل (N+1)"""
+        with record_queries() as stats:
+            for customer_id in Customer.objects.values_list('pk', flat=True):
+                Customer.objects.get(pk=customer_id)
+        
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(len(stats.duplicates), 1)
+        self.assertEqual(stats.duplicates[0][1], 3)
+        self.assertGreaterEqual(stats.elapsed, stats.sql_time)
+    
+    def test_fingerprint_strips_literals(self):
+        """اختبار توحيد القيم الحرفية في بصمة الاستعلام"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'"),
+            fingerprint("SELECT *  FROM t WHERE id IN (4) AND name = 'y'")
+        )
+    
+    def run_middleware(self, budget):
+        """تشغيل الوسيط على عرض معلن الحد يُنفذ ثلاثة استعلامات"""
+        @query_budget(budget)
+        def view(request):
+            for customer in Customer.objects.all():
+                Customer.objects.filter(pk=customer.pk).exists()
+            return HttpResponse('ok')
+        
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        
+        middleware = PerfMiddleware(get_response)
+        return middleware(RequestFactory().get('/customers/'))
+    
+    @override_settings(PERF_BUDGET_STRICT=True)
+    def test_budget_raises_in_strict_mode(self):
+        """اختبار رفع استثناء عند تجاوز الحد في وضع الاختبارات"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.run_middleware(budget=2)
+    
+    @override_settings(PERF_BUDGET_STRICT=False)
+    def test_budget_warns_in_production(self):
+        """اختبار التحذير فقط عند تجاوز الحد في الإنتاج وتسجيل الطلب"""
+        with self.assertLogs('accounting.perf', level='WARNING'):
+            response = self.run_middleware(budget=2)
+        
+        self.assertEqual(response.status_code, 200)
+        record = recent_requests()[0]
+        self.assertEqual((record['queries'], record['budget']), (4, 2))
+    
+    def test_perf_page_is_admin_only(self):
+        """اختبار أن صفحة /_perf/ متاحة للمديرين فقط"""
+        url = reverse('accounting:perf')
+        self.assertEqual(url, '/_perf/')
+        
+        User.objects.create_user(username='clerk', password='testpass123')
+        client = Client()
+        client.login(username='clerk', password='testpass123')
+        self.assertEqual(client.get(url).status_code, 302)
+        
+        client.login(username='admin', password='testpass123')
+        self.assertEqual(client.get(url).status_code, 200)
@@ -0,0 +1,220 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from decimal import Decimal
+from datetime import date, datetime
+from openpyxl import load_workbook
+from ..models import Safe, Customer, Unit, Contract, ReceiptVoucher, ReportJob, Item
+from ..services import ReportService, ReportJobService
+from ..services.report_jobs import REPORTS
+from ..services.reports import PDF_ROWS_PER_PAGE
+
+
+class ReportTestCase(TestCase):
+    """اختبارات التقارير"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.safe = Safe.objects.create(name='الخزنة الرئيسية')
+        customer = Customer.objects.create(
+            code='C001',
+            name='عميل اختباري',
+            phone='01234567890'
+        )
+        unit = Unit.objects.create(
+            code='U001',
+            name='وحدة اختبارية',
+            unit_type='residential',
+            price_total=Decimal('120000.00'),
+            group='res'
+        )
+        Contract.objects.create(
+            code='CNT001',
+            customer=customer,
+            unit=unit,
+            unit_value=Decimal('120000.00'),
+            down_payment=Decimal('0'),
+            installments_count=12,
+            schedule_type='monthly',
+            start_date=date(2024, 1, 1)
+        )
+    
+    def read_csv(self, response):
+        """قراءة محتوى الاستجابة المتدفقة كسطور"""
+        self.assertIsInstance(response, StreamingHttpResponse)
+        chunks = list(response.streaming_content)
+        self.assertEqual(chunks[0], '\ufeff'.encode('utf-8'))
+        return b''.join(chunks[1:]).decode('utf-8').splitlines()
+    
+    def test_installments_report_csv_streams(self):
+        """اختبار بث تقرير الأقساط سطراً بسطر مع BOM في البداية"""
+        response = ReportService.generate_installments_report_csv(to_date=date(2024, 6, 30))
+        
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="installments_report.csv"')
+        lines = self.read_csv(response)
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(lines[1].startswith('CNT001,عميل اختباري,1,2024-01-01,10000.00'))
+    
+    def test_treasury_report_csv_streams(self):
+        """اختبار بث تقرير الخزينة مع الرصيد التراكمي"""
+        for day, amount in ((1, '100.00'), (2, '250.50')):
+            ReceiptVoucher.objects.create(
+                date=date(2024, 3, day), amount=Decimal(amount), safe=self.safe, description='إيداع'
+            )
+        
+        lines = self.read_csv(
+            ReportService.generate_treasury_report_csv(date(2024, 3, 1), date(2024, 3, 31))
+        )
+        
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].endswith(',350.50,الخزنة الرئيسية'))
+    
+    def test_installments_report_xlsx(self):
+        """اختبار تقرير الأقساط بصيغة Excel بخلايا رقمية وتواريخ وورقة من اليمين لليسار"""
+        response = ReportService.generate_installments_report_xlsx(to_date=date(2024, 2, 29))
+        
+        self.assertIn('installments_report.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.values)
+        
+        self.assertTrue(sheet.sheet_view.rightToLeft)
+        self.assertEqual(rows[0][0], 'رقم العقد')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2][:5], ('CNT001', 'عميل اختباري', 2, datetime(2024, 2, 1), 10000))
+        self.assertEqual(sheet['E2'].number_format, '#,##0.00')
+
+    
+    def test_treasury_report_pdf_pages(self):
+        """اختبار تقسيم تقرير الخزينة PDF إلى صفحات بعدد ثابت من الحركات"""
+        for day in range(1, PDF_ROWS_PER_PAGE + 2):
+            ReceiptVoucher.objects.create(
+                date=date(2024, 3, day), amount=Decimal('10.00'), safe=self.safe, description='إيداع'
+            )
+        
+        response = ReportService.generate_treasury_report_pdf(date(2024, 3, 1), date(2024, 3, 31))
+        
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', response.content)), 2)
+
+
+class ReportJobTestCase(TestCase):
+    """اختبارات مهام التقارير في الخلفية"""
+    
+    def setUp(self):
+        """إعداد خزنة ومجلد مؤقت لملفات التقارير"""
+        self.safe = Safe.objects.create(name='الخزنة الرئيسية')
+        ReceiptVoucher.objects.create(
+            date=date(2024, 3, 1), amount=Decimal('100.00'), safe=self.safe, description='إيداع'
+        )
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.params = {'from_date': '2024-03-01', 'to_date': '2024-03-31'}
+    
+    def test_job_runs_and_artifact_is_reused(self):
+        """اختبار توليد الملف ثم إعادة استخدامه لنفس الطلب دون مهمة جديدة"""
+        job = ReportJobService.request('treasury', 'csv', self.params)
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(ReportJobService.request('treasury', 'csv', self.params), job)
+        
+        self.assertEqual(ReportJobService.run_pending(workers=1), 1)
+        job.refresh_from_db()
+        
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual((job.rows_total, job.rows_written, job.progress), (2, 2, 100))
+        with open(ReportJobService.artifact_path(job), encoding='utf-8-sig') as handle:
+            self.assertEqual(len(handle.read().splitlines()), 2)
+        self.assertEqual(ReportJobService.request('treasury', 'csv', self.params), job)
+    
+    def test_data_change_creates_new_job(self):
+        """اختبار أن تغير البيانات يُنشئ مهمة جديدة ويحذف ملف النسخة القديمة بعد اكتمالها"""
+        old_job = ReportJobService.request('treasury', 'csv', self.params)
+        ReportJobService.run_pending(workers=1)
+        old_job.refresh_from_db()
+        old_path = ReportJobService.artifact_path(old_job)
+        
+        ReceiptVoucher.objects.create(
+            date=date(2024, 3, 2), amount=Decimal('50.00'), safe=self.safe, description='إيداع'
+        )
+        new_job = ReportJobService.request('treasury', 'csv', self.params)
+        self.assertNotEqual(new_job, old_job)
+        
+        ReportJobService.run_pending(workers=1)
+        self.assertFalse(os.path.exists(old_path))
+        new_job.refresh_from_db()
+        self.assertEqual(new_job.rows_written, 3)
+        
+        # رابط تحميل النسخة القديمة يُحوّل إلى النسخة الجديدة
+        User.objects.create_user(username='reporter', password='pass12345')
+        self.client.login(username='reporter', password='pass12345')
+        response = self.client.get(reverse('accounting:report_job_download', args=[old_job.pk]))
+        self.assertRedirects(
+            response, reverse('accounting:report_job_download', args=[new_job.pk]),
+            fetch_redirect_response=False
+        )
+    
+    def test_data_version_follows_voucher_edits(self):
+        """اختبار أن نقل سند لتاريخ آخر يغير إصدار البيانات رغم أن رصيد الخزنة لم يتغير"""
+        receipt = ReceiptVoucher.objects.get()
+        before = ReportJobService.data_version('treasury')
+        
+        receipt.date = date(2024, 4, 1)
+        receipt.save()
+        
+        self.assertNotEqual(ReportJobService.data_version('treasury'), before)
+    
+    def test_data_version_follows_reference_edits(self):
+        """اختبار أن تعديل اسم خزنة أو سعر صنف يغير إصدار التقارير التي تعتمد عليه"""
+        item = Item.objects.create(code='I001', name='أسمنت', uom='كيس', unit_price=Decimal('100.00'))
+        treasury = ReportJobService.data_version('treasury')
+        expenses = ReportJobService.data_version('project_expenses')
+        
+        self.safe.name = 'الخزنة المركزية'
+        self.safe.save()
+        item.unit_price = Decimal('120.00')
+        item.save()
+        
+        self.assertNotEqual(ReportJobService.data_version('treasury'), treasury)
+        self.assertNotEqual(ReportJobService.data_version('project_expenses'), expenses)
+    
+    def test_requeued_attempt_leaves_job_to_new_owner(self):
+        """اختبار أن المحاولة التي أُعيدت مهمتها وحجزتها محاولة أخرى لا تنهيها ولا تنشر ملفها"""
+        job = ReportJobService.request('treasury', 'csv', self.params)
+        
+        def count_then_reclaim(*args):
+            ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now())
+            return 1
+        
+        with mock.patch.dict(REPORTS['treasury'], {'count': count_then_reclaim}):
+            self.assertFalse(ReportJobService.run(job))
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertEqual(job.file_path, '')
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'reports')), [])
+    
+    def test_pdf_job_reports_progress(self):
+        """اختبار نبض مهمة PDF وعدد صفوفها مع كل صفحة"""
+        job = ReportJobService.request('treasury', 'pdf', self.params)
+        
+        self.assertTrue(ReportJobService.run(job))
+        
+        job.refresh_from_db()
+        self.assertEqual((job.rows_total, job.rows_written, job.progress), (2, 2, 100))
+    
+    def test_invalid_request(self):
+        """اختبار رفض نوع أو صيغة غير متاحة"""
+        with self.assertRaises(ValueError):
+            ReportJobService.request('installments', 'pdf')
+        with self.assertRaises(ValueError):
+            ReportJobService.request('unknown', 'csv')
@@ -0,0 +1,174 @@
+from django.test import TestCase
+from decimal import Decimal
+from datetime import date, timedelta
+from ..models import Partner, Safe, ReceiptVoucher, PaymentVoucher
+from ..services import TreasuryService
+
+
+class PartnerBalancesTestCase(TestCase):
+    """اختبارات أرصدة الشركاء"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.partners = [
+            Partner.objects.create(
+                code=f'P{i:03d}',
+                name=f'شريك {i}',
+                share_percent=Decimal(share),
+                opening_balance=Decimal('1000.00')
+            )
+            for i, share in enumerate(['60.00', '40.00'], 1)
+        ]
+        
+        self.main_safe = Safe.objects.create(name='الخزنة الرئيسية')
+        self.branch_safe = Safe.objects.create(name='خزنة الفرع')
+        self.wallet = Safe.objects.create(
+            name='محفظة الشريك الأول',
+            is_partner_wallet=True,
+            partner=self.partners[0]
+        )
+        
+        ReceiptVoucher.objects.create(
+            date=date.today() - timedelta(days=5),
+            amount=Decimal('10000.00'),
+            safe=self.main_safe,
+            description='إيداع'
+        )
+        PaymentVoucher.objects.create(
+            date=date.today(),
+            amount=Decimal('2000.00'),
+            safe=self.branch_safe,
+            description='صرف'
+        )
+        ReceiptVoucher.objects.create(
+            date=date.today(),
+            amount=Decimal('300.00'),
+            safe=self.wallet,
+            description='إيداع في المحفظة'
+        )
+    
+    def test_batch_matches_single_partner_balance(self):
+        """اختبار تطابق الحساب المجمع مع حساب كل شريك"""
+        balances = TreasuryService.get_partner_balances()
+        
+        # الأول: 1000 + 300 + 60% × 8000
+        self.assertEqual(balances[self.partners[0].pk], Decimal('6100.00'))
+        # الثاني: 1000 + 40% × 8000
+        self.assertEqual(balances[self.partners[1].pk], Decimal('4200.00'))
+        
+        for partner in self.partners:
+            self.assertEqual(
+                TreasuryService.get_partner_balance(partner),
+                balances[partner.pk]
+            )
+    
+    def test_batch_as_of_date(self):
+        """اختبار أرصدة الشركاء في تاريخ سابق"""
+        balances = TreasuryService.get_partner_balances(
+            as_of_date=date.today() - timedelta(days=1)
+        )
+        self.assertEqual(balances[self.partners[0].pk], Decimal('7000.00'))
+        self.assertEqual(balances[self.partners[1].pk], Decimal('5000.00'))
+    
+    def test_batch_query_count_is_constant(self):
+        """اختبار ثبات عدد الاستعلامات مع زيادة الشركاء والخزائن"""
+        for i in range(5):
+            Safe.objects.create(name=f'خزنة إضافية {i}')
+            Partner.objects.create(
+                code=f'X{i:03d}',
+                name=f'شريك إضافي {i}',
+                share_percent=Decimal('0'),
+            )
+        
+        with self.assertNumQueries(3):
+            TreasuryService.get_partner_balances()
+    
+    def test_all_safes_summary_query_count_is_constant(self):
+        """اختبار ملخص الخزائن بعدد ثابت من الاستعلامات"""
+        for i in range(5):
+            Safe.objects.create(name=f'خزنة إضافية {i}')
+        
+        with self.assertNumQueries(2):
+            summary = TreasuryService.get_all_safes_summary()
+        
+        self.assertEqual(len(summary['safes']), 8)
+        self.assertEqual(summary['total_balance'], Decimal('8300.00'))
+
+
+class CashFlowTestCase(TestCase):
+    """اختبارات التدفق النقدي"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.safe = Safe.objects.create(name='الخزنة الرئيسية')
+        self.other_safe = Safe.objects.create(name='خزنة أخرى')
+        today = date.today()
+        
+        ReceiptVoucher.objects.create(
+            date=today - timedelta(days=3), amount=Decimal('1000.00'),
+            safe=self.safe, description='إيداع 1'
+        )
+        PaymentVoucher.objects.create(
+            date=today - timedelta(days=2), amount=Decimal('250.50'),
+            safe=self.safe, description='صرف 1'
+        )
+        ReceiptVoucher.objects.create(
+            date=today - timedelta(days=1), amount=Decimal('99.99'),
+            safe=self.safe, description='إيداع 2'
+        )
+        ReceiptVoucher.objects.create(
+            date=today, amount=Decimal('5000.00'),
+            safe=self.other_safe, description='إيداع في خزنة أخرى'
+        )
+    
+    def test_cash_flow_running_balance(self):
+        """اختبار الترتيب والرصيد التراكمي"""
+        with self.assertNumQueries(1):
+            rows = list(TreasuryService.iter_cash_flow(safe=self.safe))
+        
+        self.assertEqual([row['type'] for row in rows], ['receipt', 'payment', 'receipt'])
+        self.assertEqual(
+            [row['balance'] for row in rows],
+            [Decimal('1000.00'), Decimal('749.50'), Decimal('849.49')]
+        )
+        self.assertEqual(rows[1]['amount_out'], Decimal('250.50'))
+        self.assertEqual(rows[0]['safe'], 'الخزنة الرئيسية')
+        self.assertTrue(rows[0]['voucher_number'].startswith('RV-'))
+    
+    def test_cash_flow_date_range(self):
+        """اختبار فلترة التدفق النقدي بالتاريخ"""
+        rows = TreasuryService.get_cash_flow(
+            date.today() - timedelta(days=2),
+            date.today()
+        )
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[-1]['balance'], Decimal('4849.49'))
+    
+    def test_cash_flow_keyset_pages(self):
+        """اختبار الترقيم بالمؤشر مع ترحيل الرصيد بين الصفحات"""
+        full = TreasuryService.get_cash_flow(None, None)
+        
+        first = TreasuryService.get_cash_flow_page(page_size=2)
+        self.assertTrue(first['has_next'])
+        self.assertEqual(first['opening_balance'], Decimal('0'))
+        
+        second = TreasuryService.get_cash_flow_page(after=first['next_cursor'], page_size=2)
+        self.assertFalse(second['has_next'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(second['opening_balance'], first['rows'][-1]['balance'])
+        
+        self.assertEqual(first['rows'] + second['rows'], full)
+    
+    def test_cash_flow_deep_page_uses_cursor_balance(self):
+        """اختبار أن الصفحات التالية تأخذ الرصيد المرحل من المؤشر دون تجميع ما قبله"""
+        first = TreasuryService.get_cash_flow_page(page_size=1)
+        
+        with self.assertNumQueries(1):
+            second = TreasuryService.get_cash_flow_page(after=first['next_cursor'], page_size=1)
+        self.assertEqual(second['opening_balance'], first['rows'][-1]['balance'])
+    
+    def test_cash_flow_invalid_cursor(self):
+        """المؤشر غير الصالح يعيد الصفحة الأولى"""
+        page = TreasuryService.get_cash_flow_page(after='tampered', page_size=2)
+        self.assertEqual(page['opening_balance'], Decimal('0'))
+        self.assertEqual(len(page['rows']), 2)
@@ -1,8 +1,15 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from decimal import Decimal
 from datetime import date
-from ..models import Safe, Customer, Supplier, ReceiptVoucher, PaymentVoucher
-from ..services import TreasuryService
+from ..models import (
+    Safe, SafeBalance, SafeDailyClose, Customer, Supplier, ReceiptVoucher, PaymentVoucher,
+    DocumentSequence, Contract, Unit
+)
+from ..services import TreasuryService, VoucherService
 
 
 class VoucherTestCase(TestCase):
@@ -124,6 +131,75 @@ class VoucherTestCase(TestCase):
         self.assertEqual(payments[0].voucher_number, 'PV-000001')
         self.assertEqual(payments[1].voucher_number, 'PV-000002')
     
+    def test_voucher_number_block_allocation(self):
+        """اختبار حجز كتلة أرقام للاستيراد المجمع"""
+        numbers = ReceiptVoucher.allocate_voucher_numbers(3)
+        self.assertEqual(numbers, ['RV-000001', 'RV-000002', 'RV-000003'])
+        
+        receipt = ReceiptVoucher.objects.create(
+            amount=Decimal('100.00'),
+            safe=self.safe,
+            description='بعد الكتلة'
+        )
+        self.assertEqual(receipt.voucher_number, 'RV-000004')
+        self.assertEqual(DocumentSequence.objects.get(key='RV').last_value, 4)
+    
+    def test_voucher_number_continues_existing_series(self):
+        """اختبار تهيئة العداد من آخر رقم موجود"""
+        ReceiptVoucher.objects.create(
+            voucher_number='RV-000041',
+            amount=Decimal('100.00'),
+            safe=self.safe,
+            description='سند مستورد'
+        )
+        
+        receipt = ReceiptVoucher.objects.create(
+            amount=Decimal('100.00'),
+            safe=self.safe,
+            description='سند جديد'
+        )
+        self.assertEqual(receipt.voucher_number, 'RV-000042')
+    
+    @override_settings(VOUCHER_NUMBER_SERIES='year_safe')
+    def test_voucher_number_per_year_and_safe(self):
+        """اختبار سلاسل ترقيم مستقلة لكل سنة وخزنة"""
+        other_safe = Safe.objects.create(name='خزنة فرعية')
+        
+        first = PaymentVoucher.objects.create(
+            date=date(2024, 5, 1), amount=Decimal('10.00'),
+            safe=self.safe, description='صرف'
+        )
+        second = PaymentVoucher.objects.create(
+            date=date(2024, 6, 1), amount=Decimal('10.00'),
+            safe=self.safe, description='صرف'
+        )
+        other = PaymentVoucher.objects.create(
+            date=date(2024, 6, 1), amount=Decimal('10.00'),
+            safe=other_safe, description='صرف'
+        )
+        next_year = PaymentVoucher.objects.create(
+            date=date(2025, 1, 1), amount=Decimal('10.00'),
+            safe=self.safe, description='صرف'
+        )
+        
+        self.assertEqual(first.voucher_number, f'PV-2024-{self.safe.pk}-000001')
+        self.assertEqual(second.voucher_number, f'PV-2024-{self.safe.pk}-000002')
+        self.assertEqual(other.voucher_number, f'PV-2024-{other_safe.pk}-000001')
+        self.assertEqual(next_year.voucher_number, f'PV-2025-{self.safe.pk}-000001')
+    
+    @override_settings(VOUCHER_NUMBER_SERIES='year_safe')
+    def test_voucher_number_rejects_overlong_series(self):
+        """اختبار رفض رقم سند لا يتسع له الحقل بدلاً من اقتطاعه"""
+        big_safe = Safe.objects.create(pk=10 ** 6, name='خزنة برقم طويل')
+        key = f'RV-2024-{big_safe.pk}'
+        DocumentSequence.objects.create(key=key, last_value=10 ** 18)
+        
+        with self.assertRaises(ValueError):
+            ReceiptVoucher.allocate_voucher_numbers(
+                1, voucher_date=date(2024, 1, 1), safe=big_safe
+            )
+        self.assertEqual(DocumentSequence.objects.get(key=key).last_value, 10 ** 18)
+    
     def test_safe_balance_with_date_filter(self):
         """اختبار حساب رصيد الخزنة مع فلترة التواريخ"""
         from datetime import timedelta
@@ -154,4 +230,239 @@ class VoucherTestCase(TestCase):
             from_date=date.today(),
             to_date=date.today()
         )
-        self.assertEqual(today_balance['balance'], Decimal('3000.00'))
\ No newline at end of file
+        self.assertEqual(today_balance['balance'], Decimal('3000.00'))
+    
+    def test_safe_balance_ledger_follows_edits_and_deletes(self):
+        """اختبار تحديث الرصيد المجمع عند تعديل وحذف السندات"""
+        other_safe = Safe.objects.create(
+            name='خزنة فرعية',
+            is_partner_wallet=False
+        )
+        
+        receipt = ReceiptVoucher.objects.create(
+            date=date.today(),
+            amount=Decimal('4000.00'),
+            safe=self.safe,
+            description='إيداع'
+        )
+        payment = PaymentVoucher.objects.create(
+            date=date.today(),
+            amount=Decimal('1000.00'),
+            safe=self.safe,
+            description='صرف'
+        )
+        
+        # تعديل المبلغ ونقل السند لخزنة أخرى
+        receipt.amount = Decimal('2500.00')
+        receipt.save()
+        receipt.safe = other_safe
+        receipt.save()
+        
+        self.assertEqual(
+            TreasuryService.get_safe_balance(self.safe)['balance'],
+            Decimal('-1000.00')
+        )
+        self.assertEqual(
+            TreasuryService.get_safe_balance(other_safe)['receipts'],
+            Decimal('2500.00')
+        )
+        
+        # الحذف يعكس أثر السند
+        PaymentVoucher.objects.filter(pk=payment.pk).delete()
+        self.assertEqual(
+            TreasuryService.get_safe_balance(self.safe)['balance'],
+            Decimal('0')
+        )
+    
+    def test_rebuild_safe_balances(self):
+        """اختبار إعادة بناء الأرصدة المجمعة من السندات"""
+        ReceiptVoucher.objects.create(
+            date=date.today(),
+            amount=Decimal('1500.00'),
+            safe=self.safe,
+            description='إيداع'
+        )
+        
+        # إفساد الرصيد المخزن يدوياً
+        SafeBalance.objects.filter(safe=self.safe).update(receipts_total=Decimal('1.00'))
+        
+        mismatches = TreasuryService.rebuild_safe_balances(commit=False)
+        self.assertEqual(len(mismatches), 1)
+        
+        TreasuryService.rebuild_safe_balances()
+        self.assertEqual(TreasuryService.rebuild_safe_balances(commit=False), [])
+        self.assertEqual(
+            TreasuryService.get_safe_balance(self.safe)['balance'],
+            Decimal('1500.00')
+        )
+    
+    def test_safe_balance_as_of_uses_daily_close(self):
+        """اختبار رصيد تاريخ سابق باستخدام الإقفال اليومي"""
+        from datetime import timedelta
+        
+        today = date.today()
+        ReceiptVoucher.objects.create(
+            date=today - timedelta(days=10),
+            amount=Decimal('5000.00'),
+            safe=self.safe,
+            description='إيداع قديم'
+        )
+        PaymentVoucher.objects.create(
+            date=today - timedelta(days=3),
+            amount=Decimal('1000.00'),
+            safe=self.safe,
+            description='صرف'
+        )
+        
+        TreasuryService.close_day(today - timedelta(days=5))
+        self.assertEqual(SafeDailyClose.objects.filter(safe=self.safe).count(), 1)
+        
+        as_of = TreasuryService.get_safe_balance_as_of(self.safe, today - timedelta(days=1))
+        self.assertEqual(as_of['balance'], Decimal('4000.00'))
+        
+        # سند بتاريخ سابق للإقفال يلغي الإقفال حتى لا يصبح قديماً
+        ReceiptVoucher.objects.create(
+            date=today - timedelta(days=7),
+            amount=Decimal('500.00'),
+            safe=self.safe,
+            description='إيداع متأخر'
+        )
+        self.assertFalse(SafeDailyClose.objects.filter(safe=self.safe).exists())
+        
+        period = TreasuryService.get_safe_balance(
+            self.safe,
+            from_date=today - timedelta(days=8),
+            to_date=today - timedelta(days=2)
+        )
+        self.assertEqual(period['receipts'], Decimal('500.00'))
+        self.assertEqual(period['balance'], Decimal('-500.00'))
+    
+    def test_backfill_refills_invalidated_safe(self):
+        """اختبار أن --backfill يعيد ملء إقفالات خزنة أُبطلت قبل آخر إقفال لبقية الخزائن"""
+        from datetime import timedelta
+        
+        other_safe = Safe.objects.create(name='خزنة فرعية')
+        today = date.today()
+        for offset in (5, 4, 3):
+            TreasuryService.close_day(today - timedelta(days=offset))
+        
+        # سند بتاريخ سابق يلغي إقفالات الخزنة الرئيسية من اليوم الرابع فقط
+        ReceiptVoucher.objects.create(
+            date=today - timedelta(days=4), amount=Decimal('100.00'), safe=self.safe, description='إيداع'
+        )
+        self.assertEqual(SafeDailyClose.objects.filter(safe=self.safe).count(), 1)
+        
+        call_command('close_safe_days', '--backfill', '--date', (today - timedelta(days=2)).isoformat(),
+                     stdout=io.StringIO())
+        
+        for safe in (self.safe, other_safe):
+            self.assertEqual(
+                sorted(SafeDailyClose.objects.filter(safe=safe).values_list('date', flat=True)),
+                [today - timedelta(days=offset) for offset in (5, 4, 3, 2)]
+            )
+
+
+class VoucherImportTestCase(TestCase):
+    """اختبارات الترحيل المجمع للسندات"""
+    
+    def setUp(self):
+        """إعداد البيانات الأساسية للاختبار"""
+        self.safe = Safe.objects.create(name='الخزنة الرئيسية')
+        self.customer = Customer.objects.create(
+            code='C001',
+            name='عميل اختباري',
+            phone='01234567890'
+        )
+        unit = Unit.objects.create(
+            code='U001',
+            name='وحدة اختبارية',
+            unit_type='residential',
+            price_total=Decimal('100000.00'),
+            group='res'
+        )
+        self.contract = Contract.objects.create(
+            code='CNT001',
+            customer=self.customer,
+            unit=unit,
+            unit_value=Decimal('100000.00'),
+            down_payment=Decimal('10000.00'),
+            installments_count=10,
+            schedule_type='monthly',
+            start_date=date.today()
+        )
+    
+    def test_post_receipts(self):
+        """اختبار ترحيل سندات القبض وتحديث الأقساط والرصيد"""
+        result = VoucherService.post_receipts([
+            {'date': '2024-01-10', 'amount': '9000', 'safe': self.safe.name,
+             'description': 'قسط 1', 'contract': 'CNT001', 'installment': '1'},
+            {'date': '2024-01-11', 'amount': '4000.50', 'safe': str(self.safe.pk),
+             'description': 'جزء من قسط 2', 'contract': 'CNT001', 'installment': 2},
+            {'date': '2024-01-12', 'amount': '100', 'safe': self.safe.name,
+             'description': 'إيداع', 'customer': 'C001'},
+        ])
+        
+        self.assertEqual(result, {'created': 3, 'errors': []})
+        self.assertEqual(
+            list(ReceiptVoucher.objects.order_by('voucher_number').values_list('voucher_number', flat=True)),
+            ['RV-000001', 'RV-000002', 'RV-000003']
+        )
+        self.assertEqual(ReceiptVoucher.objects.filter(customer=self.customer).count(), 3)
+        
+        first, second = self.contract.installments.order_by('seq_no')[:2]
+        self.assertEqual(first.paid_amount, Decimal('9000.00'))
+        self.assertEqual(first.status, 'PAID')
+        self.assertEqual(second.paid_amount, Decimal('4000.50'))
+        self.assertEqual(second.status, 'PENDING')
+        
+        self.assertEqual(
+            TreasuryService.get_safe_balance(self.safe)['balance'],
+            Decimal('13100.50')
+        )
+    
+    def test_post_receipts_reports_row_errors(self):
+        """اختبار إيقاف الترحيل عند وجود أخطاء وتخطي الصفوف غير الصالحة عند الطلب"""
+        rows = [
+            {'date': '2024-01-10', 'amount': '100', 'safe': self.safe.name, 'description': 'صالح'},
+            {'date': 'غدا', 'amount': '-5', 'safe': 'خزنة مجهولة', 'description': 'غير صالح'},
+            {'date': '2024-01-10', 'amount': '100', 'safe': self.safe.name,
+             'description': 'قسط مجهول', 'contract': 'CNT001', 'installment': '99'},
+        ]
+        
+        result = VoucherService.post_receipts(rows)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+        self.assertEqual(len(result['errors'][0]['errors']), 3)
+        self.assertFalse(ReceiptVoucher.objects.exists())
+        
+        result = VoucherService.post_receipts(rows, skip_invalid=True)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(ReceiptVoucher.objects.count(), 1)
+    
+    def test_post_receipts_rejects_overlong_voucher_number(self):
+        """اختبار رفض رقم سند يدوي أطول من الحقل كخطأ صف بدلاً من فشل الإدراج"""
+        rows = [
+            {'date': '2024-01-10', 'amount': '100', 'safe': self.safe.name, 'description': 'صالح'},
+            {'date': '2024-01-10', 'amount': '100', 'safe': self.safe.name, 'description': 'رقم طويل',
+             'voucher_number': 'RV-' + '9' * 40},
+        ]
+        
+        result = VoucherService.post_receipts(rows, skip_invalid=True)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [2])
+    
+    def test_import_vouchers_command(self):
+        """اختبار أمر استيراد السندات من ملف CSV"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write('Date,Amount,Safe,Description,Supplier\n')
+            handle.write(f'2024-02-01,250,{self.safe.name},مصروف,\n')
+            handle.write(f'01/02/2024,"1,000.00",{self.safe.name},مصروف 2,\n')
+        self.addCleanup(os.remove, handle.name)
+        
+        call_command('import_vouchers', handle.name, '--type', 'payment', stdout=io.StringIO())
+        
+        self.assertEqual(PaymentVoucher.objects.count(), 2)
+        self.assertEqual(
+            TreasuryService.get_safe_balance(self.safe)['payments'],
+            Decimal('1250.00')
+        )
@@ -8,4 +8,6 @@ urlpatterns = [
     path('safes/', include('accounting.urls.safes')),
     path('customers/', include('accounting.urls.customers')),
     path('contracts/', include('accounting.urls.contracts')),
+    path('reports/', include('accounting.urls.reports')),
+    path('_perf/', include('accounting.urls.perf')),
 ]
\ No newline at end of file
@@ -4,4 +4,5 @@ from ..views import dashboard
 
 urlpatterns = [
     path('', dashboard.dashboard_view, name='dashboard'),
-]
\ No newline at end of file
+    path('dashboard/panels/<slug:panel>/', dashboard.dashboard_panel, name='dashboard_panel'),
+]
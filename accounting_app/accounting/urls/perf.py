@@ -0,0 +1,7 @@
+from django.urls import path
+from ..views import perf
+
+
+urlpatterns = [
+    path('', perf.perf_view, name='perf'),
+]
@@ -0,0 +1,9 @@
+from django.urls import path
+from ..views import reports
+
+
+urlpatterns = [
+    path('jobs/', reports.report_job_create, name='report_job_create'),
+    path('jobs/<int:pk>/', reports.report_job_status, name='report_job_status'),
+    path('jobs/<int:pk>/download/', reports.report_job_download, name='report_job_download'),
+]
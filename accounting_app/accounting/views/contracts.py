@@ -4,13 +4,19 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.template.loader import render_to_string
+from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Count
 from decimal import Decimal
 from ..models import Contract, Unit, Customer, Installment
 from ..forms import ContractForm
-from ..services import ContractService
+from ..services import ContractService, ScheduleEngine
+from ..perf import query_budget
 
 
+CONTRACTS_PER_PAGE = 25
+
+
+@query_budget(10)
 @login_required
 def contracts_list(request):
     """قائمة العقود"""
@@ -19,7 +25,7 @@ def contracts_list(request):
     
     contracts = Contract.objects.select_related(
         'customer', 'unit', 'partners_group'
-    ).prefetch_related('installments')
+    )
     
     if search_query:
         contracts = contracts.filter(
@@ -31,20 +37,18 @@ def contracts_list(request):
     if customer_filter:
         contracts = contracts.filter(customer_id=customer_filter)
     
-    contracts = contracts.order_by('-created_at')
+    contracts = contracts.order_by('-created_at', '-pk')
     
-    # إحصائيات لكل عقد
-    for contract in contracts:
-        contract.paid_installments = contract.installments.filter(status='PAID').count()
-        contract.late_installments = contract.installments.filter(status='LATE').count()
-        contract.total_paid = contract.get_total_paid()
-        contract.balance_due = contract.get_balance_due()
+    # إحصائيات الأقساط لكل عقد محسوبة في استعلام الصفحة نفسه
+    contracts = ContractService.annotate_installment_stats(contracts)
+    page_obj = Paginator(contracts, CONTRACTS_PER_PAGE).get_page(request.GET.get('page'))
     
     # قائمة العملاء للفلتر
     customers = Customer.objects.filter(is_active=True).order_by('name')
     
     context = {
-        'contracts': contracts,
+        'contracts': page_obj,
+        'page_obj': page_obj,
         'customers': customers,
         'search_query': search_query,
         'customer_filter': customer_filter,
@@ -66,6 +70,17 @@ def contract_create_wizard(request):
             # الخطوة الأولى: بيانات العقد
             form = ContractForm(request.POST)
             if form.is_valid():
+                # توليد جدول الأقساط للمعاينة (قبل تحويل التاريخ إلى نص للجلسة)
+                contract_data = form.cleaned_data
+                installments_preview = []
+                
+                if contract_data['installments_count'] > 0:
+                    installments_preview = ScheduleEngine(contract_data['schedule_type']).build(
+                        contract_data['unit_value'] - contract_data['down_payment'],
+                        contract_data['installments_count'],
+                        contract_data['start_date']
+                    )
+                
                 # حفظ البيانات في الجلسة
                 request.session['contract_data'] = form.cleaned_data
                 request.session['contract_data']['unit'] = form.cleaned_data['unit'].id
@@ -73,42 +88,6 @@ def contract_create_wizard(request):
                 request.session['contract_data']['partners_group'] = form.cleaned_data['partners_group'].id if form.cleaned_data.get('partners_group') else None
                 request.session['contract_data']['start_date'] = form.cleaned_data['start_date'].isoformat()
                 
-                # توليد جدول الأقساط للمعاينة
-                contract_data = form.cleaned_data
-                installments_preview = []
-                
-                if contract_data['installments_count'] > 0:
-                    remaining_amount = contract_data['unit_value'] - contract_data['down_payment']
-                    base_installment = remaining_amount / contract_data['installments_count']
-                    base_installment = base_installment.quantize(Decimal('0.01'))
-                    
-                    current_date = contract_data['start_date']
-                    total_amount = Decimal('0')
-                    
-                    for i in range(contract_data['installments_count']):
-                        if i == contract_data['installments_count'] - 1:
-                            installment_amount = remaining_amount - total_amount
-                        else:
-                            installment_amount = base_installment
-                            total_amount += installment_amount
-                        
-                        installments_preview.append({
-                            'seq_no': i + 1,
-                            'due_date': current_date,
-                            'amount': installment_amount
-                        })
-                        
-                        # حساب التاريخ التالي
-                        if contract_data['schedule_type'] == 'monthly':
-                            from dateutil.relativedelta import relativedelta
-                            current_date += relativedelta(months=1)
-                        elif contract_data['schedule_type'] == 'quarterly':
-                            from dateutil.relativedelta import relativedelta
-                            current_date += relativedelta(months=3)
-                        else:
-                            from dateutil.relativedelta import relativedelta
-                            current_date += relativedelta(years=1)
-                
                 request.session['installments_preview'] = [
                     {
                         'seq_no': inst['seq_no'],
@@ -219,11 +198,9 @@ def contract_detail(request, pk):
         pk=pk
     )
     
-    # ملخص العقد
-    summary = ContractService.get_contract_summary(contract)
-    
-    # الأقساط
-    installments = contract.installments.order_by('seq_no')
+    # الأقساط (استعلام واحد يُحسب منه ملخص العقد في الذاكرة)
+    installments = list(contract.installments.order_by('seq_no'))
+    summary = ContractService.get_contract_summary(contract, installments)
     
     # سندات القبض المرتبطة
     receipts = contract.receipts.select_related('safe').order_by('-date')
@@ -246,20 +223,25 @@ def contract_recalculate_installments(request, pk):
     
     try:
         # إعادة حساب الأقساط
-        ContractService.recalculate_installments(contract)
+        changes = ContractService.recalculate_installments(contract)
         
         messages.success(request, 'تم إعادة حساب الأقساط بنجاح')
         
         if request.htmx:
-            # إرجاع جدول الأقساط المحدث
+            # إرجاع جدول الأقساط المحدث مع تمييز الأقساط التي تغيرت
             installments = contract.installments.order_by('seq_no')
             html = render_to_string('accounting/contracts/_installments_table.html', {
                 'installments': installments,
-                'contract': contract
+                'contract': contract,
+                'created_seqs': {installment.seq_no for installment in changes['created']},
+                'updated_seqs': {installment.seq_no for installment in changes['updated']},
             })
             return JsonResponse({
                 'html': html,
-                'message': 'تم إعادة حساب الأقساط بنجاح'
+                'message': 'تم إعادة حساب الأقساط بنجاح',
+                'created': len(changes['created']),
+                'updated': len(changes['updated']),
+                'deleted': changes['deleted'],
             })
     
     except Exception as e:
@@ -4,13 +4,18 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.template.loader import render_to_string
+from django.core.paginator import Paginator
 from django.db.models import Q, Sum
-from decimal import Decimal
 from ..models import Customer, Contract, Installment, ReceiptVoucher
 from ..forms import CustomerForm
-from ..services import InstallmentService
+from ..services import InstallmentService, CustomerService
+from ..perf import query_budget
 
 
+CUSTOMERS_PER_PAGE = 25
+
+
+@query_budget(8)
 @login_required
 def customers_list(request):
     """قائمة العملاء"""
@@ -33,14 +38,19 @@ def customers_list(request):
     
     customers = customers.order_by('code')
     
-    # إحصائيات لكل عميل
-    for customer in customers:
-        customer.contracts_count = customer.contracts.count()
-        customer.total_contracts_value = customer.get_total_contracts_value()
-        customer.total_paid = customer.get_total_paid()
+    # إحصائيات العملاء محسوبة في استعلام الصفحة نفسه
+    customers = CustomerService.annotate_totals(customers)
+    page_obj = Paginator(customers, CUSTOMERS_PER_PAGE).get_page(request.GET.get('page'))
+    
+    # معاملات الفلترة لروابط الصفحات
+    query = request.GET.copy()
+    query.pop('page', None)
     
     context = {
-        'customers': customers,
+        'customers': page_obj,
+        'page_obj': page_obj,
+        'page_range': page_obj.paginator.get_elided_page_range(page_obj.number),
+        'query': query.urlencode(),
         'search_query': search_query,
         'filter_active': filter_active,
     }
@@ -195,63 +205,29 @@ def customer_statement(request, pk):
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
     
-    # جميع المعاملات
-    transactions = []
+    # صفحة من كشف الحساب بمؤشر (تمرير لا نهائي عبر HTMX)
+    page = CustomerService.get_statement_page(
+        customer,
+        from_date=from_date,
+        to_date=to_date,
+        after=request.GET.get('after')
+    )
     
-    # العقود
-    contracts = customer.contracts.all()
-    for contract in contracts:
-        transactions.append({
-            'date': contract.created_at.date(),
-            'type': 'contract',
-            'description': f'عقد {contract.code} - وحدة {contract.unit.name}',
-            'debit': contract.unit_value,
-            'credit': Decimal('0'),
-            'reference': contract.code
-        })
-        
-        if contract.down_payment > 0:
-            transactions.append({
-                'date': contract.created_at.date(),
-                'type': 'down_payment',
-                'description': f'دفعة مقدمة - عقد {contract.code}',
-                'debit': Decimal('0'),
-                'credit': contract.down_payment,
-                'reference': contract.code
-            })
-    
-    # سندات القبض
-    receipts = ReceiptVoucher.objects.filter(customer=customer)
-    if from_date:
-        receipts = receipts.filter(date__gte=from_date)
-    if to_date:
-        receipts = receipts.filter(date__lte=to_date)
-    
-    for receipt in receipts:
-        transactions.append({
-            'date': receipt.date,
-            'type': 'receipt',
-            'description': receipt.description,
-            'debit': Decimal('0'),
-            'credit': receipt.amount,
-            'reference': receipt.voucher_number
-        })
-    
-    # ترتيب حسب التاريخ
-    transactions.sort(key=lambda x: x['date'])
-    
-    # حساب الرصيد التراكمي
-    running_balance = Decimal('0')
-    for transaction in transactions:
-        running_balance += transaction['debit'] - transaction['credit']
-        transaction['balance'] = running_balance
+    next_query = request.GET.copy()
+    next_query['after'] = page['next_cursor'] or ''
     
     context = {
         'customer': customer,
-        'transactions': transactions,
+        'transactions': page['rows'],
+        'opening_balance': page['opening_balance'],
+        'has_next': page['has_next'],
+        'next_query': next_query.urlencode(),
         'from_date': from_date,
         'to_date': to_date,
-        'final_balance': running_balance,
+        'final_balance': page['final_balance'],
     }
     
+    if request.htmx and request.GET.get('after'):
+        return render(request, 'accounting/customers/_statement_rows.html', context)
+    
     return render(request, 'accounting/customers/statement.html', context)
\ No newline at end of file
@@ -8,8 +8,10 @@ from django.db.models import Q
 from ..models import Partner, PartnersGroup, PartnersGroupMember
 from ..forms import PartnerForm, PartnersGroupForm, PartnersGroupMemberFormSet
 from ..services import TreasuryService
+from ..perf import query_budget
 
 
+@query_budget(8)
 @login_required
 def partners_list(request):
     """قائمة الشركاء"""
@@ -25,9 +27,11 @@ def partners_list(request):
     
     partners = partners.order_by('code')
     
-    # حساب الرصيد الحالي لكل شريك
+    # حساب الرصيد الحالي لجميع الشركاء دفعة واحدة
+    partners = list(partners)
+    balances = TreasuryService.get_partner_balances(partners)
     for partner in partners:
-        partner.current_balance = TreasuryService.get_partner_balance(partner)
+        partner.current_balance = balances[partner.pk]
     
     context = {
         'partners': partners,
@@ -144,18 +148,28 @@ def partner_detail(request, pk):
     # الرصيد الحالي
     partner.current_balance = TreasuryService.get_partner_balance(partner)
     
-    # المعاملات الأخيرة
-    transactions = TreasuryService.get_partner_transactions(partner)[:20]
+    # المعاملات بمؤشر (تمرير لا نهائي عبر HTMX)
+    page = TreasuryService.get_partner_transactions_page(
+        partner,
+        after=request.GET.get('after')
+    )
     
-    # العضويات في المجموعات
-    group_memberships = partner.group_memberships.select_related('group')
+    next_query = request.GET.copy()
+    next_query['after'] = page['next_cursor'] or ''
     
     context = {
         'partner': partner,
-        'transactions': transactions,
-        'group_memberships': group_memberships,
+        'transactions': page['rows'],
+        'has_next': page['has_next'],
+        'next_query': next_query.urlencode(),
     }
     
+    if request.htmx and request.GET.get('after'):
+        return render(request, 'accounting/partners/_transactions_rows.html', context)
+    
+    # العضويات في المجموعات
+    context['group_memberships'] = partner.group_memberships.select_related('group')
+    
     return render(request, 'accounting/partners/detail.html', context)
 
 
@@ -0,0 +1,41 @@
+from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from ..perf import recent_requests
+
+
+@staff_member_required
+def perf_view(request):
+    """ملخص استعلامات ومدد آخر الطلبات لكل عرض (للمديرين فقط)"""
+    records = recent_requests()
+    
+    # تجميع لكل عرض
+    views = {}
+    for record in records:
+        summary = views.setdefault(record['view'], {
+            'view': record['view'],
+            'requests': 0,
+            'queries': 0,
+            'max_queries': 0,
+            'total_ms': 0,
+            'max_ms': 0,
+            'budget': record['budget'],
+            'over_budget': 0,
+        })
+        summary['requests'] += 1
+        summary['queries'] += record['queries']
+        summary['max_queries'] = max(summary['max_queries'], record['queries'])
+        summary['total_ms'] += record['total_ms']
+        summary['max_ms'] = max(summary['max_ms'], record['total_ms'])
+        if record['budget'] is not None and record['queries'] > record['budget']:
+            summary['over_budget'] += 1
+    
+    for summary in views.values():
+        summary['avg_queries'] = summary['queries'] / summary['requests']
+        summary['avg_ms'] = summary['total_ms'] / summary['requests']
+    
+    context = {
+        'views': sorted(views.values(), key=lambda summary: summary['max_queries'], reverse=True),
+        'records': records[:100],
+    }
+    
+    return render(request, 'accounting/perf.html', context)
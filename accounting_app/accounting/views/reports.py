@@ -0,0 +1,53 @@
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
+from django.http import FileResponse, Http404, HttpResponseBadRequest
+from ..models import ReportJob
+from ..services import ReportJobService
+
+
+@login_required
+@require_POST
+def report_job_create(request):
+    """طلب تقرير في الخلفية وإرجاع حالة مهمته"""
+    params = {
+        key: value for key, value in request.POST.items()
+        if key not in ('report_type', 'file_format', 'csrfmiddlewaretoken')
+    }
+    
+    try:
+        job = ReportJobService.request(
+            request.POST.get('report_type'),
+            request.POST.get('file_format', 'csv'),
+            params,
+            user=request.user
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    return render(request, 'accounting/reports/_job_status.html', {'job': job})
+
+
+@login_required
+def report_job_status(request, pk):
+    """حالة مهمة التقرير (تُحدّث عبر HTMX حتى تكتمل)"""
+    job = get_object_or_404(ReportJob, pk=pk)
+    return render(request, 'accounting/reports/_job_status.html', {'job': job})
+
+
+@login_required
+def report_job_download(request, pk):
+    """تحميل ملف التقرير الجاهز"""
+    job = get_object_or_404(ReportJob, pk=pk)
+    if not ReportJobService.artifact_exists(job):
+        # ملف النسخة المستبدلة حُذف، فيُحوّل الرابط القديم إلى أحدث نسخة جاهزة
+        current = ReportJobService.latest_artifact(job) if job.is_superseded else None
+        if current is None:
+            raise Http404
+        return redirect('accounting:report_job_download', pk=current.pk)
+    
+    return FileResponse(
+        open(ReportJobService.artifact_path(job), 'rb'),
+        as_attachment=True,
+        filename=ReportJobService.download_name(job)
+    )
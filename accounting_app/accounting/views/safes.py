@@ -31,12 +31,8 @@ def safes_list(request):
     
     safes = safes.order_by('name')
     
-    # حساب الرصيد لكل خزنة
-    for safe in safes:
-        balance_data = TreasuryService.get_safe_balance(safe)
-        safe.current_balance = balance_data['balance']
-        safe.total_receipts = balance_data['receipts']
-        safe.total_payments = balance_data['payments']
+    # حساب أرصدة جميع الخزائن دفعة واحدة
+    safes = TreasuryService.attach_balances(safes)
     
     context = {
         'safes': safes,
@@ -62,10 +58,7 @@ def safe_create(request):
             
             if request.htmx:
                 # إرجاع الصف الجديد للجدول
-                balance_data = TreasuryService.get_safe_balance(safe)
-                safe.current_balance = balance_data['balance']
-                safe.total_receipts = balance_data['receipts']
-                safe.total_payments = balance_data['payments']
+                TreasuryService.attach_balances([safe])
                 
                 html = render_to_string('accounting/safes/_row.html', {'safe': safe})
                 return JsonResponse({
@@ -99,10 +92,7 @@ def safe_edit(request, pk):
             
             if request.htmx:
                 # إرجاع الصف المحدث
-                balance_data = TreasuryService.get_safe_balance(safe)
-                safe.current_balance = balance_data['balance']
-                safe.total_receipts = balance_data['receipts']
-                safe.total_payments = balance_data['payments']
+                TreasuryService.attach_balances([safe])
                 
                 html = render_to_string('accounting/safes/_row.html', {'safe': safe})
                 return JsonResponse({
@@ -138,20 +128,31 @@ def safe_detail(request, pk):
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
     
-    cash_flow = TreasuryService.get_cash_flow(
+    # صفحة من التدفق النقدي بمؤشر (تمرير لا نهائي عبر HTMX)
+    page = TreasuryService.get_cash_flow_page(
         from_date=from_date,
         to_date=to_date,
-        safe=safe
+        safe=safe,
+        after=request.GET.get('after')
     )
     
+    next_query = request.GET.copy()
+    next_query['after'] = page['next_cursor'] or ''
+    
     context = {
         'safe': safe,
         'balance_data': balance_data,
-        'cash_flow': cash_flow,
+        'cash_flow': page['rows'],
+        'opening_balance': page['opening_balance'],
+        'has_next': page['has_next'],
+        'next_query': next_query.urlencode(),
         'from_date': from_date,
         'to_date': to_date,
     }
     
+    if request.htmx and request.GET.get('after'):
+        return render(request, 'accounting/safes/_cash_flow_rows.html', context)
+    
     return render(request, 'accounting/safes/detail.html', context)
 
 
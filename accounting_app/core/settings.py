@@ -3,6 +3,7 @@ Django settings for core project.
 """
 
 import os
+import sys
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
@@ -134,6 +135,62 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 # HTMX settings
 HTMX_APPS = ['accounting']
 
+# Voucher numbering series: global, year, safe or year_safe
+VOUCHER_NUMBER_SERIES = os.getenv("VOUCHER_NUMBER_SERIES", "global")
+
+# Dashboard cache: locmem, file or db. locmem is per process, so it is only correct for a
+# single worker (the default `gunicorn core.wsgi`): invalidation in one worker does not reach
+# the others. Use file or db (after `manage.py createcachetable`) when running several workers.
+DASHBOARD_CACHE_BACKEND = os.getenv("DASHBOARD_CACHE_BACKEND", "locmem")
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv("DASHBOARD_CACHE_TIMEOUT", "300"))
+
+# Background report jobs: running jobs without progress for this long are requeued
+REPORT_JOB_STALE_MINUTES = int(os.getenv("REPORT_JOB_STALE_MINUTES", "30"))
+
+# Per-request SQL count/latency instrumentation (accounting.perf), always on under `manage.py test`.
+# Views over their declared query budget raise in strict mode and log a warning otherwise.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+PERF_INSTRUMENTATION = os.getenv("PERF_INSTRUMENTATION", str(TESTING)) == "True"
+PERF_BUDGET_STRICT = os.getenv("PERF_BUDGET_STRICT", str(TESTING)) == "True"
+PERF_HISTORY_SIZE = int(os.getenv("PERF_HISTORY_SIZE", "500"))
+
+if PERF_INSTRUMENTATION:
+    MIDDLEWARE.append("accounting.perf.PerfMiddleware")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "accounting.perf": {
+            "handlers": ["console"],
+            "level": os.getenv("PERF_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "dashboard": {
+        "file": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("DASHBOARD_CACHE_LOCATION", str(BASE_DIR / "cache" / "dashboard")),
+        },
+        "db": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.getenv("DASHBOARD_CACHE_LOCATION", "dashboard_cache"),
+        },
+    }.get(DASHBOARD_CACHE_BACKEND, {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "dashboard",
+    }) | {"TIMEOUT": DASHBOARD_CACHE_TIMEOUT},
+}
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True